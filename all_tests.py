@@ -18,6 +18,7 @@ import unittest
 
 import subunit
 import tests
+from subunit.exec_pool import ConcurrentExecTestSuite
 
 
 class ShellTests(subunit.ExecTestCase):
@@ -31,6 +32,5 @@ class ShellTests(subunit.ExecTestCase):
 def test_suite():
     result = unittest.TestSuite()
     result.addTest(tests.test_suite())
-    result.addTest(ShellTests("test_sourcing"))
-    result.addTest(ShellTests("test_functions"))
+    result.addTest(ConcurrentExecTestSuite([ShellTests("test_sourcing"), ShellTests("test_functions")]))
     return result
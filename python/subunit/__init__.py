@@ -83,6 +83,9 @@ tests, allowing isolation between the test runner and some tests.
 Similarly, ``IsolatedTestCase`` is a base class which can be subclassed to get
 tests that will fork() before that individual test is run.
 
+Given a ``subunit.isolation.IsolationPool``, an ``IsolatedTestSuite`` runs
+each of its tests isolated in the pool's worker processes, several at once.
+
 `ExecTestCase`` is a convenience wrapper for running an external
 program to get a Subunit stream and then report that back to an arbitrary
 result object::
@@ -585,6 +588,21 @@ class TestProtocolServer(object):
         self._stream.write(line)
 
 
+class _CountingStream(object):
+    """Count the bytes written to a stream, for flush policies."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
 class TestProtocolClient(testresult.TestResult):
     """A TestResult which generates a subunit stream for a test run.
 
@@ -604,9 +622,21 @@ class TestProtocolClient(testresult.TestResult):
     stream.close()
     """
 
-    def __init__(self, stream):
+    def __init__(self, stream, flush_policy=None):
+        """Create a TestProtocolClient.
+
+        :param stream: The stream to write to.
+        :param flush_policy: If set to non-None, a policy from
+            subunit.flushing deciding when to flush stream, which is then
+            also flushed by stopTestRun. Test starts and outcomes count as
+            boundaries. Otherwise stream is flushed when each test starts
+            and stops.
+        """
         testresult.TestResult.__init__(self)
         stream = make_stream_binary(stream)
+        self._flush_policy = flush_policy
+        if flush_policy is not None:
+            stream = _CountingStream(stream)
         self._stream = stream
         self._progress_fmt = b"progress: "
         self._bytes_eol = b"\n"
@@ -701,6 +731,7 @@ class TestProtocolClient(testresult.TestResult):
             self._stream.write(b"\n")
         if details is not None or error is not None:
             self._stream.write(self._end_simple)
+        self._wrote(True)
 
     def addSkip(self, test, reason=None, details=None):
         """Report a skipped test."""
@@ -710,6 +741,7 @@ class TestProtocolClient(testresult.TestResult):
             self._stream.write(("skip: %s [\n" % test.id()).encode())
             self._stream.write(("%s\n" % reason).encode())
             self._stream.write(self._end_simple)
+            self._wrote(True)
 
     def addSuccess(self, test, details=None):
         """Report a success in a test."""
@@ -740,11 +772,27 @@ class TestProtocolClient(testresult.TestResult):
         """Mark a test as starting its test run."""
         super(TestProtocolClient, self).startTest(test)
         self._stream.write(b"test: " + self._test_id(test) + b"\n")
-        self._stream.flush()
+        if self._flush_policy is None:
+            self._stream.flush()
+        else:
+            self._wrote(True)
 
     def stopTest(self, test):
         super(TestProtocolClient, self).stopTest(test)
-        self._stream.flush()
+        if self._flush_policy is None:
+            self._stream.flush()
+
+    def stopTestRun(self):
+        super(TestProtocolClient, self).stopTestRun()
+        if self._flush_policy is not None:
+            self._flush_policy.close(self._stream)
+
+    def _wrote(self, boundary):
+        """Tell the flush policy, if any, about an event just written."""
+        if self._flush_policy is not None:
+            length = self._stream.written
+            self._stream.written = 0
+            self._flush_policy.wrote(self._stream, length, boundary)
 
     def progress(self, offset, whence):
         """Provide indication about the progress/length of the test run.
@@ -769,6 +817,7 @@ class TestProtocolClient(testresult.TestResult):
             prefix = self._empty_bytes
             offset = str(offset).encode()
         self._stream.write(self._progress_fmt + prefix + offset + self._bytes_eol)
+        self._wrote(False)
 
     def tags(self, new_tags, gone_tags):
         """Inform the client about tags added/removed from the stream."""
@@ -778,6 +827,7 @@ class TestProtocolClient(testresult.TestResult):
         tags.update([b"-" + tag.encode("utf8") for tag in gone_tags])
         tag_line = b"tags: " + b" ".join(tags) + b"\n"
         self._stream.write(tag_line)
+        self._wrote(False)
 
     def time(self, a_datetime):
         """Inform the client of the time.
@@ -789,6 +839,7 @@ class TestProtocolClient(testresult.TestResult):
             b"time: %04d-%02d-%02d %02d:%02d:%02d.%06dZ\n"
             % (time.year, time.month, time.day, time.hour, time.minute, time.second, time.microsecond)
         )
+        self._wrote(False)
 
     def _write_details(self, details):
         """Output details to the stream.
@@ -934,11 +985,21 @@ class IsolatedTestSuite(unittest.TestSuite):
     results from the child process using a Subunit stream.  This is useful for
     handling tests that mutate global state, or are testing C extensions that
     could crash the VM.
+
+    Given a subunit.isolation.IsolationPool, the tests in the suite are
+    instead each run in isolation by the pool's workers, several at once.
     """
 
+    def __init__(self, tests=(), pool=None):
+        super().__init__(tests)
+        self.pool = pool
+
     def run(self, result=None):
         if result is None:
             result = testresult.TestResult()
+        if self.pool is not None:
+            self.pool.run(self, result)
+            return result
         run_isolated(unittest.TestSuite, self, result)
 
 
@@ -1331,60 +1392,66 @@ def JUnitXML2SubUnit(xml_files, output_stream):
                 yield ts
         # Anything else is silently ignored — a non-JUnit document.
 
-    for path in xml_files:
-        try:
-            tree = ET.parse(path)
-        except (OSError, ET.ParseError) as exc:
-            sys.stderr.write("JUnitXML2SubUnit: failed to parse {}: {}\n".format(path, exc))
-            any_failed = True
-            continue
+    def events():
+        nonlocal any_failed, clock
+        for path in xml_files:
+            try:
+                tree = ET.parse(path)
+            except (OSError, ET.ParseError) as exc:
+                sys.stderr.write("JUnitXML2SubUnit: failed to parse {}: {}\n".format(path, exc))
+                any_failed = True
+                continue
+
+            root = tree.getroot()
+            for suite in iter_testsuites(root):
+                for case in suite.findall("testcase"):
+                    classname = case.get("classname") or ""
+                    name = case.get("name") or ""
+                    if not name:
+                        # Without a name there's no usable test_id; skip
+                        # rather than emit a malformed ID.
+                        continue
+                    test_id = "{}::{}".format(classname, name) if classname else name
+                    duration = parse_time(case.get("time"))
+
+                    failure = case.find("failure")
+                    error = case.find("error")
+                    skipped = case.find("skipped")
+
+                    if failure is not None or error is not None:
+                        status = "fail"
+                        detail = failure if failure is not None else error
+                        file_bytes = _format_junit_detail(detail)
+                        any_failed = True
+                    elif skipped is not None:
+                        status = "skip"
+                        file_bytes = _format_junit_detail(skipped)
+                    else:
+                        status = "success"
+                        file_bytes = None
+
+                    start_ts = clock
+                    end_ts = clock + datetime.timedelta(seconds=duration)
+                    clock = end_ts
+
+                    yield dict(
+                        test_id=test_id,
+                        test_status="inprogress",
+                        timestamp=start_ts,
+                    )
+                    yield dict(
+                        test_id=test_id,
+                        test_status=status,
+                        eof=True,
+                        file_name="junit detail" if file_bytes else None,
+                        file_bytes=file_bytes,
+                        mime_type=UTF8_TEXT if file_bytes else None,
+                        timestamp=end_ts,
+                    )
 
-        root = tree.getroot()
-        for suite in iter_testsuites(root):
-            for case in suite.findall("testcase"):
-                classname = case.get("classname") or ""
-                name = case.get("name") or ""
-                if not name:
-                    # Without a name there's no usable test_id; skip
-                    # rather than emit a malformed ID.
-                    continue
-                test_id = "{}::{}".format(classname, name) if classname else name
-                duration = parse_time(case.get("time"))
-
-                failure = case.find("failure")
-                error = case.find("error")
-                skipped = case.find("skipped")
-
-                if failure is not None or error is not None:
-                    status = "fail"
-                    detail = failure if failure is not None else error
-                    file_bytes = _format_junit_detail(detail)
-                    any_failed = True
-                elif skipped is not None:
-                    status = "skip"
-                    file_bytes = _format_junit_detail(skipped)
-                else:
-                    status = "success"
-                    file_bytes = None
-
-                start_ts = clock
-                end_ts = clock + datetime.timedelta(seconds=duration)
-                clock = end_ts
-
-                output.status(
-                    test_id=test_id,
-                    test_status="inprogress",
-                    timestamp=start_ts,
-                )
-                output.status(
-                    test_id=test_id,
-                    test_status=status,
-                    eof=True,
-                    file_name="junit detail" if file_bytes else None,
-                    file_bytes=file_bytes,
-                    mime_type=UTF8_TEXT if file_bytes else None,
-                    timestamp=end_ts,
-                )
+    # The events are encoded into large buffers, so even a huge archive
+    # takes few writes.
+    output.status_batch(events())
 
     return 1 if any_failed else 0
 
@@ -0,0 +1,227 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Reading the output of several processes at once.
+
+subunit-combine --jobs, subunit.run --parallel, IsolationPool and
+ConcurrentExecTestSuite all read from many pipes through one selector and
+merge what arrives into a single result.
+"""
+
+import os
+import selectors
+
+from testtools import StreamToDict
+from testtools.testresult.real import test_dict_to_case
+
+__all__ = [
+    "Multiplexer",
+    "RoutingStreamResult",
+    "StreamToTestResult",
+]
+
+# How much of a source to read at once.
+_READ_SIZE = 65536
+
+
+class RoutingStreamResult(object):
+    """Give the events passed on to a StreamResult a route code.
+
+    Route codes events already have are kept beneath it, as in ``1/0``.
+    """
+
+    def __init__(self, target, route_code, route_all=True):
+        """Create a RoutingStreamResult.
+
+        :param target: The StreamResult to pass events on to.
+        :param route_code: The route code to give events.
+        :param route_all: If False, events without a route code are passed
+            on without one.
+        """
+        self.target = target
+        self.route_code = route_code
+        self.route_all = route_all
+
+    def startTestRun(self):
+        self.target.startTestRun()
+
+    def stopTestRun(self):
+        self.target.stopTestRun()
+
+    def status(self, route_code=None, **kwargs):
+        if route_code is not None:
+            route_code = self.route_code + "/" + route_code
+        elif self.route_all:
+            route_code = self.route_code
+        self.target.status(route_code=route_code, **kwargs)
+
+
+class StreamToTestResult(object):
+    """Pass the tests in a stream of events on to a TestResult, whole.
+
+    Each test is run against the TestResult once it finishes, so tests from
+    different sources are never interleaved. Non subunit output is written to
+    a binary stream as it arrives.
+
+    :ivar finished: The ids of the tests passed on so far.
+    """
+
+    def __init__(self, result, stream, non_subunit_name):
+        """Create a StreamToTestResult.
+
+        :param result: The TestResult to pass tests on to.
+        :param stream: A binary stream for non subunit output.
+        :param non_subunit_name: The file_name the decoder was given for non
+            subunit output.
+        """
+        self.result = result
+        self.stream = stream
+        self.non_subunit_name = non_subunit_name
+        self.finished = set()
+        self._tests = StreamToDict(self._on_test)
+
+    def _on_test(self, test_dict):
+        self.finished.add(test_dict["id"])
+        test_dict_to_case(test_dict).run(self.result)
+
+    def startTestRun(self):
+        self._tests.startTestRun()
+
+    def stopTestRun(self):
+        self._tests.stopTestRun()
+
+    def status(self, test_id=None, file_name=None, file_bytes=None, **kwargs):
+        if test_id is None and file_name == self.non_subunit_name:
+            self.stream.write(file_bytes)
+            self.stream.flush()
+            return
+        self._tests.status(test_id=test_id, file_name=file_name, file_bytes=file_bytes, **kwargs)
+
+
+class Multiplexer(object):
+    """Read from several sources at once, feeding each to its own sink.
+
+    Sources are file descriptors or objects with a fileno(), such as pipes
+    and sockets. Sinks have feed(data) and close() methods, as
+    ByteStreamDecoder does. When a source reaches end of file it is closed,
+    and so is its sink.
+
+    Typical use:
+
+       >>> multiplexer = Multiplexer()
+       >>> multiplexer.add(process.stdout, ByteStreamDecoder(result), process)
+       >>> try:
+       ...     while multiplexer:
+       ...         for process in multiplexer.pump():
+       ...             process.wait()
+       ... finally:
+       ...     for process in multiplexer.close():
+       ...         process.kill()
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+
+    def __len__(self):
+        return len(self._selector.get_map())
+
+    def add(self, source, sink, data=None):
+        """Start reading source.
+
+        :param data: Handed back by pump(), remove() or close() once source
+            is finished with.
+        """
+        self._selector.register(source, selectors.EVENT_READ, (sink, data))
+
+    def reading(self, source):
+        """Return whether source is still being read."""
+        try:
+            return self._selector.get_key(source).fileobj is source
+        except (KeyError, ValueError):
+            return False
+
+    def pump(self, timeout=None):
+        """Wait for sources to become readable, and read each once.
+
+        Sinks may add, remove and drain sources as they are fed.
+
+        :param timeout: The longest to wait, in seconds, or None to wait
+            until a source is readable.
+        :return: The data of the sources that reached end of file.
+        """
+        finished = []
+        for key, _ in self._selector.select(timeout):
+            # A sink fed earlier in this round may have finished with it.
+            if self._selector.get_map().get(key.fd) is key and self._read(key) is False:
+                finished.append(key.data[1])
+        return finished
+
+    def drain(self, source):
+        """Read all that can be read from source now.
+
+        A blocking source is read to end of file.
+
+        :return: True if source reached end of file.
+        """
+        key = self._selector.get_key(source)
+        while True:
+            read = self._read(key)
+            if not read:
+                return read is False
+
+    def remove(self, source):
+        """Stop reading source, and close it, but not its sink.
+
+        :return: The data given for it.
+        """
+        key = self._selector.unregister(source)
+        self._close(source)
+        return key.data[1]
+
+    def close(self):
+        """Stop reading every source left, closing them but not their sinks.
+
+        :return: The data of each source that was left.
+        """
+        left = [self.remove(key.fileobj) for key in list(self._selector.get_map().values())]
+        self._selector.close()
+        return left
+
+    def _read(self, key):
+        """Read from a source once.
+
+        :return: True if something was read, None if a non-blocking source
+            had nothing to read, and False if it reached end of file, and so
+            was closed.
+        """
+        try:
+            data = os.read(key.fd, _READ_SIZE)
+        except BlockingIOError:
+            return None
+        sink = key.data[0]
+        if data:
+            sink.feed(data)
+            return True
+        self._selector.unregister(key.fileobj)
+        self._close(key.fileobj)
+        sink.close()
+        return False
+
+    def _close(self, source):
+        if isinstance(source, int):
+            os.close(source)
+        else:
+            source.close()
@@ -123,7 +123,7 @@ def parse_arguments(args=None, ParserClass=OptionParser):
         if options.attach_file == "-":
             if not options.file_name:
                 options.file_name = "stdin"
-                options.attach_file = make_stream_binary(sys.stdin)
+            options.attach_file = make_stream_binary(sys.stdin)
         else:
             try:
                 options.attach_file = open(options.attach_file, "rb")
@@ -146,6 +146,20 @@ def set_status_cb(option, opt_str, value, parser, status_name):
 def generate_stream_results(args, output_writer):
     output_writer.startTestRun()
 
+    if args.attach_file and hasattr(output_writer, "attach"):
+        # Encoders read the file themselves, into one reused buffer.
+        output_writer.attach(
+            args.file_name or args.attach_file.name,
+            args.attach_file,
+            mime_type=args.mimetype,
+            test_id=args.test_id,
+            test_status=args.action,
+            test_tags=set(args.tags) if args.tags else None,
+            timestamp=create_timestamp(),
+        )
+        output_writer.stopTestRun()
+        return
+
     if args.attach_file:
         reader = partial(args.attach_file.read, _CHUNK_SIZE)
         this_file_hunk = reader()
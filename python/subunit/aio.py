@@ -0,0 +1,200 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""asyncio support for subunit v2 streams.
+
+Many streams can be read or written concurrently from one event loop, rather
+than dedicating a thread to each blocking ByteStreamToStreamResult::
+
+    async for event in read_events(process.stdout, non_subunit_name="stdout"):
+        result.status(**event)
+"""
+
+import os
+from io import BytesIO
+
+from subunit.v2 import ByteStreamDecoder, StreamResultToBytes
+
+__all__ = [
+    "AsyncStreamResultToBytes",
+    "read_events",
+]
+
+
+class _EventCollector(object):
+    """A StreamResult that keeps the keyword arguments of each event."""
+
+    def __init__(self):
+        self.events = []
+
+    def status(self, **kwargs):
+        self.events.append(kwargs)
+
+
+async def read_events(reader, non_subunit_name=None, read_size=65536):
+    """Parse a subunit v2 stream from an asyncio.StreamReader.
+
+    :param reader: An asyncio.StreamReader to read bytes from. It is read
+        until EOF.
+    :param non_subunit_name: If set to non-None, non subunit content will be
+        converted into file events labelled with this name. Otherwise an
+        exception is raised when non subunit content is encountered.
+    :param read_size: The most bytes to request from reader at once.
+    :return: An async iterator of events. Each event is a dict of the keyword
+        arguments to StreamResult.status.
+    """
+    collector = _EventCollector()
+    decoder = ByteStreamDecoder(collector, non_subunit_name)
+    while True:
+        data = await reader.read(read_size)
+        if data:
+            decoder.feed(data)
+        else:
+            decoder.close()
+        events = collector.events
+        collector.events = []
+        for event in events:
+            yield event
+        if not data:
+            return
+
+
+class AsyncStreamResultToBytes(StreamResultToBytes):
+    """Convert StreamResult API calls to bytes on an asyncio.StreamWriter.
+
+    This is the async counterpart to StreamResultToBytes: status, attach,
+    status_batch, write_packet, startTestRun and stopTestRun are coroutines.
+    Each packet is written whole, and they wait on writer.drain() so that a
+    slow reader applies backpressure to the producer.
+    """
+
+    def __init__(self, writer, integer_timestamps=False):
+        """Create an AsyncStreamResultToBytes.
+
+        :param writer: An asyncio.StreamWriter to write packets to. It is not
+            closed by AsyncStreamResultToBytes.
+        :param integer_timestamps: As for StreamResultToBytes.
+        """
+        # Packets are only encoded by the base class, never written by it.
+        super().__init__(BytesIO(), integer_timestamps=integer_timestamps)
+        self.writer = writer
+
+    async def startTestRun(self):
+        pass
+
+    async def stopTestRun(self):
+        await self.writer.drain()
+
+    async def status(
+        self,
+        test_id=None,
+        test_status=None,
+        test_tags=None,
+        runnable=True,
+        file_name=None,
+        file_bytes=None,
+        eof=False,
+        mime_type=None,
+        route_code=None,
+        timestamp=None,
+    ):
+        """Write a status event, as StreamResultToBytes.status does."""
+        # Large file content is written a chunk at a time, draining after
+        # each packet.
+        for packet in self._encode_packets(
+            test_id=test_id,
+            test_status=test_status,
+            test_tags=test_tags,
+            runnable=runnable,
+            file_name=file_name,
+            file_bytes=file_bytes,
+            eof=eof,
+            mime_type=mime_type,
+            route_code=route_code,
+            timestamp=timestamp,
+        ):
+            self.writer.write(packet)
+            await self.writer.drain()
+
+    async def attach(
+        self,
+        file_name,
+        source,
+        mime_type=None,
+        test_id=None,
+        test_status=None,
+        test_tags=None,
+        runnable=True,
+        eof=True,
+        route_code=None,
+        timestamp=None,
+    ):
+        """Write the contents of a file, as StreamResultToBytes.attach does.
+
+        The file itself is read with blocking reads, a chunk at a time.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as source:
+                return await self.attach(
+                    file_name,
+                    source,
+                    mime_type=mime_type,
+                    test_id=test_id,
+                    test_status=test_status,
+                    test_tags=test_tags,
+                    runnable=runnable,
+                    eof=eof,
+                    route_code=route_code,
+                    timestamp=timestamp,
+                )
+        await self.status(
+            test_id=test_id,
+            test_status=test_status,
+            test_tags=test_tags,
+            runnable=runnable,
+            file_name=file_name,
+            file_bytes=source,
+            eof=eof,
+            mime_type=mime_type,
+            route_code=route_code,
+            timestamp=timestamp,
+        )
+
+    async def status_batch(self, events):
+        """Write a sequence of status events, as StreamResultToBytes does.
+
+        Up to about batch_buffer_size bytes are written at once, draining
+        after each write.
+        """
+        packets = []
+        pending = 0
+        for event in events:
+            for packet in self._encode_packets(**event):
+                packets.append(packet)
+                pending += len(packet)
+                if pending >= self.batch_buffer_size:
+                    self.writer.write(b"".join(packets))
+                    await self.writer.drain()
+                    packets = []
+                    pending = 0
+        if packets:
+            self.writer.write(b"".join(packets))
+            await self.writer.drain()
+
+    async def write_packet(self, packet):
+        """Write a Packet exactly as it was read, as StreamResultToBytes does."""
+        self.writer.write(packet.data)
+        await self.writer.drain()
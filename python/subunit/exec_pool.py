@@ -0,0 +1,265 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Running the scripts of many ExecTestCases at once.
+
+An ExecTestCase runs its script and waits for it to finish before parsing its
+output, so a suite of them runs one script at a time. A
+ConcurrentExecTestSuite starts up to jobs of the scripts at once instead, and
+parses each script's output as it arrives::
+
+    suite = ConcurrentExecTestSuite(loader.loadTestsFromTestCase(ShellTests), jobs=8)
+    suite.run(result)
+    for run in suite.runs:
+        print(run.script, run.returncode, run.duration)
+
+Each test a script reports is passed on to the result whole, as soon as it
+finishes, so tests from different scripts are never interleaved. Scripts
+may write either version of the protocol: text is passed through until a v2
+packet, or a line that is a v1 directive, and the rest of the output is parsed
+as that version. Given report_failures=True, a script that
+exits with a non-zero status, or reports no tests, is also reported as a
+failing test.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from collections import deque
+
+from testtools import ExtendedToOriginalDecorator, PlaceHolder, TestResultDecorator, ThreadsafeForwardingResult
+from testtools.content import text_content
+
+from subunit import ExecTestCase, TestProtocolServer
+from subunit._multiplex import Multiplexer, StreamToTestResult
+from subunit.v2 import ByteStreamDecoder, find_packet
+
+__all__ = [
+    "ConcurrentExecTestSuite",
+    "ExecRun",
+]
+
+# The v1 directives that may come before a script's first test.
+_V1_DIRECTIVES = frozenset([b"progress", b"tags", b"test", b"testing", b"time"])
+
+
+class ExecRun(object):
+    """How the script of one ExecTestCase ran.
+
+    :ivar test: The ExecTestCase.
+    :ivar script: The command line that was run.
+    :ivar returncode: Its exit status, negative if it was killed by a signal.
+    :ivar duration: The seconds from starting it to it exiting.
+    :ivar tests: The number of tests it reported.
+    """
+
+    def __init__(self, test, returncode, duration, tests=0):
+        self.test = test
+        self.script = test.script
+        self.returncode = returncode
+        self.duration = duration
+        self.tests = tests
+
+    def __repr__(self):
+        return "<ExecRun %s: exit %d after %.3fs>" % (self.script, self.returncode, self.duration)
+
+
+class _TestCounter(TestResultDecorator):
+    """Count the tests passed on to a TestResult."""
+
+    def __init__(self, decorated):
+        super().__init__(ExtendedToOriginalDecorator(decorated))
+        self.tests = 0
+
+    def startTest(self, test):
+        self.tests += 1
+        return super().startTest(test)
+
+
+class _ScriptOutput(object):
+    """Parse a script's output as it arrives, as v2 or v1.
+
+    Lines of text are passed through to stream until a v2 packet, anywhere
+    in a line, or a line that is a v1 directive, and then the output is
+    parsed as that version from there on.
+    """
+
+    def __init__(self, result, stream):
+        self.counter = _TestCounter(result)
+        # Only used for how it buffers each test's events until the test
+        # finishes, so that tests from different scripts are never
+        # interleaved. Everything runs on one thread, so the lock is never
+        # contended.
+        self.result = ThreadsafeForwardingResult(self.counter, threading.Semaphore(1))
+        self.stream = stream
+        self._v2 = None
+        self._partial = b""
+
+    def feed(self, data):
+        if self._v2 is None:
+            data = self._detect(self._partial + data)
+        if self._v2:
+            self._v2.feed(data)
+            return
+        if self._v2 is None:
+            return
+        data = self._partial + data
+        start = 0
+        while True:
+            end = data.find(b"\n", start) + 1
+            if not end:
+                break
+            self._protocol.lineReceived(data[start:end])
+            start = end
+        self._partial = data[start:]
+
+    def _detect(self, data):
+        """Pass text through until the protocol version is known.
+
+        :return: The data from where the version became known.
+        """
+        # Where the first packet, or a signature that may yet start one, is.
+        found, packet = find_packet(data, final=False)
+        start = 0
+        try:
+            while start < len(data):
+                end = data.find(b"\n", start) + 1
+                if packet and (found < end or not end):
+                    self.stream.write(data[start:found])
+                    self._results = StreamToTestResult(self.result, self.stream, "stdout")
+                    self._results.startTestRun()
+                    self._v2 = ByteStreamDecoder(self._results, non_subunit_name="stdout")
+                    self._partial = b""
+                    return data[found:]
+                if not end:
+                    break
+                line = data[start:end]
+                # As TestProtocolServer reads directives.
+                words = line.split(None, 1)
+                if len(words) == 2 and line.startswith(words[0]) and words[0].rstrip(b":") in _V1_DIRECTIVES:
+                    self._v2 = False
+                    self._protocol = TestProtocolServer(self.result, self.stream)
+                    self._partial = b""
+                    return data[start:]
+                if found < end:
+                    # Wait to see whether the signature starts a packet.
+                    break
+                self.stream.write(line)
+                start = end
+            self._partial = data[start:]
+            return b""
+        finally:
+            self.stream.flush()
+
+    def close(self):
+        if self._v2:
+            self._v2.close()
+            self._results.stopTestRun()
+        elif self._v2 is False:
+            if self._partial:
+                self._protocol.lineReceived(self._partial)
+            self._protocol.lostConnection()
+        elif self._partial:
+            self.stream.write(self._partial)
+            self.stream.flush()
+
+
+class ConcurrentExecTestSuite(unittest.TestSuite):
+    """A TestSuite which runs the scripts of its ExecTestCases concurrently.
+
+    ExecTestCases in the suite, or in plain TestSuites within it, have their
+    scripts run up to jobs at a time; other tests are run afterwards, in the
+    usual way.
+
+    :ivar runs: An ExecRun for each script, in the order they finished.
+    """
+
+    def __init__(self, tests=(), jobs=None, stream=None, report_failures=False):
+        """Create a ConcurrentExecTestSuite.
+
+        :param tests: The tests in the suite.
+        :param jobs: The most scripts to run at once; os.cpu_count() by
+            default.
+        :param stream: A binary stream for script output that is not
+            subunit; by default sys.stdout.buffer, as for ExecTestCase.
+        :param report_failures: If True, a script that exits with a non-zero
+            status or reports no tests is also reported as a failing test
+            with the id of its ExecTestCase. ExecTestCase reports only the
+            tests in a script's output, and so does this by default.
+        """
+        super().__init__(tests)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.stream = stream
+        self.report_failures = report_failures
+        self.runs = []
+
+    def run(self, result, debug=False):
+        scripts = []
+        others = []
+        self._split(self, scripts, others)
+        self._run_scripts(scripts, result)
+        if others and not result.shouldStop:
+            unittest.TestSuite(others).run(result)
+        return result
+
+    def _split(self, tests, scripts, others):
+        for test in tests:
+            if isinstance(test, ExecTestCase):
+                scripts.append(test)
+            elif type(test) is unittest.TestSuite:
+                self._split(test, scripts, others)
+            else:
+                others.append(test)
+
+    def _run_scripts(self, scripts, result):
+        stream = self.stream if self.stream is not None else sys.stdout.buffer
+        pending = deque(scripts)
+        multiplexer = Multiplexer()
+        try:
+            while pending or multiplexer:
+                if result.shouldStop:
+                    pending.clear()
+                while pending and len(multiplexer) < self.jobs:
+                    test = pending.popleft()
+                    output = _ScriptOutput(result, stream)
+                    started = time.monotonic()
+                    process = subprocess.Popen(test.script, shell=True, stdout=subprocess.PIPE)
+                    multiplexer.add(process.stdout, output, (test, process, output, started))
+                if not multiplexer:
+                    break
+                for test, process, output, started in multiplexer.pump():
+                    run = ExecRun(test, process.wait(), time.monotonic() - started, output.counter.tests)
+                    self.runs.append(run)
+                    if self.report_failures and (run.returncode or not run.tests):
+                        self._report_failure(run, result)
+        finally:
+            for _, process, _, _ in multiplexer.close():
+                process.kill()
+                process.wait()
+
+    def _report_failure(self, run, result):
+        """Report a script that failed, or ran no tests, as a failing test."""
+        if run.returncode < 0:
+            reason = "Its script %s was killed by signal %d" % (run.script, -run.returncode)
+        elif run.returncode:
+            reason = "Its script %s exited with status %d" % (run.script, run.returncode)
+        else:
+            reason = "Its script %s exited" % (run.script,)
+        reason += " after reporting %d tests." % (run.tests,)
+        PlaceHolder(run.test.id(), outcome="addFailure", details={"traceback": text_content(reason)}).run(result)
@@ -23,8 +23,7 @@ from optparse import OptionParser
 
 from testtools import DecorateTestCaseResult, StreamResultRouter, StreamToExtendedDecorator
 
-from subunit import ByteStreamToStreamResult
-from subunit.filters import find_stream
+from subunit.filters import find_stream, make_v2_parser
 from subunit.test_results import CatFiles
 
 
@@ -41,7 +40,7 @@ def main():
         "--progress", action="store_true", help="Use breezy 's test reporter (requires breezy)", default=False
     )
     (options, args) = parser.parse_args()
-    test = ByteStreamToStreamResult(find_stream(sys.stdin, args), non_subunit_name="stdout")
+    test = make_v2_parser(find_stream(sys.stdin, args))
 
     def wrap_result(result):
         result = StreamToExtendedDecorator(result)
@@ -21,8 +21,8 @@ from optparse import OptionParser
 
 from testtools import StreamResultRouter, StreamToExtendedDecorator
 
-from subunit import ByteStreamToStreamResult, TestProtocolClient
-from subunit.filters import find_stream
+from subunit import TestProtocolClient
+from subunit.filters import find_stream, make_v2_parser
 from subunit.test_results import CatFiles
 
 
@@ -34,7 +34,7 @@ def make_options(description):
 def main():
     parser = make_options(__doc__)
     (options, args) = parser.parse_args()
-    case = ByteStreamToStreamResult(find_stream(sys.stdin, args), non_subunit_name="stdout")
+    case = make_v2_parser(find_stream(sys.stdin, args))
     result = StreamToExtendedDecorator(TestProtocolClient(sys.stdout))
     result = StreamResultRouter(result)
     cat = CatFiles(sys.stdout)
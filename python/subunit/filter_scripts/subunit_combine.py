@@ -35,6 +35,29 @@ Example configuration::
 The combined subunit v2 stream is written to stdout. The exit code is 0 if
 all commands exited 0, 1 otherwise.
 
+Concurrent commands
+-------------------
+
+By default the commands run one after another. With ``--jobs N`` up to N of
+them run at once, and their output is read as it arrives and merged a whole
+packet at a time. Each command's packets are then given a route code: the
+command's position in the configuration, counting from 0, with any route
+code the command gave itself beneath it (``1/0`` and so on). With
+``--timings FILE``, where FILE is the output of a previous ``--jobs`` run, the
+commands that took longest in it are started first, so that a long suite is
+not left running on its own at the end.
+
+Sharding
+--------
+
+With ``--shard INDEX/COUNT`` only one of COUNT shards of the tests is run,
+INDEX counting from 1, so that the suite can be split across machines. The
+tests are listed with each command's ``list_option``, or taken from the ids
+given, and the prefixed ids are divided as subunit.sharding describes:
+balanced by the durations in the ``--timings`` stream when given, and
+otherwise by a hash of each id. Every machine given the same tests and
+timings runs a different part of the suite, and together they run all of it.
+
 testr-style substitutions
 -------------------------
 
@@ -55,6 +78,7 @@ Test ids can be passed as positional arguments after the config file or via
 are ignored for that command.
 """
 
+import io
 import os
 import re
 import subprocess
@@ -66,9 +90,14 @@ from typing import Optional
 import yaml
 
 from subunit import ByteStreamToStreamResult, StreamResultToBytes
+from subunit._multiplex import Multiplexer, RoutingStreamResult
+from subunit.sharding import parse_shard, select_shard
+from subunit.v2 import ByteStreamDecoder, read_packets
 
 
 _VARIABLE_RE = re.compile(r"\$(IDOPTION|IDFILE|IDLIST|LISTOPT)")
+# How much of a timings stream to read at once.
+_READ_SIZE = 65536
 
 
 class _PrefixingStreamResult:
@@ -90,6 +119,78 @@ class _PrefixingStreamResult:
         self._target.status(test_id=test_id, **kwargs)
 
 
+def _command_result(output, cmd: dict, route_code: str):
+    """Wrap output to prefix a command's test ids and give them route_code.
+
+    Route codes the command gives are kept beneath route_code.
+    """
+    result = RoutingStreamResult(output, route_code)
+    prefix = cmd.get("prefix", "")
+    if prefix:
+        result = _PrefixingStreamResult(result, prefix)
+    return result
+
+
+class _CommandSpans:
+    """Note the first and last timestamp of each command's and test's packets."""
+
+    def __init__(self, commands: list[dict]):
+        self._prefixes = [cmd.get("prefix", "") for cmd in commands]
+        self._longest_prefixes = sorted(
+            ((prefix, index) for index, prefix in enumerate(self._prefixes)),
+            key=lambda item: -len(item[0]),
+        )
+        # Whether every packet so far has the route code combine --jobs
+        # would give it.
+        self.routed = True
+        self.by_route: dict[int, list[int]] = {}
+        self.by_prefix: dict[int, list[int]] = {}
+        self.tests: dict[str, list[int]] = {}
+
+    @property
+    def spans(self) -> dict[int, list[int]]:
+        return self.by_route if self.routed else self.by_prefix
+
+    def _routed_index(self, test_id, route_code) -> Optional[int]:
+        if route_code is None:
+            return None
+        root = route_code.split("/", 1)[0]
+        if not root.isdigit() or int(root) >= len(self._prefixes):
+            return None
+        prefix = self._prefixes[int(root)]
+        if test_id is not None and not test_id.startswith(prefix):
+            return None
+        return int(root)
+
+    def _prefixed_index(self, test_id) -> Optional[int]:
+        if test_id is None:
+            return None
+        for prefix, index in self._longest_prefixes:
+            if test_id.startswith(prefix):
+                return index
+        return None
+
+    def _note(self, spans: dict, key, timestamp: int) -> None:
+        span = spans.setdefault(key, [timestamp, timestamp])
+        span[0] = min(span[0], timestamp)
+        span[1] = max(span[1], timestamp)
+
+    def status(self, test_id=None, route_code=None, timestamp=None, **kwargs):
+        if timestamp is None:
+            return
+        if test_id is not None:
+            self._note(self.tests, test_id, timestamp)
+        if self.routed:
+            index = self._routed_index(test_id, route_code)
+            if index is None:
+                self.routed = False
+            else:
+                self._note(self.by_route, index, timestamp)
+        index = self._prefixed_index(test_id)
+        if index is not None:
+            self._note(self.by_prefix, index, timestamp)
+
+
 def load_config(path: str) -> list[dict]:
     """Load and validate a combine configuration file.
 
@@ -187,6 +288,48 @@ def _write_idfile(test_ids: list[str]) -> str:
     return path
 
 
+def _remove_idfile(idfile_path: Optional[str]) -> None:
+    if idfile_path is not None:
+        try:
+            os.unlink(idfile_path)
+        except OSError:
+            pass
+
+
+def _start_command(
+    cmd: dict,
+    *,
+    list_mode: bool,
+    test_ids: Optional[list[str]],
+) -> tuple[subprocess.Popen, Optional[str]]:
+    """Start a command with its stdout on a pipe.
+
+    :return: The process, and the path of the id file written for it, if
+        any, which the caller must remove once the process has finished.
+    """
+    env = os.environ.copy()
+    extra_env = cmd.get("env")
+    if extra_env:
+        env.update(extra_env)
+
+    idfile_path: Optional[str] = None
+    if test_ids is not None and test_ids:
+        idfile_path = _write_idfile(test_ids)
+
+    try:
+        argv = _expand_argv(
+            cmd,
+            list_mode=list_mode,
+            test_ids=test_ids,
+            idfile_path=idfile_path,
+        )
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, cwd=cmd.get("cwd"), env=env)
+    except BaseException:
+        _remove_idfile(idfile_path)
+        raise
+    return proc, idfile_path
+
+
 def run_command(
     cmd: dict,
     output,
@@ -207,45 +350,151 @@ def run_command(
     :return: The exit code of the child process.
     """
     prefix = cmd.get("prefix", "")
-    cwd = cmd.get("cwd")
-    env = os.environ.copy()
-    extra_env = cmd.get("env")
-    if extra_env:
-        env.update(extra_env)
-
-    idfile_path: Optional[str] = None
-    if test_ids is not None and test_ids:
-        idfile_path = _write_idfile(test_ids)
-
+    proc, idfile_path = _start_command(cmd, list_mode=list_mode, test_ids=test_ids)
     try:
-        argv = _expand_argv(
-            cmd,
-            list_mode=list_mode,
-            test_ids=test_ids,
-            idfile_path=idfile_path,
-        )
-        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, cwd=cwd, env=env)
         try:
             assert proc.stdout is not None
-            result = _PrefixingStreamResult(output, prefix) if prefix else output
-            ByteStreamToStreamResult(proc.stdout, non_subunit_name="stdout").run(result)
+            if prefix:
+                result = _PrefixingStreamResult(output, prefix)
+                ByteStreamToStreamResult(proc.stdout, non_subunit_name="stdout").run(result)
+            else:
+                # Nothing to rewrite: copy packets through without re-encoding.
+                for packet in read_packets(proc.stdout, non_subunit_name="stdout"):
+                    output.write_packet(packet)
         finally:
             returncode = proc.wait()
     finally:
-        if idfile_path is not None:
-            try:
-                os.unlink(idfile_path)
-            except OSError:
-                pass
+        _remove_idfile(idfile_path)
     return returncode
 
 
+class _ListedIds:
+    """Collect the ids of the tests a listing says exist."""
+
+    def __init__(self):
+        self.test_ids: list[str] = []
+
+    def status(self, test_id=None, test_status=None, **kwargs):
+        if test_status == "exists" and test_id is not None:
+            self.test_ids.append(test_id)
+
+
+def list_test_ids(commands: list[dict]) -> list[str]:
+    """List the tests of every command, with their prefixes.
+
+    :raises ValueError: If a command has no ``list_option``, or listing fails.
+    """
+    unlisted = [str(index) for index, cmd in enumerate(commands) if not cmd.get("list_option")]
+    if unlisted:
+        raise ValueError(f"commands without a list_option cannot be listed: {', '.join(unlisted)}")
+    listing = io.BytesIO()
+    if combine(commands, listing, list_mode=True) != 0:
+        raise ValueError("listing the tests failed")
+    listed = _ListedIds()
+    ByteStreamToStreamResult(
+        io.BytesIO(listing.getvalue()), non_subunit_name="stdout", fields={"test_id", "test_status"}
+    ).run(listed)
+    return listed.test_ids
+
+
+def read_timings(stream, commands: list[dict]) -> tuple[dict[int, float], dict[str, float]]:
+    """Find how long each command and each test ran for in a previous run.
+
+    The stream is parsed once, for both command_durations() and
+    subunit.sharding.read_durations().
+
+    :param stream: A binary file object with the subunit v2 output of a
+        previous run.
+    :return: A tuple of the durations command_durations() and
+        read_durations() would return.
+    """
+    spans = _CommandSpans(commands)
+    ByteStreamToStreamResult(
+        stream,
+        non_subunit_name="stdout",
+        buffer_size=_READ_SIZE,
+        fields={"test_id", "route_code", "timestamp"},
+        integer_timestamps=True,
+    ).run(spans)
+    return (
+        {index: (end - start) / 1e9 for index, (start, end) in spans.spans.items()},
+        {test_id: (end - start) / 1e9 for test_id, (start, end) in spans.tests.items()},
+    )
+
+
+def command_durations(stream, commands: list[dict]) -> dict[int, float]:
+    """Find how long each command ran for in a previous combined stream.
+
+    In the output of a ``--jobs`` run every packet has a route code starting
+    with the position of its command, and packets are taken to be from that
+    command. In any other stream, where route codes may be the commands' own,
+    a packet is taken to be from the command with the longest prefix its test
+    id starts with.
+
+    :param stream: A binary file object with the subunit v2 output of a
+        previous run.
+    :return: A dict from the position of each command found in the stream
+        to the seconds between its first and last timestamps.
+    """
+    return read_timings(stream, commands)[0]
+
+
+def _longest_first(selected: list, durations: dict[int, float]) -> list:
+    """Order (position, command, test ids) entries to start the longest running first.
+
+    Commands with no known duration might be the longest of all, so they
+    come first, in their configured order.
+    """
+    return sorted(selected, key=lambda entry: (entry[0] in durations, -durations.get(entry[0], 0)))
+
+
+def _run_concurrently(
+    selected: list[tuple[int, dict, Optional[list[str]]]],
+    output,
+    *,
+    jobs: int,
+    list_mode: bool,
+) -> bool:
+    """Run commands, up to jobs at once, merging their output into output.
+
+    :param selected: (position, command, test ids) for each command to run,
+        in the order to start them.
+    :return: True if every command exited 0.
+    """
+    pending = list(selected)
+    multiplexer = Multiplexer()
+    succeeded = True
+    try:
+        while pending or multiplexer:
+            while pending and len(multiplexer) < jobs:
+                index, cmd, cmd_ids = pending.pop(0)
+                proc, idfile_path = _start_command(cmd, list_mode=list_mode, test_ids=cmd_ids)
+                assert proc.stdout is not None
+                # Packets are only emitted once whole, so they are never
+                # interleaved with another command's.
+                result = _command_result(output, cmd, str(index))
+                decoder = ByteStreamDecoder(result, non_subunit_name="stdout")
+                multiplexer.add(proc.stdout, decoder, (proc, idfile_path))
+            for proc, idfile_path in multiplexer.pump():
+                if proc.wait() != 0:
+                    succeeded = False
+                _remove_idfile(idfile_path)
+    finally:
+        for proc, idfile_path in multiplexer.close():
+            proc.kill()
+            proc.wait()
+            _remove_idfile(idfile_path)
+    return succeeded
+
+
 def combine(
     commands: list[dict],
     output_stream,
     *,
     list_mode: bool = False,
     test_ids: Optional[list[str]] = None,
+    jobs: int = 1,
+    durations: Optional[dict[int, float]] = None,
 ) -> int:
     """Run ``commands`` and merge their subunit streams into ``output_stream``.
 
@@ -253,20 +502,33 @@ def combine(
     :param test_ids: Optional list of test ids to restrict execution to.
         Each command only sees ids whose prefix matches; commands with no
         matching ids are skipped entirely.
+    :param jobs: How many commands to run at once. With more than one,
+        packets are tagged with the route code of the command they came
+        from, with route codes commands give kept beneath it.
+    :param durations: When running commands at once, how long each took
+        before, as returned by command_durations(), to start the longest
+        first.
     :return: 0 if every command exited 0, 1 otherwise.
     """
+    selected = []
+    for index, cmd in enumerate(commands):
+        cmd_ids = _select_ids_for_command(cmd, test_ids)
+        if test_ids is not None and not cmd_ids:
+            # Ids were requested, but none match this command.
+            continue
+        selected.append((index, cmd, cmd_ids))
     output = StreamResultToBytes(output_stream)
     output.startTestRun()
     failed = False
     try:
-        for cmd in commands:
-            cmd_ids = _select_ids_for_command(cmd, test_ids)
-            if test_ids is not None and not cmd_ids:
-                # Ids were requested, but none match this command.
-                continue
-            rc = run_command(cmd, output, list_mode=list_mode, test_ids=cmd_ids)
-            if rc != 0:
-                failed = True
+        if jobs > 1:
+            selected = _longest_first(selected, durations or {})
+            failed = not _run_concurrently(selected, output, jobs=jobs, list_mode=list_mode)
+        else:
+            for index, cmd, cmd_ids in selected:
+                rc = run_command(cmd, output, list_mode=list_mode, test_ids=cmd_ids)
+                if rc != 0:
+                    failed = True
     finally:
         output.stopTestRun()
     return 1 if failed else 0
@@ -309,6 +571,27 @@ def make_parser() -> ArgumentParser:
         metavar="FILE",
         help="Read test ids (one per line) from FILE to restrict execution.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Run up to N commands at once, tagging each command's packets with a route code.",
+    )
+    parser.add_argument(
+        "--timings",
+        metavar="FILE",
+        help="A subunit stream from a previous run. With --jobs, the commands that took longest in it are "
+        "started first; with --shard, the shards are balanced by how long their tests took in it.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="INDEX/COUNT",
+        help="Only run shard INDEX of COUNT shards of the tests, counting from 1. Without test ids, "
+        "every command needs a list_option to list its tests.",
+    )
     return parser
 
 
@@ -322,6 +605,19 @@ def main(argv: Optional[list[str]] = None) -> None:
         test_ids = _read_id_list(options.load_list)
     if options.test_ids:
         test_ids = (test_ids or []) + options.test_ids
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    durations = test_durations = None
+    if options.timings:
+        with open(options.timings, "rb") as timings:
+            durations, test_durations = read_timings(timings, commands)
+    if options.shard is not None:
+        if test_ids is None:
+            try:
+                test_ids = list_test_ids(commands)
+            except ValueError as e:
+                parser.error(f"--shard: {e}")
+        test_ids = select_shard(test_ids, *options.shard, durations=test_durations)
 
     sys.exit(
         combine(
@@ -329,6 +625,8 @@ def main(argv: Optional[list[str]] = None) -> None:
             sys.stdout,
             list_mode=options.list_mode,
             test_ids=test_ids,
+            jobs=options.jobs,
+            durations=durations,
         )
     )
 
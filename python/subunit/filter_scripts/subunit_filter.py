@@ -33,7 +33,7 @@ from optparse import OptionParser
 from testtools import ExtendedToStreamDecorator, StreamToExtendedDecorator
 
 from subunit import StreamResultToBytes, read_test_list
-from subunit.filters import filter_by_result, find_stream
+from subunit.filters import add_passthrough_options, filter_by_result, find_stream, make_passthrough_policy
 from subunit.test_results import TestResultFilter, and_predicates, make_tag_filter
 
 
@@ -105,6 +105,7 @@ def make_options(description):
         dest="renames",
         default=[],
     )
+    add_passthrough_options(parser)
     return parser
 
 
@@ -184,6 +185,7 @@ def main():
         forward=False,
         protocol_version=2,
         input_stream=find_stream(sys.stdin, args),
+        passthrough_policy=make_passthrough_policy(options),
     )
     sys.exit(0)
 
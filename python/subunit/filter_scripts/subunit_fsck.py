@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Check the integrity of subunit v2 files.
+
+Every packet's length and checksum is verified, without decoding the packet.
+For each file the number of valid packets and the bytes they take up are
+printed, followed by the offsets of any damaged content: damaged or truncated
+packets, or content that is not subunit at all. Files are checked in parallel.
+
+The exit status is 0 if every file is intact and 1 otherwise.
+"""
+
+import sys
+from argparse import ArgumentParser
+from typing import Optional
+
+from subunit.fsck import check_files
+
+
+def make_parser() -> ArgumentParser:
+    parser = ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("streams", nargs="*", metavar="stream", help="Paths of subunit v2 files to check.")
+    parser.add_argument(
+        "--files-from",
+        metavar="FILE",
+        help="Also check the files named in FILE, one per line; - reads the names from stdin.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        metavar="N",
+        help="Check N files at once. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--salvage",
+        action="store_true",
+        help="Write the valid packets of each damaged file to a new file beside it, "
+        "with .salvaged appended to its name.",
+    )
+    parser.add_argument("--quiet", "-q", action="store_true", help="Only report files that are not intact.")
+    return parser
+
+
+def _read_names(path):
+    if path == "-":
+        return [line.rstrip("\n") for line in sys.stdin if line.strip()]
+    with open(path) as names:
+        return [line.rstrip("\n") for line in names if line.strip()]
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = make_parser()
+    options = parser.parse_args(argv)
+    paths = list(options.streams)
+    if options.files_from:
+        paths.extend(_read_names(options.files_from))
+    if not paths:
+        parser.error("no files to check")
+    output = sys.stdout
+    damaged = 0
+    for check in check_files(paths, workers=options.jobs, salvage=options.salvage):
+        if check.error is not None:
+            damaged += 1
+            output.write("%s: cannot read: %s\n" % (check.path, check.error))
+            continue
+        if check.ok:
+            if not options.quiet:
+                output.write("%s: ok, %d packets, %d bytes\n" % (check.path, check.packets, check.size))
+            continue
+        damaged += 1
+        output.write(
+            "%s: damaged, %d packets, %d of %d bytes valid\n"
+            % (check.path, check.packets, check.packet_bytes, check.size)
+        )
+        for start, end, reason in check.damage:
+            output.write("  bytes %d-%d: %s\n" % (start, end, reason))
+        if check.salvaged:
+            output.write("  valid packets written to %s\n" % (check.salvaged,))
+    if not options.quiet:
+        output.write("%d files checked, %d not intact\n" % (len(paths), damaged))
+    output.flush()
+    sys.exit(1 if damaged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Index a subunit v2 file so that subunit-slice can read parts of it.
+
+The index is written next to the file, with ".idx" appended to its name,
+unless --output is given. It records where each packet is, and the test id,
+route code, status and timestamp it carries.
+"""
+
+import sys
+from argparse import ArgumentParser
+from typing import Optional
+
+from subunit.index import build_index, index_path
+
+
+def make_parser() -> ArgumentParser:
+    parser = ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("stream", help="Path to the subunit v2 file to index.")
+    parser.add_argument(
+        "--output",
+        "-o",
+        metavar="FILE",
+        help="Write the index to FILE rather than beside the stream.",
+    )
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    options = make_parser().parse_args(argv)
+    index = build_index(options.stream)
+    index.save(options.output or index_path(options.stream))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,8 +21,7 @@ from optparse import OptionParser
 
 from testtools import CopyStreamResult, StreamResultRouter, StreamSummary
 
-from subunit import ByteStreamToStreamResult
-from subunit.filters import find_stream
+from subunit.filters import find_stream, make_v2_parser
 from subunit.test_results import CatFiles, TestIdPrintingResult
 
 
@@ -45,7 +44,13 @@ def main():
         dest="no_passthrough",
     )
     (options, args) = parser.parse_args()
-    test = ByteStreamToStreamResult(find_stream(sys.stdin, args), non_subunit_name="stdout")
+    # Only decode what is listed, counted and passed through.
+    fields = {"test_id", "test_status", "route_code"}
+    if options.times:
+        fields.add("timestamp")
+    if not options.no_passthrough:
+        fields.update(("file_name", "file_bytes", "mime_type"))
+    test = make_v2_parser(find_stream(sys.stdin, args), fields=fields)
     result = TestIdPrintingResult(sys.stdout, options.times, options.exists)
     if not options.no_passthrough:
         result = StreamResultRouter(result)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Extract the packets about some tests or times from an indexed subunit file.
+
+The file must have been indexed with subunit-index. Only the selected packets
+are read, by seeking to them, and they are written to stdout unchanged as a
+subunit v2 stream. When several selections are given, packets must match all
+of them; each selection option can be repeated to match any of its values.
+
+Packets without a timestamp are taken to be from the time of the last packet
+before them that had one.
+"""
+
+import sys
+from argparse import ArgumentParser
+from typing import Optional
+
+import iso8601
+
+from subunit import make_stream_binary, read_test_list
+from subunit.index import InvalidIndex, load_index, read_spans
+
+
+def make_parser() -> ArgumentParser:
+    parser = ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("stream", help="Path to the indexed subunit v2 file.")
+    parser.add_argument(
+        "--index",
+        metavar="FILE",
+        help="Read the index from FILE rather than from beside the stream.",
+    )
+    parser.add_argument(
+        "--id",
+        dest="test_ids",
+        action="append",
+        metavar="TEST_ID",
+        help="Select the packets of TEST_ID.",
+    )
+    parser.add_argument(
+        "--load-list",
+        dest="load_list",
+        metavar="FILE",
+        help="Select the packets of the test ids in FILE, one per line.",
+    )
+    parser.add_argument(
+        "--route-code",
+        dest="route_codes",
+        action="append",
+        metavar="ROUTE_CODE",
+        help="Select packets routed from ROUTE_CODE or below it.",
+    )
+    parser.add_argument(
+        "--status",
+        dest="statuses",
+        action="append",
+        choices=["exists", "inprogress", "success", "uxsuccess", "skip", "fail", "xfail"],
+        help="Select packets with this test status.",
+    )
+    parser.add_argument(
+        "--start",
+        type=iso8601.parse_date,
+        metavar="TIME",
+        help="Select packets from TIME, an ISO 8601 timestamp, on.",
+    )
+    parser.add_argument(
+        "--end",
+        type=iso8601.parse_date,
+        metavar="TIME",
+        help="Select packets up to TIME, an ISO 8601 timestamp.",
+    )
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = make_parser()
+    options = parser.parse_args(argv)
+    test_ids = options.test_ids
+    if options.load_list:
+        test_ids = (test_ids or []) + read_test_list(options.load_list)
+    output = make_stream_binary(sys.stdout)
+    try:
+        index = load_index(options.stream, options.index)
+        spans = index.select(
+            test_ids=test_ids,
+            route_codes=options.route_codes,
+            statuses=options.statuses,
+            start=options.start,
+            end=options.end,
+        )
+        for data in read_spans(options.stream, spans):
+            output.write(data)
+    except InvalidIndex as error:
+        parser.error("%s; run subunit-index %s" % (error, options.stream))
+    output.flush()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,8 @@ def main():
         show_stats,
         protocol_version=2,
         passthrough_subunit=False,
+        # Statistics only depend on test ids, statuses and tags.
+        fields=("test_id", "test_status", "test_tags", "route_code"),
     )
 
 
@@ -14,13 +14,18 @@
 #
 
 
+import os
+import stat
 import sys
+from functools import partial
+from io import UnsupportedOperation
 from optparse import OptionParser
 
-from testtools import CopyStreamResult, StreamResult, StreamResultRouter
+from testtools import StreamResultRouter
 
-from subunit import ByteStreamToStreamResult, DiscardStream, ProtocolTestCase, StreamResultToBytes
-from subunit.test_results import CatFiles
+from subunit import ByteStreamToStreamResult, DiscardStream, ProtocolTestCase, StreamResultToBytes, make_stream_binary
+from subunit.test_results import CatFiles, PassthroughPolicy
+from subunit.v2 import FLAG_TEST_ID, MappedFileToStreamResult, read_packets
 
 
 def make_options(description):
@@ -40,11 +45,84 @@ def make_options(description):
         default=False,
         help="Forward subunit stream on stdout. When set, received non-subunit output will be encapsulated in subunit.",
     )
+    add_passthrough_options(parser)
     return parser
 
 
+def add_passthrough_options(parser):
+    """Add the options read by make_passthrough_policy to parser."""
+    parser.add_option(
+        "--passthrough-window",
+        type=int,
+        default=0,
+        metavar="BYTES",
+        help="Gather non subunit input into writes of up to this many bytes. By default, and with 0, it is written "
+        "as it arrives.",
+    )
+    parser.add_option(
+        "--passthrough-latency",
+        type=float,
+        default=0.05,
+        metavar="SECONDS",
+        help="With --passthrough-window, hold non subunit input back for at most this long while gathering it.",
+    )
+    parser.add_option(
+        "--passthrough-limit",
+        type=int,
+        default=None,
+        metavar="BYTES",
+        help="Pass at most this much non subunit input through per test, reporting how much was dropped.",
+    )
+
+
+def make_passthrough_policy(options):
+    """Make a passthrough policy from parsed add_passthrough_options options.
+
+    :return: None if non subunit input should be passed through unchanged,
+        otherwise a callable which wraps a StreamResult in a
+        PassthroughPolicy.
+    """
+    if not (options.passthrough_window and options.passthrough_latency) and options.passthrough_limit is None:
+        return None
+    return partial(
+        PassthroughPolicy,
+        window_size=options.passthrough_window,
+        latency=options.passthrough_latency,
+        max_bytes=options.passthrough_limit,
+    )
+
+
+class _ForwardingByteStream(object):
+    """Parse a v2 stream, forwarding its packets without re-encoding them."""
+
+    def __init__(self, source, forward_result, forward_all):
+        """Create a _ForwardingByteStream.
+
+        :param source: The stream to parse.
+        :param forward_result: A StreamResultToBytes to forward packets to.
+        :param forward_all: If False, only packets with a test id are
+            forwarded.
+        """
+        self.source = source
+        self.forward_result = forward_result
+        self.forward_all = forward_all
+
+    def run(self, result):
+        for packet in read_packets(self.source, non_subunit_name="stdout"):
+            if self.forward_all or packet.flags & FLAG_TEST_ID:
+                self.forward_result.write_packet(packet)
+            packet.replay(result)
+
+
 def run_tests_from_stream(
-    input_stream, result, passthrough_stream=None, forward_stream=None, protocol_version=1, passthrough_subunit=True
+    input_stream,
+    result,
+    passthrough_stream=None,
+    forward_stream=None,
+    protocol_version=1,
+    passthrough_subunit=True,
+    fields=None,
+    passthrough_policy=None,
 ):
     """Run tests from a subunit input stream through 'result'.
 
@@ -69,33 +147,39 @@ def run_tests_from_stream(
         otherwise unwrap it. Only has effect when forward_stream is None.
         (when forwarding as subunit non-subunit input is always turned into
         subunit)
+    :param fields: For v2, the status() arguments result uses; see
+        ByteStreamToStreamResult. The file content fields are added when
+        non-subunit input is passed through. Ignored when forwarding.
+    :param passthrough_policy: For v2, a callable which wraps the result
+        receiving both test and non-test events, such as one returned by
+        make_passthrough_policy. Ignored when forwarding or when
+        passthrough_stream is None.
     """
     if 1 == protocol_version:
         test = ProtocolTestCase(input_stream, passthrough=passthrough_stream, forward=forward_stream)
     elif 2 == protocol_version:
         # In all cases we encapsulate unknown inputs.
         if forward_stream is not None:
-            # Send events to forward_stream as subunit.
-            forward_result = StreamResultToBytes(forward_stream)
-            # If we're passing non-subunit through, copy:
-            if passthrough_stream is None:
-                # Not passing non-test events - split them off to nothing.
-                router = StreamResultRouter(forward_result)
-                router.add_rule(StreamResult(), "test_id", test_id=None)
-                result = CopyStreamResult([router, result])
-            else:
-                # otherwise, copy all events to forward_result
-                result = CopyStreamResult([forward_result, result])
-        elif passthrough_stream is not None:
-            if not passthrough_subunit:
-                # Route non-test events to passthrough_stream, unwrapping them for
-                # display.
-                passthrough_result = CatFiles(passthrough_stream)
-            else:
-                passthrough_result = StreamResultToBytes(passthrough_stream)
-            result = StreamResultRouter(result)
-            result.add_rule(passthrough_result, "test_id", test_id=None)
-        test = ByteStreamToStreamResult(input_stream, non_subunit_name="stdout")
+            # Send packets to forward_stream as they were read. If we're not
+            # passing non-subunit through, only test packets are forwarded.
+            test = _ForwardingByteStream(
+                input_stream, StreamResultToBytes(forward_stream), forward_all=passthrough_stream is not None
+            )
+        else:
+            if passthrough_stream is not None:
+                if not passthrough_subunit:
+                    # Route non-test events to passthrough_stream, unwrapping them for
+                    # display.
+                    passthrough_result = CatFiles(passthrough_stream)
+                else:
+                    passthrough_result = StreamResultToBytes(passthrough_stream)
+                result = StreamResultRouter(result)
+                result.add_rule(passthrough_result, "test_id", test_id=None)
+                if passthrough_policy is not None:
+                    result = passthrough_policy(result)
+                if fields is not None:
+                    fields = set(fields) | {"file_name", "file_bytes", "mime_type", "eof"}
+            test = make_v2_parser(input_stream, fields=fields)
     else:
         raise Exception("Unknown protocol version.")
     result.startTestRun()
@@ -111,6 +195,8 @@ def filter_by_result(
     input_stream=sys.stdin,
     protocol_version=1,
     passthrough_subunit=True,
+    fields=None,
+    passthrough_policy=None,
 ):
     """Filter an input stream using a test result.
 
@@ -127,6 +213,8 @@ def filter_by_result(
         ``sys.stdin``.
     :param protocol_version: The subunit protocol version to expect.
     :param passthrough_subunit: If True, passthrough should be as subunit.
+    :param fields: As for run_tests_from_stream.
+    :param passthrough_policy: As for run_tests_from_stream.
     :return: A test result with the results of the run.
     """
     if passthrough:
@@ -158,6 +246,8 @@ def filter_by_result(
             forward_stream,
             protocol_version=protocol_version,
             passthrough_subunit=passthrough_subunit,
+            fields=fields,
+            passthrough_policy=passthrough_policy,
         )
     finally:
         if output_path:
@@ -165,7 +255,9 @@ def filter_by_result(
     return result
 
 
-def run_filter_script(result_factory, description, post_run_hook=None, protocol_version=1, passthrough_subunit=True):
+def run_filter_script(
+    result_factory, description, post_run_hook=None, protocol_version=1, passthrough_subunit=True, fields=None
+):
     """Main function for simple subunit filter scripts.
 
     Many subunit filter scripts take a stream of subunit input and use a
@@ -180,6 +272,7 @@ def run_filter_script(result_factory, description, post_run_hook=None, protocol_
     :param description: A description of the filter script.
     :param protocol_version: What protocol version to consume/emit.
     :param passthrough_subunit: If True, passthrough should be as subunit.
+    :param fields: As for run_tests_from_stream.
     """
     parser = make_options(description)
     (options, args) = parser.parse_args()
@@ -191,6 +284,8 @@ def run_filter_script(result_factory, description, post_run_hook=None, protocol_
         protocol_version=protocol_version,
         passthrough_subunit=passthrough_subunit,
         input_stream=find_stream(sys.stdin, args),
+        fields=fields,
+        passthrough_policy=make_passthrough_policy(options),
     )
     if post_run_hook:
         post_run_hook(result)
@@ -200,6 +295,34 @@ def run_filter_script(result_factory, description, post_run_hook=None, protocol_
         sys.exit(1)
 
 
+def make_v2_parser(input_stream, non_subunit_name="stdout", fields=None, packet_filter=None, resync=False):
+    """Make a parser for a subunit v2 input stream.
+
+    Regular files, such as those opened by find_stream, are parsed through a
+    memory map with MappedFileToStreamResult; anything else is read with
+    ByteStreamToStreamResult.
+
+    :param input_stream: The stream to parse.
+    :param non_subunit_name: The file name to give non subunit content.
+    :param fields: As for ByteStreamToStreamResult.
+    :param packet_filter: As for ByteStreamToStreamResult.
+    :param resync: As for ByteStreamToStreamResult.
+    :return: An object with a run(result) method.
+    """
+    input_stream = make_stream_binary(input_stream)
+    try:
+        regular = stat.S_ISREG(os.fstat(input_stream.fileno()).st_mode)
+    except (AttributeError, OSError, UnsupportedOperation):
+        regular = False
+    if regular:
+        return MappedFileToStreamResult(
+            input_stream, non_subunit_name=non_subunit_name, fields=fields, packet_filter=packet_filter, resync=resync
+        )
+    return ByteStreamToStreamResult(
+        input_stream, non_subunit_name=non_subunit_name, fields=fields, packet_filter=packet_filter, resync=resync
+    )
+
+
 def find_stream(stdin, argv):
     """Find a stream to use as input for filters.
 
@@ -0,0 +1,151 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Policies for when subunit writers flush their output stream.
+
+Flushing after every packet keeps a live consumer up to date but costs a
+write system call per packet. A policy lets a writer trade some latency for
+far fewer writes::
+
+    result = StreamResultToBytes(stream, flush_policy=FlushInterval(0.1))
+
+A policy instance keeps state about one stream, so each writer needs its
+own.
+"""
+
+import threading
+
+__all__ = [
+    "FlushBytes",
+    "FlushEveryPacket",
+    "FlushInterval",
+    "FlushOnBoundary",
+    "make_flush_policy",
+]
+
+
+class FlushEveryPacket(object):
+    """Flush after every packet.
+
+    Writers tell their policy about each packet or event they write with
+    wrote(), and call close() when they are finished.
+    """
+
+    def wrote(self, stream, length, boundary):
+        """Note that a packet has been written to stream.
+
+        :param stream: The stream written to.
+        :param length: The number of bytes written.
+        :param boundary: True if the packet carries a test status, or for
+            v1 starts or finishes a test.
+        """
+        stream.flush()
+
+    def close(self, stream):
+        """Flush anything still pending on stream."""
+        stream.flush()
+
+
+class FlushOnBoundary(FlushEveryPacket):
+    """Flush only after packets that carry a test status."""
+
+    def wrote(self, stream, length, boundary):
+        if boundary:
+            stream.flush()
+
+
+class FlushBytes(FlushEveryPacket):
+    """Flush once at least a given number of bytes are pending."""
+
+    def __init__(self, size):
+        """Create a FlushBytes.
+
+        :param size: The number of bytes to let accumulate between flushes.
+        """
+        self.size = size
+        self._pending = 0
+
+    def wrote(self, stream, length, boundary):
+        self._pending += length
+        if self._pending >= self.size:
+            self._pending = 0
+            stream.flush()
+
+    def close(self, stream):
+        self._pending = 0
+        stream.flush()
+
+
+class FlushInterval(FlushEveryPacket):
+    """Flush at most once per interval, and at most an interval after a write.
+
+    The first packet after a flush starts a timer, and the stream is flushed
+    when it expires, so output is never held back for longer than the
+    interval even if nothing else is written. The flush then happens on the
+    timer thread, so stream.flush() must be safe to call while another
+    thread writes, as it is for io.BufferedWriter.
+    """
+
+    def __init__(self, interval):
+        """Create a FlushInterval.
+
+        :param interval: The longest time, in seconds, to hold output back.
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def wrote(self, stream, length, boundary):
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self._expired, (stream,))
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _expired(self, stream):
+        with self._lock:
+            self._timer = None
+        stream.flush()
+
+    def close(self, stream):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        stream.flush()
+
+
+def make_flush_policy(spec):
+    """Make a flush policy from a command line style description.
+
+    :param spec: One of "packet", "boundary", "bytes:SIZE" or
+        "interval:SECONDS".
+    :return: A new flush policy.
+    :raises ValueError: If spec is not understood.
+    """
+    name, _, argument = spec.partition(":")
+    try:
+        if name == "packet" and not argument:
+            return FlushEveryPacket()
+        if name == "boundary" and not argument:
+            return FlushOnBoundary()
+        if name == "bytes":
+            return FlushBytes(int(argument))
+        if name == "interval":
+            return FlushInterval(float(argument))
+    except ValueError:
+        pass
+    raise ValueError("Unknown flush policy: %r" % (spec,))
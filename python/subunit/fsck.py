@@ -0,0 +1,168 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Integrity checks of subunit v2 files.
+
+Packets are framed and their checksums verified straight from a memory map of
+the file, without decoding their fields, so checking a file costs little more
+than reading it. Anything that is not a packet passing its checksum - damaged
+packets, truncated ones, non subunit content - is reported as damage::
+
+    for check in check_files(paths, salvage=True):
+        if not check.ok:
+            print(check.path, check.damage)
+
+Salvaging a damaged file writes its valid packets, unchanged, to a new file
+beside it (see salvage_path()).
+"""
+
+import os
+
+from testtools import StreamResult
+
+from subunit.v2 import ByteStreamDecoder, MappedFileToStreamResult
+
+__all__ = [
+    "FileCheck",
+    "check_file",
+    "check_files",
+    "salvage_path",
+]
+
+
+class FileCheck(object):
+    """The result of checking one subunit v2 file.
+
+    :ivar path: The path of the file.
+    :ivar size: The size of the file in bytes.
+    :ivar packets: The number of packets that passed their checksum.
+    :ivar packet_bytes: The number of bytes in those packets.
+    :ivar damage: A list of (start, end, reason) tuples giving the offsets of
+        each run of damaged content, and why it did not start a valid packet.
+    :ivar salvaged: The path the valid packets were written to, or None.
+    :ivar error: The error that stopped the file being read, or None.
+    """
+
+    def __init__(self, path, size=0):
+        self.path = path
+        self.size = size
+        self.packets = 0
+        self.packet_bytes = 0
+        self.damage = []
+        self.salvaged = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return not self.damage and self.error is None
+
+    def __repr__(self):
+        return "<FileCheck %s: %d packets, %d of %d bytes, %d damaged>" % (
+            self.path,
+            self.packets,
+            self.packet_bytes,
+            self.size,
+            len(self.damage),
+        )
+
+
+class _CheckingDecoder(ByteStreamDecoder):
+    """Count the packets framed, skipping and noting damaged content."""
+
+    _copy_packets = False
+
+    def __init__(self, check, output=None):
+        super().__init__(StreamResult(), resync=True)
+        self.check = check
+        self.output = output
+
+    def _packet(self, packet, consumed, offset):
+        self.check.packets += 1
+        self.check.packet_bytes += len(packet)
+        if self.output is not None:
+            self.output.write(packet)
+
+    def _report_skipped(self, start, end, reason):
+        self.check.damage.append((start, end, reason))
+
+
+class _CheckingFile(MappedFileToStreamResult):
+    def __init__(self, source, check, output=None):
+        super().__init__(source)
+        self.check = check
+        self.output = output
+
+    def _make_decoder(self, result):
+        return _CheckingDecoder(self.check, self.output)
+
+
+def salvage_path(path):
+    """Return the path the valid packets of the file at path are salvaged to."""
+    return path + ".salvaged"
+
+
+def check_file(path, salvage_to=None):
+    """Check the subunit v2 file at path.
+
+    :param salvage_to: If set, the path of a file to write the packets that
+        pass their checksum to.
+    :return: A FileCheck.
+    """
+    check = FileCheck(path, os.path.getsize(path))
+    if salvage_to is None:
+        _CheckingFile(path, check).run(StreamResult())
+        return check
+    with open(salvage_to, "wb") as output:
+        _CheckingFile(path, check, output).run(StreamResult())
+    check.salvaged = salvage_to
+    return check
+
+
+def _check(path, salvage):
+    try:
+        check = check_file(path)
+        if salvage and check.damage:
+            # Damage is rare, so clean files are only read once.
+            check = check_file(path, salvage_path(path))
+    except OSError as error:
+        check = FileCheck(path)
+        check.error = error
+    return check
+
+
+def check_files(paths, workers=None, salvage=False):
+    """Check many subunit v2 files, on several processes at once.
+
+    :param paths: The paths of the files to check.
+    :param workers: The number of worker processes; os.cpu_count() by
+        default. With 1, files are checked in this process.
+    :param salvage: If True, write the valid packets of each damaged file to
+        salvage_path() of it.
+    :return: An iterator of FileChecks, in the order of paths. Files that
+        cannot be read are reported through FileCheck.error.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for path in paths:
+            yield _check(path, salvage)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    paths = list(paths)
+    with ProcessPoolExecutor(workers) as executor:
+        # Hand out several files at a time, as each is usually quick to check.
+        chunksize = max(1, min(64, len(paths) // (workers * 4)))
+        yield from executor.map(_check, paths, [salvage] * len(paths), chunksize=chunksize)
@@ -0,0 +1,376 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Sidecar indexes of the packets in subunit v2 files.
+
+An index records the offset and length of every packet in a file together
+with the test id, route code, status and timestamp the packet carries. The
+packets about particular tests, or from a particular window of time, can then
+be read by seeking to them rather than by parsing the whole file::
+
+    index = build_index("results.subunit")
+    index.save(index_path("results.subunit"))
+
+    index = load_index("results.subunit")
+    spans = index.select(test_ids=["test_foo"])
+    for data in read_spans("results.subunit", spans):
+        sys.stdout.buffer.write(data)
+"""
+
+import datetime
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from testtools import StreamResult
+
+from subunit.v2 import (
+    EPOCH,
+    SIGNATURE,
+    ByteStreamDecoder,
+    MappedFileToStreamResult,
+    ParseError,
+    StreamResultToBytes,
+    _FieldCollector,
+)
+
+__all__ = [
+    "InvalidIndex",
+    "PacketIndex",
+    "build_index",
+    "index_path",
+    "load_index",
+    "read_spans",
+]
+
+_MAGIC = b"\xb3subunit-index 1\n"
+# Source file size, source mtime in nanoseconds, packet count.
+_HEADER = ">QqQ"
+_LENGTH = ">I"
+# Stands in for a missing timestamp, test id or route code.
+NO_TIMESTAMP = -(2**63)
+NO_NAME = -1
+_READ_SIZE = 1048576
+
+
+class InvalidIndex(Exception):
+    """The index is not a subunit index, or does not match its file."""
+
+
+def index_path(path):
+    """Return the path of the sidecar index for the subunit file at path."""
+    return path + ".idx"
+
+
+def _microseconds(timestamp):
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class PacketIndex(object):
+    """The packets of a subunit v2 file, and what each one is about.
+
+    Packets are held in file order. Non subunit content, and packets that
+    fail their checksum or cannot be decoded, are not indexed.
+
+    :ivar source_size: The size of the indexed file.
+    :ivar source_mtime_ns: The modification time of the indexed file.
+    """
+
+    def __init__(self, source_size=0, source_mtime_ns=0):
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.test_ids = array("i")
+        self.route_codes = array("i")
+        self.statuses = array("B")
+        # Microseconds since the epoch.
+        self.timestamps = array("q")
+        self.names = []
+        self._name_numbers = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _name_number(self, name):
+        if name is None:
+            return NO_NAME
+        number = self._name_numbers.get(name)
+        if number is None:
+            number = self._name_numbers[name] = len(self.names)
+            self.names.append(name)
+        return number
+
+    def add(self, offset, length, test_id=None, route_code=None, test_status=None, timestamp=None):
+        """Record a packet.
+
+        :param offset: The offset of the packet in the file.
+        :param length: The length of the packet.
+        :param test_id: The test id of the packet, if any.
+        :param route_code: The route code of the packet, if any.
+        :param test_status: The test status of the packet, if any.
+        :param timestamp: The timestamp of the packet, if any, as a timezone
+            aware datetime or as integer nanoseconds since the epoch.
+        """
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.test_ids.append(self._name_number(test_id))
+        self.route_codes.append(self._name_number(route_code))
+        self.statuses.append(StreamResultToBytes.status_mask[test_status])
+        if timestamp is None:
+            timestamp = NO_TIMESTAMP
+        elif isinstance(timestamp, int):
+            timestamp //= 1000
+        else:
+            timestamp = _microseconds(timestamp)
+        self.timestamps.append(timestamp)
+
+    def matches(self, path):
+        """Return True if the file at path looks unchanged since indexing."""
+        return _stat_key(path) == (self.source_size, self.source_mtime_ns)
+
+    def select(self, test_ids=None, route_codes=None, statuses=None, start=None, end=None):
+        """Find the packets matching every given criterion.
+
+        Packets without a timestamp are taken to be from the time of the last
+        packet before them that had one.
+
+        :param test_ids: Test ids to select packets for.
+        :param route_codes: Route codes to select packets from. Packets from
+            routes below a given route code, such as "0/1" for "0", are
+            selected too.
+        :param statuses: Test statuses, such as "fail", to select packets
+            with.
+        :param start: Select packets from this timezone aware datetime on.
+        :param end: Select packets up to and including this timezone aware
+            datetime.
+        :return: A list of (offset, length) tuples in file order.
+        """
+        names = None
+        if test_ids is not None:
+            names = {self._name_numbers[test_id] for test_id in test_ids if test_id in self._name_numbers}
+        routes = None
+        if route_codes is not None:
+            routes = set()
+            for number, name in enumerate(self.names):
+                for route_code in route_codes:
+                    if name == route_code or name.startswith(route_code + "/"):
+                        routes.add(number)
+        codes = None
+        if statuses is not None:
+            codes = {StreamResultToBytes.status_mask[status] for status in statuses}
+        first = NO_TIMESTAMP if start is None else _microseconds(start)
+        last = None if end is None else _microseconds(end)
+        timed = start is not None or end is not None
+        spans = []
+        timestamp = NO_TIMESTAMP
+        for offset, length, test_id, route_code, status, packet_timestamp in zip(
+            self.offsets, self.lengths, self.test_ids, self.route_codes, self.statuses, self.timestamps
+        ):
+            if packet_timestamp != NO_TIMESTAMP:
+                timestamp = packet_timestamp
+            if names is not None and test_id not in names:
+                continue
+            if routes is not None and route_code not in routes:
+                continue
+            if codes is not None and status not in codes:
+                continue
+            if timed:
+                if timestamp == NO_TIMESTAMP or timestamp < first:
+                    continue
+                if last is not None and timestamp > last:
+                    continue
+            spans.append((offset, length))
+        return spans
+
+    def _columns(self):
+        # Packets are mostly contiguous, so gaps between them compress far
+        # better than their offsets.
+        gaps = array("Q")
+        end = 0
+        for offset, length in zip(self.offsets, self.lengths):
+            gaps.append(offset - end)
+            end = offset + length
+        return [gaps, self.lengths, self.test_ids, self.route_codes, self.statuses, self.timestamps]
+
+    def save(self, path):
+        """Write the index to path."""
+        with open(path, "wb") as output:
+            output.write(_MAGIC)
+            output.write(struct.pack(_HEADER, self.source_size, self.source_mtime_ns, len(self)))
+            names = "\0".join(self.names).encode("utf8")
+            output.write(struct.pack(_LENGTH, len(self.names)))
+            self._write_block(output, names)
+            for column in self._columns():
+                if sys.byteorder == "little":
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                self._write_block(output, column.tobytes())
+
+    def _write_block(self, output, data):
+        data = zlib.compress(data)
+        output.write(struct.pack(_LENGTH, len(data)))
+        output.write(data)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save().
+
+        :raises InvalidIndex: If path does not hold an index.
+        """
+        with open(path, "rb") as source:
+            if source.read(len(_MAGIC)) != _MAGIC:
+                raise InvalidIndex("%s is not a subunit index" % (path,))
+            try:
+                size, mtime_ns, count = struct.unpack(_HEADER, source.read(struct.calcsize(_HEADER)))
+                index = cls(size, mtime_ns)
+                (name_count,) = struct.unpack(_LENGTH, source.read(4))
+                if name_count:
+                    index.names = cls._read_block(source).decode("utf8").split("\0")
+                else:
+                    cls._read_block(source)
+                columns = index._columns()
+                for column in columns:
+                    column.frombytes(cls._read_block(source))
+                    if sys.byteorder == "little":
+                        column.byteswap()
+                    if len(column) != count:
+                        raise InvalidIndex("%s is truncated" % (path,))
+            except (struct.error, zlib.error, UnicodeDecodeError) as error:
+                raise InvalidIndex("%s is corrupt: %s" % (path, error))
+        gaps = columns[0]
+        end = 0
+        for gap, length in zip(gaps, index.lengths):
+            index.offsets.append(end + gap)
+            end += gap + length
+        index._name_numbers = {name: number for number, name in enumerate(index.names)}
+        return index
+
+    @staticmethod
+    def _read_block(source):
+        (length,) = struct.unpack(_LENGTH, source.read(4))
+        return zlib.decompress(source.read(length))
+
+
+class _IndexingDecoder(ByteStreamDecoder):
+    """Add every packet framed to a PacketIndex."""
+
+    _copy_packets = False
+
+    def __init__(self, index):
+        # Non subunit content and damaged packets are framed past, but not
+        # indexed.
+        super().__init__(StreamResult(), non_subunit_name="stdout", integer_timestamps=True)
+        self.index = index
+        self._collector = _FieldCollector()
+
+    def _packet(self, packet, consumed, offset):
+        try:
+            self._decode_packet(packet, consumed, self._collector)
+        except ParseError:
+            return
+        fields = self._collector.fields
+        self.index.add(
+            offset,
+            len(packet),
+            fields["test_id"],
+            fields["route_code"],
+            fields["test_status"],
+            fields["timestamp"],
+        )
+
+
+class _IndexingFile(MappedFileToStreamResult):
+    def __init__(self, source, index):
+        super().__init__(source)
+        self.index = index
+
+    def _make_decoder(self, result):
+        return _IndexingDecoder(self.index)
+
+
+def build_index(path):
+    """Index the subunit v2 file at path.
+
+    :return: A PacketIndex.
+    """
+    index = PacketIndex(*_stat_key(path))
+    _IndexingFile(path, index).run(StreamResult())
+    return index
+
+
+def load_index(path, index_file=None):
+    """Load the index of the subunit file at path.
+
+    :param path: The path of the indexed file.
+    :param index_file: The path of the index; the sidecar path given by
+        index_path() by default.
+    :raises InvalidIndex: If the index cannot be read, or the file has
+        changed since it was indexed.
+    :return: A PacketIndex.
+    """
+    if index_file is None:
+        index_file = index_path(path)
+    try:
+        index = PacketIndex.load(index_file)
+    except OSError as error:
+        raise InvalidIndex("cannot read %s: %s" % (index_file, error.strerror))
+    if not index.matches(path):
+        raise InvalidIndex("%s has changed since %s was written" % (path, index_file))
+    return index
+
+
+def read_spans(path, spans):
+    """Read the given byte spans from the file at path.
+
+    Adjacent spans are read together, up to about 1MiB at a time.
+
+    :param path: The path of the file to read.
+    :param spans: (offset, length) tuples in file order, as returned by
+        PacketIndex.select().
+    :raises InvalidIndex: If a span does not start with a packet.
+    :return: An iterator of bytes.
+    """
+    with open(path, "rb") as source:
+        pending = []
+        for offset, length in spans:
+            if pending:
+                start = pending[0][0]
+                end = pending[-1][0] + pending[-1][1]
+                if offset != end or end - start >= _READ_SIZE:
+                    yield _read_run(source, pending)
+                    pending = []
+            pending.append((offset, length))
+        if pending:
+            yield _read_run(source, pending)
+
+
+def _read_run(source, spans):
+    start = spans[0][0]
+    end = spans[-1][0] + spans[-1][1]
+    source.seek(start)
+    data = source.read(end - start)
+    for offset, _ in spans:
+        if data[offset - start : offset - start + 1] != SIGNATURE:
+            raise InvalidIndex("no packet at offset %d" % (offset,))
+    return data
@@ -0,0 +1,320 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""A pool of worker processes for running isolated tests concurrently.
+
+run_isolated forks the process running the suite once for every isolated
+test, and reads the results back over the v1 protocol, one test at a time.
+An IsolationPool forks a few workers instead, hands each a test at a time as
+it becomes free, and reads results back over v2::
+
+    pool = IsolationPool(workers=4)
+    suite = IsolatedTestSuite(tests, pool=pool)
+    suite.run(result)
+
+By default each worker runs every test in a fresh fork of itself, so tests
+still cannot see each other's changes to global state. With recycle_after=N
+a worker runs tests itself instead, and is replaced by a fresh fork of the
+parent after N of them: less isolation, for less overhead.
+"""
+
+import os
+import socket
+import struct
+import sys
+import traceback
+import unittest
+from collections import deque
+from functools import partial
+
+from testtools import ExtendedToStreamDecorator, iterate_tests
+
+import subunit
+from subunit._multiplex import Multiplexer, StreamToTestResult
+from subunit.test_results import AutoTimingTestResultDecorator
+from subunit.v2 import ByteStreamDecoder, StreamResultToBytes
+
+__all__ = [
+    "IsolationPool",
+]
+
+# The name non subunit output, such as prints from tests, is given.
+_NON_SUBUNIT = "stdout"
+# Messages on the control socket: a test index, and its index and wait
+# status once run. The index _STOP asks a worker to exit.
+_TASK = struct.Struct(">i")
+_DONE = struct.Struct(">ii")
+_STOP = -1
+
+
+def _recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _run_test(test, stream):
+    """Run one test, writing its results to stream as v2."""
+    result = ExtendedToStreamDecorator(StreamResultToBytes(stream))
+    result = AutoTimingTestResultDecorator(result)
+    result.startTestRun()
+    # The pool does the isolating, so isolated tests are run directly.
+    if isinstance(test, subunit.IsolatedTestCase):
+        unittest.TestCase.run(test, result)
+    elif isinstance(test, subunit.IsolatedTestSuite):
+        unittest.TestSuite.run(test, result)
+    else:
+        # In a suite so that class and module fixtures are run.
+        unittest.TestSuite([test]).run(result)
+    result.stopTestRun()
+
+
+def _describe_status(status):
+    if os.WIFSIGNALED(status):
+        return "was killed by signal %d" % os.WTERMSIG(status)
+    return "exited with status %d" % os.WEXITSTATUS(status)
+
+
+class _Worker(object):
+    """The parent's end of a worker process."""
+
+    def __init__(self, pid, control, output):
+        self.pid = pid
+        self.control = control
+        self.output = output
+        self.test = None
+        self.ran = 0
+
+
+class _Control(object):
+    """Split what a worker sends on its control socket into messages."""
+
+    def __init__(self, on_done, on_exit):
+        self.on_done = on_done
+        self.on_exit = on_exit
+        self._buffer = b""
+
+    def feed(self, data):
+        self._buffer += data
+        while len(self._buffer) >= _DONE.size:
+            index, status = _DONE.unpack_from(self._buffer)
+            self._buffer = self._buffer[_DONE.size :]
+            self.on_done(index, status)
+
+    def close(self):
+        # The worker is exiting, or has died.
+        self.on_exit()
+
+
+class _PoolRun(object):
+    """The state of one call to IsolationPool.run."""
+
+    def __init__(self, tests, result, results):
+        self.tests = tests
+        self.result = result
+        self.results = results
+        self.pending = deque(range(len(tests)))
+        self.multiplexer = Multiplexer()
+        self.workers = []
+
+
+class IsolationPool(object):
+    """Run tests concurrently, each isolated in a forked process.
+
+    :ivar workers: The number of tests to run at once.
+    :ivar recycle_after: None to run every test in a fresh fork of a worker,
+        or the number of tests a worker runs itself before it is replaced.
+    :ivar stream: Where output from tests that is not subunit, such as
+        prints, is written; by default sys.stdout.buffer.
+    """
+
+    def __init__(self, workers=None, recycle_after=None, stream=None):
+        """Create an IsolationPool.
+
+        :param workers: The number of worker processes; os.cpu_count() by
+            default.
+        :param recycle_after: If set, workers run tests in their own process
+            and are replaced after this many, rather than forking for each
+            test.
+        :param stream: A binary stream for non subunit output from tests.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        if recycle_after is not None and recycle_after < 1:
+            raise ValueError("recycle_after must be at least 1, not %r" % (recycle_after,))
+        self.recycle_after = recycle_after
+        self.stream = stream
+
+    def run(self, tests, result):
+        """Run tests, reporting to result as each finishes.
+
+        Each test in tests is run in isolation, along with any tests it
+        contains. A test whose process dies before it finishes is reported as
+        failing.
+
+        :param tests: An iterable of tests.
+        :param result: A TestResult.
+        :return: result.
+        """
+        tests = list(tests)
+        stream = self.stream if self.stream is not None else sys.stdout.buffer
+        state = _PoolRun(tests, result, StreamToTestResult(result, stream, _NON_SUBUNIT))
+        state.results.startTestRun()
+        try:
+            for _ in range(min(self.workers, len(tests))):
+                self._start_worker(state)
+                self._next_test(state, state.workers[-1])
+            while state.multiplexer:
+                state.multiplexer.pump()
+        finally:
+            for worker in state.workers:
+                self._stop_worker(state, worker)
+            state.multiplexer.close()
+            state.results.stopTestRun()
+        return result
+
+    def _start_worker(self, state):
+        control, child_control = socket.socketpair()
+        read_fd, write_fd = os.pipe()
+        # Anything still buffered would be written again by the worker.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                control.close()
+                os.close(read_fd)
+                # Other workers' ends, so that they see the parent go.
+                for worker in state.workers:
+                    worker.control.close()
+                    worker.output.close()
+                self._serve(state.tests, child_control, write_fd)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        child_control.close()
+        os.close(write_fd)
+        # So that what a test wrote can be read once it is done, without
+        # waiting for more.
+        os.set_blocking(read_fd, False)
+        worker = _Worker(pid, control, os.fdopen(read_fd, "rb", 0))
+        state.workers.append(worker)
+        state.multiplexer.add(
+            worker.control, _Control(partial(self._on_done, state, worker), partial(self._on_exit, state, worker))
+        )
+        state.multiplexer.add(worker.output, ByteStreamDecoder(state.results, non_subunit_name=_NON_SUBUNIT))
+
+    def _serve(self, tests, control, write_fd):
+        """Run the tests the parent asks for, in a worker process."""
+        # Prints from tests go down the pipe too, as they do in run_isolated.
+        os.dup2(write_fd, 1)
+        # Unbuffered, so that packets are written whole.
+        stream = os.fdopen(write_fd, "wb", 0)
+        ran = 0
+        while True:
+            data = _recv_exactly(control, _TASK.size)
+            if data is None:
+                return
+            (index,) = _TASK.unpack(data)
+            if index == _STOP:
+                return
+            if self.recycle_after is None:
+                status = self._run_forked(tests[index], stream)
+            else:
+                _run_test(tests[index], stream)
+                sys.stdout.flush()
+                status = 0
+            control.sendall(_DONE.pack(index, status))
+            ran += 1
+            if self.recycle_after is not None and ran >= self.recycle_after:
+                return
+
+    def _run_forked(self, test, stream):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_test(test, stream)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        return os.waitpid(pid, 0)[1]
+
+    def _next_test(self, state, worker):
+        if state.pending and not getattr(state.result, "shouldStop", False):
+            worker.test = state.pending.popleft()
+            worker.control.sendall(_TASK.pack(worker.test))
+        else:
+            worker.test = None
+            worker.control.sendall(_TASK.pack(_STOP))
+
+    def _on_done(self, state, worker, index, status):
+        # The test's process has exited, so all it wrote can be read.
+        if state.multiplexer.reading(worker.output):
+            state.multiplexer.drain(worker.output)
+        if status:
+            self._report_death(state.results, state.tests[index], "Its process %s." % _describe_status(status))
+        worker.test = None
+        worker.ran += 1
+        if self.recycle_after is None or worker.ran < self.recycle_after:
+            self._next_test(state, worker)
+        else:
+            self._on_exit(state, worker)
+
+    def _on_exit(self, state, worker):
+        """Replace a worker that is exiting, or has died."""
+        self._stop_worker(state, worker)
+        if worker.test is not None:
+            self._report_death(state.results, state.tests[worker.test], "The worker running it died.")
+            worker.test = None
+        if state.pending and not getattr(state.result, "shouldStop", False):
+            self._start_worker(state)
+            self._next_test(state, state.workers[-1])
+
+    def _stop_worker(self, state, worker):
+        if worker.pid is None:
+            return
+        multiplexer = state.multiplexer
+        if multiplexer.reading(worker.control):
+            multiplexer.remove(worker.control)
+        if multiplexer.reading(worker.output):
+            os.set_blocking(worker.output.fileno(), True)
+            multiplexer.drain(worker.output)
+        os.waitpid(worker.pid, 0)
+        worker.pid = None
+
+    def _report_death(self, results, test, reason):
+        for case in iterate_tests(test):
+            if case.id() in results.finished:
+                continue
+            results.status(
+                test_id=case.id(),
+                file_name="traceback",
+                file_bytes=reason.encode("utf8"),
+                mime_type="text/plain;charset=utf8",
+                eof=True,
+            )
+            results.status(test_id=case.id(), test_status="fail")
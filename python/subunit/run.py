@@ -18,21 +18,79 @@
 """Run a unittest testcase reporting results as Subunit.
 
 $ python -m subunit.run mylib.tests.test_suite
+
+With --parallel N the tests are run by N worker processes, forked from the
+process that loaded them, and each worker's results are given its own route
+code.
+
+With --shard INDEX/COUNT only one of COUNT shards of the tests is run, INDEX
+counting from 1. Given the output of a previous run with --shard-timings,
+the shards are balanced by how long their tests took; see subunit.sharding.
 """
 
 import io
+import multiprocessing
 import os
 import sys
+import unittest
+from contextlib import contextmanager
 
-from testtools import ExtendedToStreamDecorator
+from testtools import ExtendedToStreamDecorator, iterate_tests
 from testtools.run import BUFFEROUTPUT, CATCHBREAK, FAILFAST, USAGE_AS_MAIN, TestProgram, list_test
+from testtools.testsuite import filter_by_ids
 
 from subunit import StreamResultToBytes
+from subunit._multiplex import Multiplexer, RoutingStreamResult
+from subunit.flushing import make_flush_policy
+from subunit.sharding import parse_shard, read_durations, select_shard
 from subunit.test_results import AutoTimingTestResultDecorator
+from subunit.v2 import ByteStreamDecoder, Packet
+
+# Worker states, as recorded in shared memory.
+_WORKER_RUNNING = 0
+_WORKER_SUCCEEDED = 1
+_WORKER_FAILED = 2
+
+
+class _WorkerOutput(ByteStreamDecoder):
+    """Relay a worker's packets unchanged, wrapping anything else it writes."""
+
+    # Packets are written out before the buffer they are in is reused.
+    _copy_packets = False
+
+    def __init__(self, output, route_code):
+        super().__init__(RoutingStreamResult(output, route_code), non_subunit_name="stdout")
+        self.output = output
+
+    def _packet(self, packet, consumed, offset):
+        self.output.write_packet(Packet(packet))
+
+
+class _ParallelRun(object):
+    """The outcome of a parallel run, as its workers reported it."""
+
+    def __init__(self, successful):
+        self.successful = successful
+
+    def wasSuccessful(self):
+        return self.successful
 
 
 class SubunitTestRunner(object):
-    def __init__(self, verbosity=None, failfast=None, buffer=None, stream=None, stdout=None, tb_locals=False):
+    # The most tests to hand a worker at once when running in parallel.
+    batch_size = 10
+
+    def __init__(
+        self,
+        verbosity=None,
+        failfast=None,
+        buffer=None,
+        stream=None,
+        stdout=None,
+        tb_locals=False,
+        flush_policy=None,
+        parallel=None,
+    ):
         """Create a TestToolsTestRunner.
 
         :param verbosity: Ignored.
@@ -41,6 +99,13 @@ class SubunitTestRunner(object):
         :param stream: Upstream unittest stream parameter.
         :param stdout: Testtools stream parameter.
         :param tb_locals: Testtools traceback in locals parameter.
+        :param flush_policy: A policy from subunit.flushing for the output
+            stream. By default the stream is unbuffered, so every packet is
+            written as soon as it is reported; with a policy it is buffered
+            and flushed as the policy decides.
+        :param parallel: If more than 1, run tests in this many worker
+            processes; see run_parallel. Ignored where processes cannot be
+            forked.
 
         Either stream or stdout can be supplied, and stream will take
         precedence.
@@ -48,21 +113,140 @@ class SubunitTestRunner(object):
         self.failfast = failfast
         self.stream = stream or stdout or sys.stdout
         self.tb_locals = tb_locals
+        self.flush_policy = flush_policy
+        self.parallel = parallel
 
     def run(self, test):
         "Run the given test case or test suite."
-        result, _ = self._list(test)
+        if self.parallel and self.parallel > 1 and "fork" in multiprocessing.get_all_start_methods():
+            return self.run_parallel(test, self.parallel)
+        output, _ = self._list(test)
+        result = self._decorate(output)
+        with self._stdout_through(output.output_stream):
+            result.startTestRun()
+            try:
+                test(result)
+            finally:
+                result.stopTestRun()
+        return result
+
+    @contextmanager
+    def _stdout_through(self, stream):
+        """Send what tests print to sys.stdout through stream while they run.
+
+        With a flush policy, packets are buffered in stream. Output written
+        straight to the same file descriptor would overtake packets reported
+        before it, and appear to belong to the wrong test.
+        """
+        if self.flush_policy is None or not _same_file(stream, sys.stdout):
+            yield
+            return
+        stdout = sys.stdout
+        sys.stdout = io.TextIOWrapper(stream, encoding=stdout.encoding, errors=stdout.errors, write_through=True)
+        try:
+            yield
+        finally:
+            # Leave stream open for the packets still to be written.
+            sys.stdout.detach()
+            sys.stdout = stdout
+
+    def _decorate(self, result):
         result = ExtendedToStreamDecorator(result)
         result = AutoTimingTestResultDecorator(result)
         if self.failfast is not None:
             result.failfast = self.failfast
             result.tb_locals = self.tb_locals
-        result.startTestRun()
+        return result
+
+    def run_parallel(self, test, workers):
+        """Run the given test case or test suite in worker processes.
+
+        The tests are split into batches of consecutive tests, so that tests
+        sharing class and module fixtures mostly stay together, and each
+        worker takes the next batch whenever it finishes one. Workers are
+        forked, so see the tests as they were loaded, and write v2 to pipes;
+        their packets are copied to the output unchanged, with the route
+        code of the worker (0, 1 ...) that ran them. Output a worker writes
+        that is not subunit is passed on as "stdout" with its route code.
+
+        A worker that stops before running all of the batches it took, for
+        instance because a test raised SystemExit, is reported as a failure
+        of the test id "subunit.run.worker".
+
+        :param workers: The number of worker processes.
+        :return: An object whose wasSuccessful() is True if every test
+            passed.
+        """
+        tests = list(iterate_tests(test))
+        output, _ = self._list(test)
+        workers = max(1, min(workers, len(tests)))
+        size = max(1, min(self.batch_size, len(tests) // (workers * 16)))
+        batches = [tests[start : start + size] for start in range(0, len(tests), size)]
+        context = multiprocessing.get_context("fork")
+        next_batch = context.Value("i", 0)
+        states = context.Array("b", workers)
+        multiplexer = Multiplexer()
+        processes = []
+        output.startTestRun()
+        # Anything still buffered would be written again by every worker.
+        sys.stdout.flush()
+        sys.stderr.flush()
         try:
-            test(result)
+            for number in range(workers):
+                read_fd, write_fd = os.pipe()
+                process = context.Process(
+                    target=self._run_worker,
+                    args=(batches, next_batch, states, number, write_fd),
+                    name="subunit.run worker %d" % number,
+                )
+                process.start()
+                os.close(write_fd)
+                processes.append(process)
+                multiplexer.add(read_fd, _WorkerOutput(output, str(number)))
+            while multiplexer:
+                multiplexer.pump()
         finally:
-            result.stopTestRun()
-        return result
+            multiplexer.close()
+            for process in processes:
+                process.join()
+        for number, process in enumerate(processes):
+            if states[number] == _WORKER_RUNNING:
+                output.status(
+                    test_id="subunit.run.worker",
+                    file_name="reason",
+                    file_bytes=(
+                        "Worker %d stopped before finishing its tests, with exit code %s." % (number, process.exitcode)
+                    ).encode("utf8"),
+                    mime_type="text/plain;charset=utf8",
+                    eof=True,
+                    route_code=str(number),
+                )
+                output.status(test_id="subunit.run.worker", test_status="fail", route_code=str(number))
+        output.stopTestRun()
+        return _ParallelRun(all(state == _WORKER_SUCCEEDED for state in states))
+
+    def _run_worker(self, batches, next_batch, states, number, write_fd):
+        """Run batches of tests in a worker process, until none are left."""
+        # Anything the tests write to stdout goes down the pipe too, as it
+        # would go to the output when running serially. The stream is
+        # unbuffered so that packets are written whole.
+        os.dup2(write_fd, 1)
+        stream = os.fdopen(write_fd, "wb", 0)
+        result = self._decorate(RoutingStreamResult(StreamResultToBytes(stream), str(number)))
+        result.startTestRun()
+        while True:
+            with next_batch.get_lock():
+                batch = next_batch.value
+                next_batch.value += 1
+            if batch >= len(batches):
+                break
+            unittest.TestSuite(batches[batch])(result)
+            sys.stdout.flush()
+            if result.shouldStop:
+                break
+        result.stopTestRun()
+        stream.close()
+        states[number] = _WORKER_SUCCEEDED if result.wasSuccessful() else _WORKER_FAILED
 
     def list(self, test, loader=None):
         "List the test."
@@ -76,6 +260,9 @@ class SubunitTestRunner(object):
             result.status(
                 file_name="import errors", runnable=False, file_bytes=failed_descr, mime_type="text/plain;charset=utf8"
             )
+        # Flush whatever the flush policy held back.
+        result.stopTestRun()
+        if errors:
             sys.exit(2)
 
     def _list(self, test):
@@ -84,19 +271,87 @@ class SubunitTestRunner(object):
             fileno = self.stream.fileno()
         except:  # noqa: E722
             fileno = None
-        if fileno is not None:
+        if fileno is None:
+            stream = self.stream
+        elif self.flush_policy is None:
             stream = os.fdopen(fileno, "wb", 0)
         else:
-            stream = self.stream
-        result = StreamResultToBytes(stream)
+            stream = os.fdopen(fileno, "wb", closefd=False)
+        result = StreamResultToBytes(stream, flush_policy=self.flush_policy)
         for test_id in test_ids:
             result.status(test_id=test_id, test_status="exists")
         return result, errors
 
 
+def _same_file(stream, other):
+    """Return whether two streams write to the same file descriptor."""
+    try:
+        return stream.fileno() == other.fileno()
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
 class SubunitTestProgram(TestProgram):
     USAGE = USAGE_AS_MAIN
 
+    def _getParentArgParser(self):
+        parser = super()._getParentArgParser()
+        parser.add_argument(
+            "--flush",
+            dest="flush",
+            default=None,
+            type=make_flush_policy,
+            metavar="POLICY",
+            help="When to flush output: after every 'packet' (the default), "
+            "only at test 'boundary' packets, every 'bytes:SIZE' bytes or "
+            "within 'interval:SECONDS' of a write.",
+        )
+        parser.add_argument(
+            "--parallel",
+            dest="parallel",
+            default=None,
+            type=int,
+            metavar="N",
+            help="Run tests in N forked worker processes, giving each worker's results its own route code.",
+        )
+        parser.add_argument(
+            "--shard",
+            dest="shard",
+            default=None,
+            type=parse_shard,
+            metavar="INDEX/COUNT",
+            help="Only run shard INDEX of COUNT shards of the tests, counting from 1.",
+        )
+        parser.add_argument(
+            "--shard-timings",
+            dest="shard_timings",
+            default=None,
+            metavar="FILE",
+            help="A subunit stream from a previous run, used to balance the running time of --shard shards.",
+        )
+        return parser
+
+    def parseArgs(self, argv):
+        super().parseArgs(argv)
+        if getattr(self, "shard", None) is not None:
+            self.test = self._select_shard(self.test, *self.shard)
+
+    def _select_shard(self, test, index, count):
+        durations = None
+        if self.shard_timings:
+            with open(self.shard_timings, "rb") as timings:
+                durations = read_durations(timings)
+        test_ids = [case.id() for case in iterate_tests(test)]
+        return filter_by_ids(test, set(select_shard(test_ids, index, count, durations)))
+
+    def _get_runner(self):
+        runner = super()._get_runner()
+        if getattr(self, "flush", None) is not None:
+            runner.flush_policy = self.flush
+        if getattr(self, "parallel", None) is not None:
+            runner.parallel = self.parallel
+        return runner
+
     def usageExit(self, msg=None):
         if msg:
             print(msg)
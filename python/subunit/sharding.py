@@ -0,0 +1,147 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Splitting a test suite into shards of similar running time.
+
+Each machine running part of a suite works out the same assignment of test
+ids to shards from the same inputs, and runs only its own shard::
+
+    with open("previous.subunit", "rb") as stream:
+        durations = read_durations(stream)
+    index, count = parse_shard("2/4")
+    test_ids = select_shard(all_test_ids, index, count, durations)
+
+Tests that took time before are packed longest first, each onto the shard
+with the least time so far. Tests with no timing history are placed by a
+stable hash of their id, so they stay where they were as the suite grows.
+"""
+
+import heapq
+import zlib
+
+from subunit.v2 import ByteStreamToStreamResult
+
+__all__ = [
+    "assign_shards",
+    "parse_shard",
+    "read_durations",
+    "select_shard",
+]
+
+# How much of a timing stream to read at once.
+_READ_SIZE = 65536
+
+
+def parse_shard(text):
+    """Parse a shard given as INDEX/COUNT, with INDEX counting from 1.
+
+    :return: A tuple (index, count), with index counting from 0.
+    :raises ValueError: If text is not of that form.
+    """
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError("shard %r is not INDEX/COUNT" % (text,))
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise ValueError("shard %r is not INDEX/COUNT with 1 <= INDEX <= COUNT" % (text,))
+    return index - 1, count
+
+
+class _TestSpans(object):
+    """Note the first and last timestamp of each test's packets."""
+
+    def __init__(self):
+        self.spans = {}
+
+    def status(self, test_id=None, timestamp=None, **kwargs):
+        if test_id is None or timestamp is None:
+            return
+        span = self.spans.get(test_id)
+        if span is None:
+            self.spans[test_id] = [timestamp, timestamp]
+        else:
+            span[0] = min(span[0], timestamp)
+            span[1] = max(span[1], timestamp)
+
+
+def read_durations(stream):
+    """Find how long each test took in a subunit v2 stream.
+
+    :param stream: A binary file object with the output of a previous run.
+    :return: A dict from test id to the seconds between the first and last
+        timestamps of its packets.
+    """
+    spans = _TestSpans()
+    ByteStreamToStreamResult(
+        stream,
+        non_subunit_name="stdout",
+        buffer_size=_READ_SIZE,
+        fields={"test_id", "timestamp"},
+        integer_timestamps=True,
+    ).run(spans)
+    return {test_id: (end - start) / 1e9 for test_id, (start, end) in spans.spans.items()}
+
+
+def _stable_shard(test_id, count):
+    # Python's hash() of a str differs between processes.
+    return zlib.crc32(test_id.encode("utf8")) % count
+
+
+def assign_shards(test_ids, count, durations=None):
+    """Split test ids into count shards of similar total duration.
+
+    The assignment depends only on the set of test ids and their durations,
+    not on their order, so every machine computes the same one.
+
+    :param test_ids: The ids of the tests to split.
+    :param count: The number of shards.
+    :param durations: A dict from test id to its duration in seconds, as
+        returned by read_durations(). Tests not in it are placed by a hash of
+        their id, and counted as taking the mean of the known durations.
+    :return: A list of count sets of test ids.
+    """
+    durations = durations or {}
+    shards = [set() for _ in range(count)]
+    loads = [0.0] * count
+    timed = []
+    for test_id in sorted(set(test_ids)):
+        if test_id in durations:
+            timed.append(test_id)
+        else:
+            shards[_stable_shard(test_id, count)].add(test_id)
+    if durations:
+        estimate = sum(durations.values()) / len(durations)
+        for index, shard in enumerate(shards):
+            loads[index] = estimate * len(shard)
+    heap = [(load, index) for index, load in enumerate(loads)]
+    heapq.heapify(heap)
+    for test_id in sorted(timed, key=lambda test_id: -durations[test_id]):
+        load, index = heapq.heappop(heap)
+        shards[index].add(test_id)
+        heapq.heappush(heap, (load + durations[test_id], index))
+    return shards
+
+
+def select_shard(test_ids, index, count, durations=None):
+    """Return the test ids in one shard of a suite.
+
+    :param index: The shard to return, counting from 0.
+    :param count: The number of shards; see assign_shards().
+    :return: The ids in the shard, in the order they were given.
+    """
+    shard = assign_shards(test_ids, count, durations)[index]
+    return [test_id for test_id in test_ids if test_id in shard]
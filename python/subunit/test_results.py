@@ -18,6 +18,7 @@
 
 import csv
 import datetime
+import threading
 
 import testtools
 from testtools import StreamResult, TestResultDecorator, TestByTestResult
@@ -607,3 +608,161 @@ class CatFiles(StreamResult):
         if file_name is not None:
             self.stream.write(file_bytes)
             self.stream.flush()
+
+
+# Statuses which do not finish a test.
+_INTERIM_STATUSES = (None, "exists", "inprogress")
+
+
+class PassthroughPolicy(StreamResult):
+    """Coalesce and limit the non-test output passed on to a result.
+
+    File content without a test id - usually non subunit input that a parser
+    has wrapped up as "stdout" - is gathered until window_size bytes are
+    pending, or latency seconds have passed since the first of them, and is
+    then passed on as one event. A timer passes on content that nothing else
+    follows, so a prompt is never held back for longer than latency. Every
+    other event is passed straight on, after any content pending before it.
+
+    If max_bytes is set, at most that much non-test content is passed on per
+    test: the allowance is renewed each time a test finishes. Content beyond
+    it is dropped and a marker written in its place; how many bytes were
+    dropped is reported in the same file just before the test finishes, or
+    when the run stops. The dropped attribute counts all bytes dropped.
+    """
+
+    def __init__(self, target, window_size=65536, latency=0.05, max_bytes=None):
+        """Create a PassthroughPolicy.
+
+        :param target: The StreamResult to pass events on to.
+        :param window_size: The most non-test bytes to gather into one event.
+            0 passes content on as it arrives.
+        :param latency: The longest time, in seconds, to hold non-test content
+            back. 0 passes content on as it arrives.
+        :param max_bytes: The most non-test bytes to pass on per test, or None
+            to pass everything on.
+        """
+        super().__init__()
+        self.target = target
+        self.window_size = window_size
+        self.latency = latency
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        # Calls to target come from the timer thread too.
+        self._lock = threading.RLock()
+        self._timer = None
+        self._pending = bytearray()
+        self._pending_key = None
+        self._pending_eof = False
+        self._pending_timestamp = None
+        self._remaining = max_bytes
+        self._dropped_key = None
+        self._dropped_here = 0
+
+    def startTestRun(self):
+        with self._lock:
+            self._remaining = self.max_bytes
+            self.target.startTestRun()
+
+    def stopTestRun(self):
+        with self._lock:
+            self._flush()
+            self._report_dropped()
+            self.target.stopTestRun()
+
+    def status(
+        self,
+        test_id=None,
+        test_status=None,
+        test_tags=None,
+        runnable=True,
+        file_name=None,
+        file_bytes=None,
+        eof=False,
+        mime_type=None,
+        route_code=None,
+        timestamp=None,
+    ):
+        with self._lock:
+            if test_id is None and test_status is None and not test_tags and file_name is not None:
+                self._add(file_name, file_bytes, eof, mime_type, route_code, timestamp)
+                return
+            self._flush()
+            if test_id is not None and test_status not in _INTERIM_STATUSES:
+                self._report_dropped()
+                self._remaining = self.max_bytes
+            self.target.status(
+                test_id=test_id,
+                test_status=test_status,
+                test_tags=test_tags,
+                runnable=runnable,
+                file_name=file_name,
+                file_bytes=file_bytes,
+                eof=eof,
+                mime_type=mime_type,
+                route_code=route_code,
+                timestamp=timestamp,
+            )
+
+    def _add(self, file_name, file_bytes, eof, mime_type, route_code, timestamp):
+        key = (file_name, mime_type, route_code)
+        if key != self._pending_key:
+            self._flush()
+            self._pending_key = key
+            self._pending_timestamp = timestamp
+        if self._remaining is not None and len(file_bytes) > self._remaining:
+            dropped = len(file_bytes) - self._remaining
+            self.dropped += dropped
+            if not self._dropped_here:
+                self._dropped_key = key
+                self._pending += file_bytes[: self._remaining]
+                self._pending += b"\n[subunit: output truncated]\n"
+            self._dropped_here += dropped
+            self._remaining = 0
+        else:
+            self._pending += file_bytes
+            if self._remaining is not None:
+                self._remaining -= len(file_bytes)
+        self._pending_eof = eof
+        if eof or len(self._pending) >= self.window_size or not self.latency:
+            self._flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.latency, self._expired)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expired(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending_key is None:
+            return
+        file_name, mime_type, route_code = self._pending_key
+        file_bytes = bytes(self._pending)
+        self._pending.clear()
+        self._pending_key = None
+        if not file_bytes and not self._pending_eof:
+            # Everything was dropped.
+            return
+        self.target.status(
+            file_name=file_name,
+            file_bytes=file_bytes,
+            eof=self._pending_eof,
+            mime_type=mime_type,
+            route_code=route_code,
+            timestamp=self._pending_timestamp,
+        )
+
+    def _report_dropped(self):
+        if not self._dropped_here:
+            return
+        file_name, mime_type, route_code = self._dropped_key
+        message = "[subunit: %d bytes of output dropped]\n" % self._dropped_here
+        self._dropped_here = 0
+        self.target.status(
+            file_name=file_name, file_bytes=message.encode("utf8"), mime_type=mime_type, route_code=route_code
+        )
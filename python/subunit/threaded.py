@@ -0,0 +1,129 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Writing one subunit v2 stream from many threads.
+
+StreamResultToBytes writes each packet with a loop that allows for partial
+writes, so two threads calling status() at once can interleave the bytes of
+their packets. ThreadedStreamResultToBytes hands packets to a single writer
+thread instead::
+
+    result = ThreadedStreamResultToBytes(sys.stdout)
+    result.startTestRun()
+    # status() from any number of threads.
+    result.stopTestRun()
+"""
+
+import queue
+import threading
+
+from subunit.v2 import StreamResultToBytes
+
+__all__ = [
+    "ThreadedStreamResultToBytes",
+]
+
+# Tells the writer thread to stop.
+_STOP = object()
+
+
+class ThreadedStreamResultToBytes(StreamResultToBytes):
+    """Convert StreamResult API calls from many threads to bytes.
+
+    status() may be called from several threads at once. Each call encodes
+    its packets in the calling thread and puts them on a bounded queue, which
+    blocks the caller when the writer falls behind. A writer thread joins
+    whatever packets have queued up, up to write_size bytes, into a single
+    write. Packets are always written whole, and those from any one thread
+    are written in the order it produced them.
+
+    The writer thread is started by the first packet, and stopped by
+    stopTestRun() once everything queued before it has been written. An
+    error writing to the stream is raised from the next status() call, or
+    from stopTestRun().
+    """
+
+    # The most bytes to join into one write.
+    write_size = 1048576
+
+    def __init__(self, output_stream, queue_size=1024, integer_timestamps=False, flush_policy=None):
+        """Create a ThreadedStreamResultToBytes.
+
+        :param output_stream: A file-like object, as for StreamResultToBytes.
+        :param queue_size: The most packets to queue for the writer thread.
+        :param integer_timestamps: As for StreamResultToBytes.
+        :param flush_policy: As for StreamResultToBytes. The policy is only
+            consulted from the writer thread.
+        """
+        super().__init__(output_stream, integer_timestamps=integer_timestamps, flush_policy=flush_policy)
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._error = None
+
+    def stopTestRun(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+        super().stopTestRun()
+        error = self._error
+        if error is not None:
+            self._error = None
+            raise error
+
+    def _write_bytes(self, data, boundary=None):
+        if self._error is not None:
+            raise self._error
+        if boundary is None:
+            # The low bits of the flags hold the test status.
+            boundary = bool(data[2] & 0x07)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_queued, name="subunit writer", daemon=True)
+                self._thread.start()
+        self._queue.put((data, boundary))
+
+    def _write_queued(self):
+        write = super()._write_bytes
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            packets = [item[0]]
+            size = len(item[0])
+            boundary = item[1]
+            while size < self.write_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                packets.append(item[0])
+                size += len(item[0])
+                boundary = boundary or item[1]
+            if self._error is not None:
+                # Keep draining the queue so that producers do not block.
+                continue
+            try:
+                write(packets[0] if len(packets) == 1 else b"".join(packets), boundary)
+            except Exception as error:
+                self._error = error
@@ -16,6 +16,11 @@
 
 import codecs
 import datetime
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+import mmap
+import os
 import select
 import struct
 import sys
@@ -23,12 +28,24 @@ import zlib
 
 import subunit
 import iso8601
+from subunit.flushing import FlushEveryPacket
 
 utf_8_decode = codecs.utf_8_decode
 
 __all__ = [
+    "BatchingStreamResult",
+    "ByteStreamDecoder",
+    "ByteStreamToPackets",
     "ByteStreamToStreamResult",
+    "MappedFileToStreamResult",
+    "Packet",
+    "ParallelFileToStreamResult",
     "StreamResultToBytes",
+    "find_packet",
+    "nanoseconds_to_timestamp",
+    "read_packets",
+    "status_batch",
+    "timestamp_to_nanoseconds",
 ]
 
 SIGNATURE = b"\xb3"
@@ -47,6 +64,19 @@ FLAG_EOF = 0x0010
 FLAG_FILE_CONTENT = 0x0040
 EPOCH = datetime.datetime.fromtimestamp(0, tz=iso8601.UTC)
 NUL_ELEMENT = b"\0"[0]
+# The file content types status() writes directly rather than reading.
+_BYTES_TYPES = (bytes, bytearray, memoryview)
+# Statuses which may be given before a test's attachments are complete.
+_INTERIM_STATUSES = (None, "exists", "inprogress")
+# The most skipped bytes to report in a resynchronisation parser error.
+_SKIPPED_SAMPLE_SIZE = 4096
+# The encoder writes fields after room for the longest header: the
+# signature, flags and a three byte length.
+_HEADER_ROOM = 6
+SIGNATURE_BYTE = SIGNATURE[0]
+_pack_16_into = struct.Struct(FMT_16).pack_into
+_pack_32 = struct.Struct(FMT_32).pack
+_SMALL_VARINTS = [struct.pack(FMT_8, value) for value in range(64)]
 # Contains True for types for which 'nul in thing' falsely returns false.
 _nul_test_broken: dict[type, bool] = {}
 
@@ -69,10 +99,71 @@ def read_exactly(stream, size):
     return data
 
 
+def timestamp_to_nanoseconds(timestamp):
+    """Convert a timezone aware datetime to integer nanoseconds since the epoch."""
+    since_epoch = timestamp - EPOCH
+    return (since_epoch.days * 86400 + since_epoch.seconds) * 1000000000 + since_epoch.microseconds * 1000
+
+
+def nanoseconds_to_timestamp(nanoseconds):
+    """Convert integer nanoseconds since the epoch to a UTC datetime.
+
+    Precision beyond microseconds is lost, as it is when a packet timestamp
+    is decoded to a datetime.
+    """
+    seconds, nanoseconds = divmod(nanoseconds, 1000000000)
+    return EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoseconds / 1000)
+
+
 class ParseError(Exception):
     """Used to pass error messages within the parser."""
 
 
+def _read_into(source, view):
+    """Read from source until view is full or source is exhausted.
+
+    :return: The number of bytes read into view.
+    """
+    readinto = getattr(source, "readinto", None)
+    filled = 0
+    while filled < len(view):
+        if readinto is not None:
+            count = readinto(view[filled:])
+        else:
+            data = source.read(len(view) - filled)
+            count = len(data)
+            view[filled : filled + count] = data
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+class _PacketTooLong(ValueError):
+    """A packet would be longer than the protocol allows."""
+
+
+def _encode_varint(value):
+    """Encode a number as the protocol's variable length integer."""
+    assert value >= 0
+    if value < 64:
+        return _SMALL_VARINTS[value]
+    elif value < 16384:
+        return _pack_32(value | 0x4000)[2:]
+    elif value < 4194304:
+        return _pack_32(value | 0x800000)[1:]
+    elif value < 1073741824:
+        return _pack_32(value | 0xC0000000)
+    else:
+        raise _PacketTooLong("value too large to encode: %r" % (value,))
+
+
+def _encode_string(a_string):
+    """Return the length prefixed UTF-8 encoding of a_string."""
+    utf8 = a_string.encode("utf-8")
+    return _encode_varint(len(utf8)) + utf8
+
+
 class StreamResultToBytes(object):
     """Convert StreamResult API calls to bytes.
 
@@ -92,21 +183,47 @@ class StreamResultToBytes(object):
 
     zero_b = b"\0"[0]
 
-    def __init__(self, output_stream):
+    # Whether timestamps are given as integer nanoseconds since the epoch.
+    integer_timestamps = False
+
+    flush_policy = FlushEveryPacket()
+
+    # The most file content to put in each packet, leaving room below the
+    # 4MiB limit for other fields. Larger content is split across packets.
+    file_chunk_size = 3670016
+
+    # How many bytes status_batch() buffers between writes.
+    batch_buffer_size = 1048576
+
+    # How many encoded strings to cache.
+    encoding_cache_size = 1024
+    _encode_utf8 = None
+
+    def __init__(self, output_stream, integer_timestamps=False, flush_policy=None):
         """Create a StreamResultToBytes with output written to output_stream.
 
         :param output_stream: A file-like object. Must support write(bytes)
-            and flush() methods. Flush will be called after each write.
+            and flush() methods. By default flush will be called after each
+            write.
             The stream will be passed through subunit.make_stream_binary,
             to handle regular cases such as stdout.
+        :param integer_timestamps: If True, status() takes timestamps as
+            integer nanoseconds since the epoch rather than as datetimes,
+            and writes them at full precision.
+        :param flush_policy: If set to non-None, a policy from
+            subunit.flushing deciding when to flush output_stream. Whatever
+            the policy, the stream is flushed by stopTestRun.
         """
         self.output_stream = subunit.make_stream_binary(output_stream)
+        self.integer_timestamps = integer_timestamps
+        if flush_policy is not None:
+            self.flush_policy = flush_policy
 
     def startTestRun(self):
         pass
 
     def stopTestRun(self):
-        pass
+        self.flush_policy.close(self.output_stream)
 
     def status(
         self,
@@ -121,6 +238,16 @@ class StreamResultToBytes(object):
         route_code=None,
         timestamp=None,
     ):
+        """Write a status event.
+
+        File content larger than file_chunk_size is split into chunks of
+        that size, one per packet. Each packet carries the test id, route
+        code, file name and timestamp; tags, mime type and an interim status
+        such as "inprogress" go on the first packet, and eof and a final
+        status on the last. file_bytes may also be a file-like object with a
+        read() method, or an iterable of bytes, which is streamed in chunks
+        rather than read into memory.
+        """
         self._write_packet(
             test_id=test_id,
             test_status=test_status,
@@ -134,33 +261,88 @@ class StreamResultToBytes(object):
             timestamp=timestamp,
         )
 
-    def _write_utf8(self, a_string, packet):
-        utf8 = a_string.encode("utf-8")
-        self._write_number(len(utf8), packet)
-        packet.append(utf8)
-
-    def _write_len16(self, length, packet):
-        assert length < 65536
-        packet.append(struct.pack(FMT_16, length))
-
-    def _write_number(self, value, packet):
-        packet.extend(self._encode_number(value))
-
-    def _encode_number(self, value):
-        assert value >= 0
-        if value < 64:
-            return [struct.pack(FMT_8, value)]
-        elif value < 16384:
-            value = value | 0x4000
-            return [struct.pack(FMT_16, value)]
-        elif value < 4194304:
-            value = value | 0x800000
-            return [struct.pack(FMT_16, value >> 8), struct.pack(FMT_8, value & 0xFF)]
-        elif value < 1073741824:
-            value = value | 0xC0000000
-            return [struct.pack(FMT_32, value)]
-        else:
-            raise ValueError("value too large to encode: %r" % (value,))
+    def attach(
+        self,
+        file_name,
+        source,
+        mime_type=None,
+        test_id=None,
+        test_status=None,
+        test_tags=None,
+        runnable=True,
+        eof=True,
+        route_code=None,
+        timestamp=None,
+    ):
+        """Write the contents of a file as an attachment.
+
+        The file is read a chunk at a time into one reused buffer, so files
+        of any size are attached in constant memory. Packets carry the other
+        fields as described for status().
+
+        :param file_name: The name to give the attachment.
+        :param source: A path to open and read, or a binary file-like object
+            with a readinto() or read() method to read to its end.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as source:
+                return self.attach(
+                    file_name,
+                    source,
+                    mime_type=mime_type,
+                    test_id=test_id,
+                    test_status=test_status,
+                    test_tags=test_tags,
+                    runnable=runnable,
+                    eof=eof,
+                    route_code=route_code,
+                    timestamp=timestamp,
+                )
+        self._write_packet(
+            test_id=test_id,
+            test_status=test_status,
+            test_tags=test_tags,
+            runnable=runnable,
+            file_name=file_name,
+            file_bytes=source,
+            eof=eof,
+            mime_type=mime_type,
+            route_code=route_code,
+            timestamp=timestamp,
+        )
+
+    def status_batch(self, events):
+        """Write a sequence of status events with as few writes as possible.
+
+        The events are encoded into one buffer which is written, and offered
+        to the flush policy, as a whole. Up to about batch_buffer_size bytes
+        are buffered, so a long or lazily generated sequence is written in
+        several parts rather than held in memory.
+
+        :param events: An iterable of dicts of keyword arguments to status().
+        """
+        packets = []
+        pending = 0
+        for event in events:
+            for packet in self._encode_packets(**event):
+                packets.append(packet)
+                pending += len(packet)
+                if pending >= self.batch_buffer_size:
+                    self._write_batch(packets)
+                    packets = []
+                    pending = 0
+        if packets:
+            self._write_batch(packets)
+
+    def write_packet(self, packet):
+        """Write a Packet to the output stream exactly as it was read.
+
+        This avoids decoding and re-encoding packets that are passed through
+        unchanged, and means their CRC need not be recomputed.
+
+        :param packet: A Packet, e.g. from read_packets().
+        """
+        self._write_bytes(packet.data)
 
     def _write_packet(
         self,
@@ -175,45 +357,188 @@ class StreamResultToBytes(object):
         route_code=None,
         timestamp=None,
     ):
-        packet = [SIGNATURE]
-        packet.append(b"FF")  # placeholder for flags
-        # placeholder for length, but see below as length is variable.
-        packet.append(b"")
+        if file_name is None:
+            # Without file content the event is always a single packet.
+            self._write_bytes(
+                self._encode_packet(
+                    test_id=test_id,
+                    test_status=test_status,
+                    test_tags=test_tags,
+                    runnable=runnable,
+                    eof=eof,
+                    mime_type=mime_type,
+                    route_code=route_code,
+                    timestamp=timestamp,
+                )
+            )
+            return
+        for packet in self._encode_packets(
+            test_id=test_id,
+            test_status=test_status,
+            test_tags=test_tags,
+            runnable=runnable,
+            file_name=file_name,
+            file_bytes=file_bytes,
+            eof=eof,
+            mime_type=mime_type,
+            route_code=route_code,
+            timestamp=timestamp,
+        ):
+            self._write_bytes(packet)
+
+    def _encode_packets(
+        self,
+        test_id=None,
+        test_status=None,
+        test_tags=None,
+        runnable=True,
+        file_name=None,
+        file_bytes=None,
+        eof=False,
+        mime_type=None,
+        route_code=None,
+        timestamp=None,
+    ):
+        """Encode a status event as one or more packets, yielding their bytes."""
+        # Content known to need splitting is not copied into one packet first.
+        if file_name is None or (isinstance(file_bytes, _BYTES_TYPES) and len(file_bytes) <= self.file_chunk_size):
+            yield self._encode_packet(
+                test_id=test_id,
+                test_status=test_status,
+                test_tags=test_tags,
+                runnable=runnable,
+                file_name=file_name,
+                file_bytes=file_bytes,
+                eof=eof,
+                mime_type=mime_type,
+                route_code=route_code,
+                timestamp=timestamp,
+            )
+            return
+        # An interim status belongs with the first packet and a final one
+        # with the last, so the test is not finished before its files are.
+        interim = test_status in _INTERIM_STATUSES
+        first = True
+        for chunk, last in self._file_chunks(file_bytes):
+            yield self._encode_packet(
+                test_id=test_id,
+                test_status=test_status if (first if interim else last) else None,
+                test_tags=test_tags if first else None,
+                runnable=runnable,
+                file_name=file_name,
+                file_bytes=chunk,
+                eof=eof and last,
+                mime_type=mime_type if first else None,
+                route_code=route_code,
+                timestamp=timestamp,
+            )
+            first = False
+
+    def _file_chunks(self, source):
+        """Split file content into chunks of at most file_chunk_size bytes.
+
+        :return: An iterator of (chunk, last) tuples. There is always at
+            least one chunk, and the one marked last may be empty. Chunks
+            read from a file share one buffer, so each must be used before
+            the next is asked for.
+        """
+        size = self.file_chunk_size
+        if isinstance(source, _BYTES_TYPES):
+            view = memoryview(source)
+            for start in range(0, max(len(view), 1), size):
+                yield view[start : start + size], start + size >= len(view)
+        elif hasattr(source, "read"):
+            view = memoryview(bytearray(size))
+            while True:
+                count = _read_into(source, view)
+                # A short read means the file is exhausted, so the chunk is
+                # known to be the last without reading ahead.
+                yield view[:count], count < size
+                if count < size:
+                    return
+        else:
+            pending = None
+            for chunk in self._coalesce(source):
+                if pending is not None:
+                    yield pending, False
+                pending = chunk
+            yield pending or b"", True
+
+    def _coalesce(self, source):
+        """Join or split an iterable of bytes into file_chunk_size chunks."""
+        size = self.file_chunk_size
+        pending = bytearray()
+        for data in source:
+            if not pending and len(data) == size:
+                yield data
+                continue
+            pending += data
+            while len(pending) >= size:
+                yield bytes(pending[:size])
+                del pending[:size]
+        if pending:
+            yield bytes(pending)
+
+    def _encode_packet(
+        self,
+        test_id=None,
+        test_status=None,
+        test_tags=None,
+        runnable=True,
+        file_name=None,
+        file_bytes=None,
+        eof=False,
+        mime_type=None,
+        route_code=None,
+        timestamp=None,
+    ):
+        """Encode a single packet, returning it as a bytearray."""
+        # Fields are written after room for the longest possible header,
+        # which is filled in and trimmed once the length is known.
+        packet = bytearray(_HEADER_ROOM)
         flags = 0x2000  # Version 0x2
         if timestamp is not None:
             flags = flags | FLAG_TIMESTAMP
-            since_epoch = timestamp - EPOCH
-            nanoseconds = since_epoch.microseconds * 1000
-            seconds = since_epoch.seconds + since_epoch.days * 24 * 3600
-            packet.append(struct.pack(FMT_32, seconds))
-            self._write_number(nanoseconds, packet)
+            if self.integer_timestamps:
+                seconds, nanoseconds = divmod(timestamp, 1000000000)
+            else:
+                since_epoch = timestamp - EPOCH
+                nanoseconds = since_epoch.microseconds * 1000
+                seconds = since_epoch.seconds + since_epoch.days * 24 * 3600
+            packet += _pack_32(seconds)
+            packet += _encode_varint(nanoseconds)
+        encode_utf8 = self._encode_utf8
+        if encode_utf8 is None:
+            # Runs repeat the same test ids, tags and file names on many
+            # packets, so their encodings are cached.
+            encode_utf8 = self._encode_utf8 = lru_cache(self.encoding_cache_size)(_encode_string)
         if test_id is not None:
             flags = flags | FLAG_TEST_ID
-            self._write_utf8(test_id, packet)
+            packet += encode_utf8(test_id)
         if test_tags:
             flags = flags | FLAG_TAGS
-            self._write_number(len(test_tags), packet)
+            packet += _encode_varint(len(test_tags))
             for tag in test_tags:
-                self._write_utf8(tag, packet)
+                packet += encode_utf8(tag)
         if runnable:
             flags = flags | FLAG_RUNNABLE
         if mime_type:
             flags = flags | FLAG_MIME_TYPE
-            self._write_utf8(mime_type, packet)
+            packet += encode_utf8(mime_type)
         if file_name is not None:
             flags = flags | FLAG_FILE_CONTENT
-            self._write_utf8(file_name, packet)
-            self._write_number(len(file_bytes), packet)
-            packet.append(file_bytes)
+            packet += encode_utf8(file_name)
+            packet += _encode_varint(len(file_bytes))
+            packet += file_bytes
         if eof:
             flags = flags | FLAG_EOF
         if route_code is not None:
             flags = flags | FLAG_ROUTE_CODE
-            self._write_utf8(route_code, packet)
+            packet += encode_utf8(route_code)
         # 0x0008 - not used in v2.
         flags = flags | self.status_mask[test_status]
-        packet[1] = struct.pack(FMT_16, flags)
-        base_length = sum(map(len, packet)) + 4
+        # The signature, flags and CRC.
+        base_length = len(packet) - _HEADER_ROOM + 7
         if base_length <= 62:
             # one byte to encode length, 62+1 = 63
             length_length = 1
@@ -224,19 +549,23 @@ class StreamResultToBytes(object):
             # three bytes to encode length, 419430+3=4194303
             length_length = 3
         else:
-            # Longer than policy:
-            # TODO: chunk the packet automatically?
-            # - strip all but file data
-            # - do 4M chunks of that till done
-            # - include original data in final chunk.
-            raise ValueError("Length too long: %r" % base_length)
-        packet[2:3] = self._encode_number(base_length + length_length)
-        # We could either do a partial application of crc32 over each chunk
-        # or a single join to a temp variable then a final join
-        # or two writes (that python might then split).
-        # For now, simplest code: join, crc32, join, output
-        content = b"".join(packet)
-        data = content + struct.pack(FMT_32, zlib.crc32(content) & 0xFFFFFFFF)
+            # Longer than policy, even though status() splits file content
+            # into chunks: the other fields are too large.
+            raise _PacketTooLong("Length too long: %r" % base_length)
+        start = _HEADER_ROOM - 3 - length_length
+        packet[start] = SIGNATURE_BYTE
+        _pack_16_into(packet, start + 1, flags)
+        packet[start + 3 : _HEADER_ROOM] = _encode_varint(base_length + length_length)
+        # Deleting from the front of a bytearray does not copy the rest.
+        del packet[:start]
+        packet += _pack_32(zlib.crc32(packet))
+        return packet
+
+    def _write_batch(self, packets):
+        boundary = any(packet[2] & 0x07 for packet in packets)
+        self._write_bytes(b"".join(packets), boundary)
+
+    def _write_bytes(self, data, boundary=None):
         # On eventlet 0.17.3, GreenIO.write() can make partial write.
         # Use a loop to ensure that all bytes are written.
         # See also the eventlet issue:
@@ -249,26 +578,119 @@ class StreamResultToBytes(object):
             if written is None:
                 break
             offset += written
-        self.output_stream.flush()
+        if boundary is None:
+            # The low bits of the flags hold the test status.
+            boundary = bool(data[2] & 0x07)
+        self.flush_policy.wrote(self.output_stream, datalen, boundary)
 
 
-class ByteStreamToStreamResult(object):
-    """Parse a subunit byte stream.
+def status_batch(result, events):
+    """Deliver a sequence of status events to result.
 
-    Mixed streams that contain non-subunit content is supported when a
-    non_subunit_name is passed to the constructor. The default is to raise an
-    error containing the non-subunit byte after it has been read from the
-    stream.
+    Results with a status_batch() method, such as StreamResultToBytes, are
+    given the whole sequence at once; other results get a status() call per
+    event.
 
-    Typical use:
+    :param result: A StreamResult.
+    :param events: An iterable of dicts of keyword arguments to status().
+    """
+    batch = getattr(result, "status_batch", None)
+    if batch is not None:
+        batch(events)
+        return
+    for event in events:
+        result.status(**event)
 
-       >>> case = ByteStreamToStreamResult(sys.stdin.buffer)
-       >>> result = StreamResult()
-       >>> result.startTestRun()
-       >>> case.run(result)
-       >>> result.stopTestRun()
+
+class BatchingStreamResult(object):
+    """Gather status events and pass them on to a StreamResult in batches.
+
+    Events are delivered with status_batch() once batch_size have been
+    gathered, and when flush() or stopTestRun() is called.
     """
 
+    def __init__(self, target, batch_size=4096):
+        """Create a BatchingStreamResult.
+
+        :param target: The StreamResult to deliver events to.
+        :param batch_size: The number of events to gather per batch.
+        """
+        self.target = target
+        self.batch_size = batch_size
+        self._pending = []
+
+    def startTestRun(self):
+        self.target.startTestRun()
+
+    def stopTestRun(self):
+        self.flush()
+        self.target.stopTestRun()
+
+    def status(self, **kwargs):
+        self._pending.append(kwargs)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Deliver any gathered events to the target."""
+        if self._pending:
+            pending = self._pending
+            self._pending = []
+            status_batch(self.target, pending)
+
+
+# The flag bits that say whether a packet carries each field, for field
+# projection. runnable and eof are flags themselves and always decoded.
+_FIELD_FLAGS = {
+    "test_id": FLAG_TEST_ID,
+    "test_status": 0x0007,
+    "test_tags": FLAG_TAGS,
+    "runnable": 0,
+    "file_name": FLAG_FILE_CONTENT,
+    "file_bytes": FLAG_FILE_CONTENT,
+    "eof": 0,
+    "mime_type": FLAG_MIME_TYPE,
+    "route_code": FLAG_ROUTE_CODE,
+    "timestamp": FLAG_TIMESTAMP,
+}
+
+
+class _InternCache(object):
+    """A bounded mapping which evicts its least recently used entries."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+class _PacketDecoder(object):
+    """Decoding of packet fields, shared by the v2 parsers."""
+
+    # The status() arguments to decode, or None to decode them all.
+    _fields = None
+    # The flag bits of which a packet must have at least one to be emitted.
+    _field_mask = 0
+    # A predicate on packet flags selecting the packets to emit.
+    _packet_filter = None
+    # Whether to emit non subunit content.
+    _non_subunit_wanted = True
+    # Whether to emit timestamps as integer nanoseconds since the epoch.
+    _integer_timestamps = False
+    # Decoded strings and tag sets by their encoding, when interning.
+    _strings = None
+    _tag_sets = None
+
     status_lookup = {
         0x0: None,
         0x1: "exists",
@@ -280,124 +702,49 @@ class ByteStreamToStreamResult(object):
         0x7: "xfail",
     }
 
-    def __init__(self, source, non_subunit_name=None):
-        """Create a ByteStreamToStreamResult.
+    def _set_projection(self, fields, packet_filter):
+        """Limit decoding to what a consumer uses.
 
-        :param source: A file like object to read bytes from. Must support
-            read(<count>) and return bytes. The file is not closed by
-            ByteStreamToStreamResult. subunit.make_stream_binary() is
-            called on the stream to get it into bytes mode.
-        :param non_subunit_name: If set to non-None, non subunit content
-            encountered in the stream will be converted into file packets
-            labelled with this name.
+        See ByteStreamToStreamResult for the fields and packet_filter
+        parameters.
         """
-        self.non_subunit_name = non_subunit_name
-        self.source = subunit.make_stream_binary(source)
-        self.codec = codecs.lookup("utf8").incrementaldecoder()
+        if fields is not None:
+            fields = frozenset(fields)
+            unknown = fields - set(_FIELD_FLAGS)
+            if unknown:
+                raise ValueError("Unknown fields: %s" % ", ".join(sorted(unknown)))
+            self._fields = fields
+            self._field_mask = 0
+            for field in fields:
+                self._field_mask |= _FIELD_FLAGS[field]
+            self._non_subunit_wanted = bool(self._field_mask & FLAG_FILE_CONTENT)
+        self._packet_filter = packet_filter
 
-    def run(self, result):
-        """Parse source and emit events to result.
+    def _set_intern_size(self, intern_size):
+        """Share decoded strings and tag sets between packets.
 
-        This is a blocking call: it will run until EOF is detected on source.
+        See ByteStreamToStreamResult for the intern_size parameter.
         """
-        self.codec.reset()
-        mid_character = False
-        while True:
-            # We're in blocking mode; read one char
-            content = self.source.read(1)
-            if not content:
-                # EOF
-                return
-            if not mid_character and content[0] == SIGNATURE[0]:
-                self._parse_packet(result)
-                continue
-            if self.non_subunit_name is None:
-                raise Exception("Non subunit content", content)
-            try:
-                if self.codec.decode(content):
-                    # End of a character
-                    mid_character = False
-                else:
-                    mid_character = True
-            except UnicodeDecodeError:
-                # Bad unicode, not our concern.
-                mid_character = False
-            # Aggregate all content that is not subunit until either
-            # 1MiB is accumulated or 50ms has passed with no input.
-            # Both are arbitrary amounts intended to give a simple
-            # balance between efficiency (avoiding death by a thousand
-            # one-byte packets), buffering (avoiding overlarge state
-            # being hidden on intermediary nodes) and interactivity
-            # (when driving a debugger, slow response to typing is
-            # annoying).
-            buffered = [content]
-            while len(buffered[-1]):
-                # Note: Windows does not support passing a file descriptor to
-                # select.select. fallback to one-byte-at-a-time.
-                if sys.platform == "win32":
-                    break
+        if intern_size:
+            self._strings = _InternCache(intern_size)
+            self._tag_sets = _InternCache(intern_size)
 
-                try:
-                    self.source.fileno()
-                except:  # noqa: E722
-                    # Won't be able to select, fallback to
-                    # one-byte-at-a-time.
-                    break
-                # Note: this has a very low timeout because with stdin, the
-                # BufferedIO layer typically has all the content available
-                # from the stream when e.g. pdb is dropped into, leading to
-                # select always timing out when in fact we could have read
-                # (from the buffer layer) - we typically fail to aggregate
-                # any content on 3.x Pythons.
-                readable = select.select([self.source], [], [], 0.000001)[0]
-                if readable:
-                    content = self.source.read(1)
-                    if not len(content):
-                        # EOF - break and emit buffered.
-                        break
-                    if not mid_character and content[0] == SIGNATURE[0]:
-                        # New packet, break, emit buffered, then parse.
-                        break
-                    buffered.append(content)
-                    # Feed into the codec.
-                    try:
-                        if self.codec.decode(content):
-                            # End of a character
-                            mid_character = False
-                        else:
-                            mid_character = True
-                    except UnicodeDecodeError:
-                        # Bad unicode, not our concern.
-                        mid_character = False
-                if not readable or len(buffered) >= 1048576:
-                    # timeout or too much data, emit what we have.
-                    break
-            result.status(file_name=self.non_subunit_name, file_bytes=b"".join(buffered))
-            if mid_character or not len(content) or content[0] != SIGNATURE[0]:
-                continue
-            # Otherwise, parse a data packet.
-            self._parse_packet(result)
-
-    def _parse_packet(self, result):
-        try:
-            packet = [SIGNATURE]
-            self._parse(packet, result)
-        except ParseError as error:
-            result.status(
-                test_id="subunit.parser",
-                eof=True,
-                file_name="Packet data",
-                file_bytes=b"".join(packet),
-                mime_type="application/octet-stream",
-            )
-            result.status(
-                test_id="subunit.parser",
-                test_status="fail",
-                eof=True,
-                file_name="Parser Error",
-                file_bytes=(error.args[0]).encode("utf8"),
-                mime_type="text/plain;charset=utf8",
-            )
+    def _emit_parse_error(self, packet_data, message, result):
+        result.status(
+            test_id="subunit.parser",
+            eof=True,
+            file_name="Packet data",
+            file_bytes=packet_data,
+            mime_type="application/octet-stream",
+        )
+        result.status(
+            test_id="subunit.parser",
+            test_status="fail",
+            eof=True,
+            file_name="Parser Error",
+            file_bytes=message.encode("utf8"),
+            mime_type="text/plain;charset=utf8",
+        )
 
     def _parse_varint(self, data, pos, max_3_bytes=False):
         # because the only incremental IO we do is at the start, and the 32 bit
@@ -422,46 +769,39 @@ class ByteStreamToStreamResult(object):
             result = (value_0 << 24) | data_1 << 8 | data_2
             return result, 4
 
-    def _parse(self, packet, result):
-        # 2 bytes flags, at most 3 bytes length.
-        header = read_exactly(self.source, 5)
-        packet.append(header)
-        flags = struct.unpack(FMT_16, header[:2])[0]
-        length, consumed = self._parse_varint(header, 2, max_3_bytes=True)
+    def _decode_packet(self, packet, consumed, result):
+        """Decode a checksummed packet and emit it to result.
 
-        remainder = read_exactly(self.source, length - 6)
+        :param packet: The bytes of the packet, CRC included.
+        :param consumed: The number of bytes used by the length field.
+        """
+        flags = packet[1] << 8 | packet[2]
         if consumed != 3:
-            # Avoid having to parse torn values
-            packet[-1] += remainder
-            pos = 2 + consumed
+            self._parse_fields(flags, memoryview(packet)[1:-4], 2 + consumed, result)
         else:
-            # Avoid copying potentially lots of data.
-            packet.append(remainder)
-            pos = 0
-
-        crc = zlib.crc32(packet[0])
-        for fragment in packet[1:-1]:
-            crc = zlib.crc32(fragment, crc)
-
-        crc = zlib.crc32(packet[-1][:-4], crc) & 0xFFFFFFFF
-        packet_crc = struct.unpack(FMT_32, packet[-1][-4:])[0]
-
-        if crc != packet_crc:
-            # Bad CRC, report it and stop parsing the packet.
-            raise ParseError("Bad checksum - calculated (0x%x), stored (0x%x)" % (crc, packet_crc))
+            self._parse_fields(flags, memoryview(packet)[6:-4], 0, result)
 
-        body = memoryview(packet[-1])
-
-        # Discard CRC-32
-        body = body[:-4]
+    def _parse_fields(self, flags, body, pos, result):
+        """Decode the fields of a checksummed packet and emit them to result.
 
+        :param flags: The packet flags.
+        :param body: A buffer holding the packet fields, without the CRC-32.
+        :param pos: The offset within body of the first field.
+        """
+        if self._packet_filter is not None and not self._packet_filter(flags):
+            return
+        if self._fields is not None:
+            return self._parse_projected_fields(flags, body, pos, result)
         # One packet could have both file and status data; the Python API
         # presents these separately (perhaps it shouldn't?)
         if flags & FLAG_TIMESTAMP:
             seconds = struct.unpack(FMT_32, body[pos : pos + 4])[0]
             nanoseconds, consumed = self._parse_varint(body, pos + 4)
             pos = pos + 4 + consumed
-            timestamp = EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoseconds / 1000)
+            if self._integer_timestamps:
+                timestamp = seconds * 1000000000 + nanoseconds
+            else:
+                timestamp = EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoseconds / 1000)
         else:
             timestamp = None
 
@@ -471,12 +811,15 @@ class ByteStreamToStreamResult(object):
             test_id = None
 
         if flags & FLAG_TAGS:
-            tag_count, consumed = self._parse_varint(body, pos)
-            pos += consumed
-            test_tags = set()
-            for _ in range(tag_count):
-                tag, pos = self._read_utf8(body, pos)
-                test_tags.add(tag)
+            if self._tag_sets is not None:
+                test_tags, pos = self._read_interned_tags(body, pos)
+            else:
+                tag_count, consumed = self._parse_varint(body, pos)
+                pos += consumed
+                test_tags = set()
+                for _ in range(tag_count):
+                    tag, pos = self._read_utf8(body, pos)
+                    test_tags.add(tag)
         else:
             test_tags = None
 
@@ -521,7 +864,112 @@ class ByteStreamToStreamResult(object):
             timestamp=timestamp,
         )
 
-    __call__ = run
+    def _parse_projected_fields(self, flags, body, pos, result):
+        """Decode only the wanted fields of a packet, skipping the rest.
+
+        As _parse_fields, for when a projection has been set.
+        """
+        if not flags & self._field_mask:
+            return
+        fields = self._fields
+        timestamp = test_id = test_tags = mime_type = file_name = file_bytes = route_code = None
+        if flags & FLAG_TIMESTAMP:
+            if "timestamp" in fields:
+                seconds = struct.unpack(FMT_32, body[pos : pos + 4])[0]
+                nanoseconds, consumed = self._parse_varint(body, pos + 4)
+                if self._integer_timestamps:
+                    timestamp = seconds * 1000000000 + nanoseconds
+                else:
+                    timestamp = EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoseconds / 1000)
+            else:
+                consumed = self._parse_varint(body, pos + 4)[1]
+            pos = pos + 4 + consumed
+        if flags & FLAG_TEST_ID:
+            if "test_id" in fields:
+                test_id, pos = self._read_utf8(body, pos)
+            else:
+                pos = self._skip_bytes(body, pos)
+        if flags & FLAG_TAGS and "test_tags" in fields and self._tag_sets is not None:
+            test_tags, pos = self._read_interned_tags(body, pos)
+        elif flags & FLAG_TAGS:
+            tag_count, consumed = self._parse_varint(body, pos)
+            pos += consumed
+            if "test_tags" in fields:
+                test_tags = set()
+                for _ in range(tag_count):
+                    tag, pos = self._read_utf8(body, pos)
+                    test_tags.add(tag)
+            else:
+                for _ in range(tag_count):
+                    pos = self._skip_bytes(body, pos)
+        if flags & FLAG_MIME_TYPE:
+            if "mime_type" in fields:
+                mime_type, pos = self._read_utf8(body, pos)
+            else:
+                pos = self._skip_bytes(body, pos)
+        if flags & FLAG_FILE_CONTENT:
+            if "file_name" in fields:
+                file_name, pos = self._read_utf8(body, pos)
+            else:
+                pos = self._skip_bytes(body, pos)
+            if "file_bytes" in fields:
+                content_length, consumed = self._parse_varint(body, pos)
+                pos += consumed
+                file_bytes = body[pos : pos + content_length]
+                if len(file_bytes) != content_length:
+                    raise ParseError(
+                        "File content extends past end of packet: "
+                        "claimed %d bytes, %d available" % (content_length, len(file_bytes))
+                    )
+                pos += content_length
+            else:
+                pos = self._skip_bytes(body, pos)
+        if flags & FLAG_ROUTE_CODE and "route_code" in fields:
+            route_code = self._read_utf8(body, pos)[0]
+        result.status(
+            test_id=test_id,
+            test_status=self.status_lookup[flags & 0x0007] if "test_status" in fields else None,
+            test_tags=test_tags,
+            runnable=bool(flags & FLAG_RUNNABLE),
+            mime_type=mime_type,
+            eof=bool(flags & FLAG_EOF),
+            file_name=file_name,
+            file_bytes=file_bytes,
+            route_code=route_code,
+            timestamp=timestamp,
+        )
+
+    def _skip_bytes(self, buf, pos):
+        """Skip a length prefixed field without decoding it.
+
+        :return: The offset after the field.
+        """
+        length, consumed = self._parse_varint(buf, pos)
+        pos += consumed + length
+        if pos > len(buf):
+            raise ParseError("Field extends past end of packet")
+        return pos
+
+    def _read_interned_tags(self, buf, pos):
+        """Read a tag set, sharing it with packets that encode it the same.
+
+        :return: A frozenset of the tags and the offset after them.
+        """
+        tag_count, consumed = self._parse_varint(buf, pos)
+        end = pos + consumed
+        for _ in range(tag_count):
+            end = self._skip_bytes(buf, end)
+        key = bytes(buf[pos:end])
+        test_tags = self._tag_sets.get(key)
+        if test_tags is None:
+            tags = []
+            pos += consumed
+            for _ in range(tag_count):
+                tag, pos = self._read_utf8(buf, pos)
+                tags.append(tag)
+            test_tags = frozenset(tags)
+            self._tag_sets.put(key, test_tags)
+        return test_tags, end
 
     def _read_utf8(self, buf, pos):
         length, consumed = self._parse_varint(buf, pos)
@@ -532,6 +980,12 @@ class ByteStreamToStreamResult(object):
                 "UTF8 string at offset %d extends past end of packet: "
                 "claimed %d bytes, %d available" % (pos - 2, length, len(utf8_bytes))
             )
+        strings = self._strings
+        if strings is not None:
+            key = bytes(utf8_bytes)
+            utf8 = strings.get(key)
+            if utf8 is not None:
+                return utf8, length + pos
         if NUL_ELEMENT in utf8_bytes:
             raise ParseError("UTF8 string at offset %d contains NUL byte" % (pos - 2,))
         try:
@@ -541,6 +995,1013 @@ class ByteStreamToStreamResult(object):
                     "Invalid (partially decodable) string at "
                     "offset %d, %d undecoded bytes" % (pos - 2, length - decoded_bytes)
                 )
+            if strings is not None:
+                strings.put(key, utf8)
             return utf8, length + pos
         except UnicodeDecodeError:
             raise ParseError("UTF8 string at offset %d is not UTF8" % (pos - 2,))
+
+
+def _scan_non_subunit(utf8, buf, start, limit):
+    """Find the end of a run of non subunit content.
+
+    The run ends at the first signature at or after start that does not fall
+    within a UTF-8 character, or at limit.
+
+    :param utf8: An incremental UTF-8 decoder, with errors="replace", that
+        is fed the run so that it knows where characters start across calls.
+    :param buf: A bytes-like object supporting find().
+    :return: The offset in buf where the run ends.
+    """
+    view = memoryview(buf)
+    try:
+        while True:
+            found = buf.find(SIGNATURE, start, limit)
+            if found == -1:
+                utf8.decode(view[start:limit])
+                return limit
+            utf8.decode(view[start:found])
+            if not utf8.getstate()[0]:
+                return found
+            utf8.decode(SIGNATURE)
+            start = found + 1
+    finally:
+        view.release()
+
+
+def find_packet(buf, pos=0, final=True):
+    """Find the first packet at or after pos that passes its checksum.
+
+    :param buf: Bytes, or another buffer, to search.
+    :param pos: The offset to search from.
+    :param final: False if more content may follow buf. The search then
+        stops at a signature whose packet runs past the end of buf, as that
+        cannot be checked yet.
+    :return: A tuple of the offset the search stopped at, len(buf) if it
+        found nothing, and whether a packet that passes its checksum starts
+        there.
+    """
+    end = len(buf)
+    view = memoryview(buf)
+    try:
+        while True:
+            pos = buf.find(SIGNATURE, pos)
+            if pos == -1:
+                return end, False
+            if end - pos < 6:
+                return (end if final else pos), False
+            # The version nibble rules most false signatures out cheaply.
+            if buf[pos + 1] & 0xF0 == 0x20:
+                length = buf[pos + 3]
+                if length < 0x40:
+                    pass
+                elif length < 0x80:
+                    length = (length & 0x3F) << 8 | buf[pos + 4]
+                elif length < 0xC0:
+                    length = (length & 0x3F) << 16 | buf[pos + 4] << 8 | buf[pos + 5]
+                else:
+                    length = 0
+                if length > end - pos and not final:
+                    return pos, False
+                if 6 <= length <= end - pos:
+                    crc = zlib.crc32(view[pos : pos + length - 4]) & 0xFFFFFFFF
+                    if crc == struct.unpack_from(FMT_32, buf, pos + length - 4)[0]:
+                        return pos, True
+            pos += 1
+    finally:
+        view.release()
+
+
+class ByteStreamDecoder(_PacketDecoder):
+    """Incrementally parse a subunit byte stream pushed to it.
+
+    Unlike ByteStreamToStreamResult this does no IO: content is handed to
+    feed() in arbitrary slices as it arrives, and events are emitted to the
+    result as soon as each packet is complete. Partial packets are kept
+    between calls.
+
+    Typical use:
+
+       >>> decoder = ByteStreamDecoder(result)
+       >>> for data in chunks:
+       ...     decoder.feed(data)
+       >>> decoder.close()
+    """
+
+    # Whether packets must be copied out of the buffers they are framed in.
+    _copy_packets = True
+
+    def __init__(
+        self,
+        result,
+        non_subunit_name=None,
+        fields=None,
+        packet_filter=None,
+        integer_timestamps=False,
+        intern_size=None,
+        resync=False,
+    ):
+        """Create a ByteStreamDecoder.
+
+        :param result: A StreamResult to emit events to.
+        :param non_subunit_name: If set to non-None, non subunit content
+            will be converted into file packets labelled with this name.
+            Otherwise an exception is raised by feed() when non subunit
+            content is encountered, unless resync is set, in which case it
+            is skipped as corrupt.
+        :param fields: As for ByteStreamToStreamResult.
+        :param packet_filter: As for ByteStreamToStreamResult.
+        :param integer_timestamps: As for ByteStreamToStreamResult.
+        :param intern_size: As for ByteStreamToStreamResult.
+        :param resync: As for ByteStreamToStreamResult.
+        """
+        self.result = result
+        self.non_subunit_name = non_subunit_name
+        self._set_projection(fields, packet_filter)
+        self._integer_timestamps = integer_timestamps
+        self._set_intern_size(intern_size)
+        self.resync = resync
+        self._buffer = bytearray()
+        self._utf8 = codecs.getincrementaldecoder("utf8")(errors="replace")
+        self._mid_character = False
+        # The stream offset of the start of the content being framed.
+        self._offset = 0
+        # While skipping corrupt content: where it started, why, and its
+        # first bytes.
+        self._skip_start = None
+        self._skip_reason = None
+        self._skipped = bytearray()
+
+    def feed(self, data):
+        """Parse data, emitting events for every packet it completes.
+
+        :param data: A bytes-like object with the next slice of the stream.
+        """
+        if self._buffer or not isinstance(data, (bytes, bytearray)):
+            self._buffer += data
+            consumed = self._frame(self._buffer, False)
+            del self._buffer[:consumed]
+        else:
+            # Nothing is pending, so parse data directly and keep only what
+            # is left over.
+            consumed = self._frame(data, False)
+            self._buffer += memoryview(data)[consumed:]
+        self._offset += consumed
+
+    def close(self):
+        """Signal the end of the stream.
+
+        Any incomplete packet left over is reported as a parser error.
+        """
+        self._frame(self._buffer, True)
+        del self._buffer[:]
+        self._utf8.reset()
+        self._mid_character = False
+        self._offset = 0
+
+    def _packet(self, packet, consumed, offset):
+        """Handle a packet whose checksum has been verified.
+
+        :param packet: The bytes of the packet.
+        :param consumed: The number of bytes used by the length field.
+        :param offset: The offset of the packet in the content being framed.
+        """
+        try:
+            self._decode_packet(packet, consumed, self.result)
+        except ParseError as error:
+            self._emit_parse_error(packet, error.args[0], self.result)
+
+    def _frame(self, buf, final, pos=0, stop=None):
+        """Emit every complete packet and run of non subunit content in buf.
+
+        :param buf: A bytes-like object of unparsed content, supporting
+            find().
+        :param final: True if no more content will follow buf.
+        :param pos: The offset in buf to start at. It must be on a packet or
+            non subunit content boundary.
+        :param stop: If set, stop at the first boundary at or after this
+            offset rather than at the end of buf.
+        :return: The offset in buf up to which content was consumed.
+        """
+        result = self.result
+        end = len(buf)
+        if stop is None:
+            stop = end
+        view = memoryview(buf)
+        signature = SIGNATURE[0]
+        try:
+            if self._skip_start is not None:
+                pos = self._skip(buf, view, pos, None, final)
+            while pos < stop and self._skip_start is None:
+                if buf[pos] == signature and not self._mid_character:
+                    available = end - pos
+                    if available < 6:
+                        if not final:
+                            break
+                        reason = "Short read - got %d bytes, wanted 5 bytes" % (available - 1,)
+                        if self.resync:
+                            pos = self._skip(buf, view, pos, reason, final)
+                            continue
+                        self._emit_parse_error(SIGNATURE, reason, result)
+                        return end
+                    # The length varint, inline for speed; see _parse_varint.
+                    length = buf[pos + 3]
+                    if length < 0x40:
+                        consumed = 1
+                    elif length < 0x80:
+                        length = (length & 0x3F) << 8 | buf[pos + 4]
+                        consumed = 2
+                    elif length < 0xC0:
+                        length = (length & 0x3F) << 16 | buf[pos + 4] << 8 | buf[pos + 5]
+                        consumed = 3
+                    else:
+                        reason = "3 byte maximum given but 4 byte value found."
+                        if self.resync:
+                            pos = self._skip(buf, view, pos, reason, final)
+                            continue
+                        self._emit_parse_error(view[pos : pos + 6].tobytes(), reason, result)
+                        pos += 6
+                        continue
+                    if length < 6 or available < length:
+                        if not final and not (self.resync and length < 6):
+                            break
+                        reason = "Short read - got %d bytes, wanted %d bytes" % (available - 6, length - 6)
+                        if self.resync:
+                            pos = self._skip(buf, view, pos, reason, final)
+                            continue
+                        self._emit_parse_error(view[pos : pos + 6].tobytes(), reason, result)
+                        return end
+                    crc = zlib.crc32(view[pos : pos + length - 4]) & 0xFFFFFFFF
+                    if self.resync:
+                        packet_crc = struct.unpack_from(FMT_32, buf, pos + length - 4)[0]
+                        if crc != packet_crc:
+                            reason = "Bad checksum - calculated (0x%x), stored (0x%x)" % (crc, packet_crc)
+                            pos = self._skip(buf, view, pos, reason, final)
+                            continue
+                    if self._copy_packets:
+                        # Copy the packet out: file content is handed to
+                        # result as a view, and buf is reused.
+                        packet = view[pos : pos + length].tobytes()
+                    else:
+                        packet = view[pos : pos + length]
+                    pos += length
+                    packet_crc = struct.unpack_from(FMT_32, packet, length - 4)[0]
+                    if crc != packet_crc:
+                        self._emit_parse_error(
+                            packet, "Bad checksum - calculated (0x%x), stored (0x%x)" % (crc, packet_crc), result
+                        )
+                    else:
+                        self._packet(packet, consumed, pos - length)
+                    continue
+                if self.non_subunit_name is None:
+                    if self.resync:
+                        pos = self._skip(buf, view, pos, "Non subunit content.", final)
+                        continue
+                    raise Exception("Non subunit content", view[pos : pos + 1].tobytes())
+                # Aggregate content that is not subunit until the next
+                # signature that does not fall within a UTF-8 character, the
+                # end of the buffered content or 1MiB, whichever comes first.
+                chunk_end = _scan_non_subunit(self._utf8, buf, pos, min(end, pos + 1048576))
+                self._mid_character = bool(self._utf8.getstate()[0])
+                if self._non_subunit_wanted:
+                    result.status(file_name=self.non_subunit_name, file_bytes=view[pos:chunk_end].tobytes())
+                pos = chunk_end
+        finally:
+            view.release()
+        return pos
+
+    def _skip(self, buf, view, pos, reason, final):
+        """Skip corrupt content up to the next packet that passes its checksum.
+
+        Skipping carries on across calls to _frame until that packet is
+        found or the stream ends, and the whole of the skipped content is
+        then reported in one parser error.
+
+        :param pos: The offset in buf to skip from.
+        :param reason: Why the content at pos is corrupt, or None to carry
+            on skipping.
+        :return: The offset in buf that skipping stopped at.
+        """
+        if reason is not None:
+            self._skip_start = self._offset + pos
+            self._skip_reason = reason
+            found, valid = find_packet(buf, pos + 1, final)
+        else:
+            found, valid = find_packet(buf, pos, final)
+        if len(self._skipped) < _SKIPPED_SAMPLE_SIZE:
+            self._skipped += view[pos : min(found, pos + _SKIPPED_SAMPLE_SIZE - len(self._skipped))]
+        if not (valid or final):
+            return found
+        self._report_skipped(self._skip_start, self._offset + found, self._skip_reason)
+        self._skip_start = None
+        self._skip_reason = None
+        del self._skipped[:]
+        self._utf8.reset()
+        self._mid_character = False
+        return found
+
+    def _report_skipped(self, start, end, reason):
+        """Report corrupt content skipped while resynchronising.
+
+        :param start: The stream offset the skipped content starts at.
+        :param end: The stream offset it ends at.
+        :param reason: Why the content at start is corrupt.
+        """
+        self._emit_parse_error(
+            bytes(self._skipped),
+            "Skipped bytes %d to %d to resynchronise: %s" % (start, end, reason),
+            self.result,
+        )
+
+
+class _FieldCollector(object):
+    """A StreamResult that keeps the keyword arguments of its last event."""
+
+    fields = None
+
+    def status(self, **kwargs):
+        self.fields = kwargs
+
+
+class Packet(object):
+    """A single checksummed v2 packet.
+
+    The packet is kept exactly as it was read, so that an unmodified packet
+    can be forwarded with StreamResultToBytes.write_packet without being
+    re-encoded. Its fields are only decoded when first asked for.
+
+    :ivar data: The bytes of the packet, from signature to CRC inclusive.
+    """
+
+    __slots__ = ("data", "_fields")
+
+    _decoder = _PacketDecoder()
+
+    def __init__(self, data):
+        self.data = data
+        self._fields = None
+
+    def __repr__(self):
+        return "<Packet %r>" % (self.data,)
+
+    @property
+    def flags(self):
+        """The packet flags, available without decoding any fields."""
+        return self.data[1] << 8 | self.data[2]
+
+    @property
+    def fields(self):
+        """The decoded packet, as keyword arguments to StreamResult.status.
+
+        :raises ParseError: If the fields of the packet cannot be decoded.
+        """
+        if self._fields is None:
+            collector = _FieldCollector()
+            consumed = (self.data[3] >> 6) + 1
+            self._decoder._decode_packet(self.data, consumed, collector)
+            self._fields = collector.fields
+        return self._fields
+
+    def replay(self, result):
+        """Emit the packet to result, as ByteStreamToStreamResult would."""
+        try:
+            fields = self.fields
+        except ParseError as error:
+            self._decoder._emit_parse_error(self.data, error.args[0], result)
+        else:
+            result.status(**fields)
+
+
+class _PacketEncoder(StreamResultToBytes):
+    """Encode StreamResult events as Packets, passing each to a callback."""
+
+    def __init__(self, emit):
+        # Packets are passed to emit, never written to the stream.
+        super().__init__(BytesIO())
+        self.emit = emit
+
+    def _write_batch(self, packets):
+        for packet in packets:
+            self._write_bytes(packet)
+
+    def _write_bytes(self, data, boundary=None):
+        self.emit(Packet(bytes(data)))
+
+
+class ByteStreamToPackets(ByteStreamDecoder):
+    """Incrementally split a subunit byte stream into Packets.
+
+    This is the packet level counterpart to ByteStreamDecoder: content is
+    handed to feed() as it arrives, and a Packet is passed to the callback
+    for each packet, without decoding its fields. Packets that fail their
+    checksum, and non subunit content when non_subunit_name is set, are
+    passed on as the packets ByteStreamDecoder would have emitted for them.
+    """
+
+    def __init__(self, emit, non_subunit_name=None):
+        """Create a ByteStreamToPackets.
+
+        :param emit: A callable to pass each Packet to.
+        :param non_subunit_name: As for ByteStreamDecoder.
+        """
+        super().__init__(_PacketEncoder(emit), non_subunit_name)
+        self.emit = emit
+
+    def _packet(self, packet, consumed, offset):
+        self.emit(Packet(packet))
+
+
+def read_packets(source, non_subunit_name=None, buffer_size=65536):
+    """Read Packets from a subunit byte stream.
+
+    :param source: A file like object to read bytes from, as for
+        ByteStreamToStreamResult. It is read in blocks of buffer_size bytes
+        until EOF.
+    :param non_subunit_name: As for ByteStreamToStreamResult.
+    :return: An iterator of Packets.
+    """
+    source = subunit.make_stream_binary(source)
+    read = getattr(source, "read1", source.read)
+    packets = []
+    splitter = ByteStreamToPackets(packets.append, non_subunit_name)
+    while True:
+        block = read(buffer_size)
+        if block:
+            splitter.feed(block)
+        else:
+            splitter.close()
+        yield from packets
+        del packets[:]
+        if not block:
+            return
+
+
+class MappedFileToStreamResult(object):
+    """Parse a subunit byte stream from a file through a memory map.
+
+    Packets are parsed straight from the mapping rather than being read into
+    memory, and file content is handed to the result as memoryview slices of
+    the mapping. Those slices keep the mapping alive for as long as they are
+    referenced.
+
+    Typical use:
+
+       >>> case = MappedFileToStreamResult("results.subunit")
+       >>> result = StreamResult()
+       >>> result.startTestRun()
+       >>> case.run(result)
+       >>> result.stopTestRun()
+    """
+
+    def __init__(
+        self,
+        source,
+        non_subunit_name=None,
+        fields=None,
+        packet_filter=None,
+        integer_timestamps=False,
+        intern_size=None,
+        resync=False,
+    ):
+        """Create a MappedFileToStreamResult.
+
+        :param source: The path of a file to parse, or a binary file object
+            open on a regular file. A file object is parsed from its current
+            position and left positioned at its end; it is not closed.
+        :param non_subunit_name: As for ByteStreamToStreamResult.
+        :param fields: As for ByteStreamToStreamResult.
+        :param packet_filter: As for ByteStreamToStreamResult.
+        :param integer_timestamps: As for ByteStreamToStreamResult.
+        :param intern_size: As for ByteStreamToStreamResult.
+        :param resync: As for ByteStreamToStreamResult.
+        """
+        self.source = source
+        self.non_subunit_name = non_subunit_name
+        self.fields = fields
+        self.packet_filter = packet_filter
+        self.integer_timestamps = integer_timestamps
+        self.intern_size = intern_size
+        self.resync = resync
+
+    def run(self, result):
+        """Parse source and emit events to result."""
+        if hasattr(self.source, "fileno"):
+            self._run(self.source, result)
+        else:
+            with open(self.source, "rb") as source:
+                self._run(source, result)
+
+    __call__ = run
+
+    def _run(self, source, result):
+        offset = source.tell()
+        size = os.fstat(source.fileno()).st_size
+        if offset >= size:
+            # Nothing to parse, and empty files cannot be mapped.
+            return
+        mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._make_decoder(result)._frame(mapping, True, offset)
+        finally:
+            source.seek(size)
+            try:
+                mapping.close()
+            except BufferError:
+                # The result still holds file content from the mapping; it
+                # is unmapped once that is released.
+                pass
+
+    def _make_decoder(self, result):
+        """Make the ByteStreamDecoder that frames the mapping."""
+        decoder = ByteStreamDecoder(
+            result,
+            self.non_subunit_name,
+            self.fields,
+            self.packet_filter,
+            self.integer_timestamps,
+            self.intern_size,
+            self.resync,
+        )
+        decoder._copy_packets = False
+        return decoder
+
+
+# The state of a UTF-8 decoder with no partial character pending.
+_UTF8_CLEAN = (b"", 0)
+
+
+class _EventList(object):
+    """A StreamResult that keeps its events so they can be pickled."""
+
+    def __init__(self):
+        self.events = []
+
+    def status(self, **kwargs):
+        file_bytes = kwargs.get("file_bytes")
+        if file_bytes is not None:
+            kwargs["file_bytes"] = bytes(file_bytes)
+        self.events.append(kwargs)
+
+
+def _parse_segment(path, start, end, resync, utf8_state, decoder_args):
+    """Parse part of a file, for ParallelFileToStreamResult.
+
+    :param start: Where to start parsing.
+    :param end: Parsing stops at the first boundary at or after end.
+    :param resync: If True, start is not known to be a boundary, so parsing
+        starts from the first valid packet at or after it.
+    :param utf8_state: The state of the non subunit content decoder at
+        start.
+    :param decoder_args: The arguments after result to ByteStreamDecoder.
+    :return: A tuple of the offset parsing started at, the offset it stopped
+        at, the state of the non subunit content decoder there and a list of
+        the events parsed, as keyword arguments to StreamResult.status. If
+        resync is True and the parse ran into non subunit content that is not
+        wanted, the offsets are None, so that the segment is parsed again.
+    """
+    events = _EventList()
+    with open(path, "rb") as source:
+        mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    with mapping:
+        if resync:
+            start = find_packet(mapping, start)[0]
+        decoder = ByteStreamDecoder(events, *decoder_args)
+        decoder._utf8.setstate(utf8_state)
+        decoder._mid_character = bool(utf8_state[0])
+        try:
+            stop = decoder._frame(mapping, True, start, end)
+        except Exception as error:
+            # A packet found by resynchronising may be inside an attachment
+            # that is itself a subunit stream, and be followed by the rest of
+            # the outer packet. Whether the content really is there is only
+            # known once the segment before is parsed.
+            if not resync or error.args[:1] != ("Non subunit content",):
+                raise
+            return None, None, _UTF8_CLEAN, []
+        return start, stop, decoder._utf8.getstate(), events.events
+
+
+class ParallelFileToStreamResult(object):
+    """Parse a subunit file on several processes at once.
+
+    The file is split into segments which are parsed concurrently by a pool
+    of worker processes. A worker finds the first packet in its segment by
+    scanning for a signature whose packet passes its checksum. Each segment
+    is checked against the one before it: it must start where the parse of
+    the previous segment stopped, otherwise it is parsed again from there.
+    Segments that start inside a large packet or in non subunit content are
+    handled that way.
+
+    A segment is only emitted once it has been checked, so events are always
+    those of a serial parse, in the same order. By default segments are
+    handed to workers in file order, as earlier ones are emitted. With
+    ordered=False they are handed out as soon as any worker is free, so a
+    slow segment does not leave the rest of the pool idle, at the cost of
+    holding more parsed segments until it is done.
+
+    Typical use:
+
+       >>> case = ParallelFileToStreamResult("results.subunit", workers=8)
+       >>> result = StreamResult()
+       >>> result.startTestRun()
+       >>> case.run(result)
+       >>> result.stopTestRun()
+    """
+
+    def __init__(
+        self,
+        path,
+        non_subunit_name=None,
+        workers=None,
+        ordered=True,
+        segment_size=None,
+        fields=None,
+        packet_filter=None,
+        integer_timestamps=False,
+        intern_size=None,
+    ):
+        """Create a ParallelFileToStreamResult.
+
+        :param path: The path of the file to parse.
+        :param non_subunit_name: As for ByteStreamToStreamResult.
+        :param workers: The number of worker processes; os.cpu_count() by
+            default.
+        :param ordered: If False, workers parse segments as they become
+            free rather than in step with emitting them.
+        :param segment_size: The size of the segments to split the file
+            into. By default there are about four per worker, and each is at
+            least 1MiB.
+        :param fields: As for ByteStreamToStreamResult.
+        :param packet_filter: As for ByteStreamToStreamResult. It is passed
+            to the worker processes, so must be picklable.
+        :param integer_timestamps: As for ByteStreamToStreamResult.
+        :param intern_size: As for ByteStreamToStreamResult. Each worker
+            process keeps its own cache.
+        """
+        self.path = path
+        self.non_subunit_name = non_subunit_name
+        self.workers = workers or os.cpu_count() or 1
+        self.ordered = ordered
+        self.segment_size = segment_size
+        self.fields = fields
+        self.packet_filter = packet_filter
+        self.integer_timestamps = integer_timestamps
+        self.intern_size = intern_size
+
+    def run(self, result):
+        """Parse the file and emit events to result."""
+        size = os.path.getsize(self.path)
+        segment_size = self.segment_size or max(1048576, size // (self.workers * 4) + 1)
+        self._segments = [(start, min(start + segment_size, size)) for start in range(0, size, segment_size)]
+        if self.workers == 1 or len(self._segments) < 2:
+            if size:
+                self._emit(result, self._parse(0, _UTF8_CLEAN, size)[3])
+            return
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(self.workers) as executor:
+            if self.ordered:
+                self._run_ordered(executor, result)
+            else:
+                self._run_unordered(executor, result)
+
+    __call__ = run
+
+    def _decoder_args(self):
+        return (
+            self.non_subunit_name,
+            self.fields,
+            self.packet_filter,
+            self.integer_timestamps,
+            self.intern_size,
+        )
+
+    def _parse(self, start, utf8_state, end):
+        return _parse_segment(self.path, start, end, False, utf8_state, self._decoder_args())
+
+    def _submit(self, executor, number):
+        start, end = self._segments[number]
+        return executor.submit(_parse_segment, self.path, start, end, number > 0, _UTF8_CLEAN, self._decoder_args())
+
+    def _check(self, number, parsed, stop, utf8_state):
+        """Check that a segment starts where the parse before it stopped.
+
+        :return: The parsed segment, or a replacement parsed from stop.
+        """
+        # parsed[0] is None if the segment could not be parsed from where it
+        # resynchronised, so it never matches stop.
+        end = self._segments[number][1]
+        if stop >= end:
+            # The segment before ran right over this one.
+            return stop, stop, utf8_state, []
+        if parsed[0] == stop and utf8_state == _UTF8_CLEAN:
+            return parsed
+        return self._parse(stop, utf8_state, end)
+
+    def _emit(self, result, events):
+        for event in events:
+            result.status(**event)
+
+    def _run_ordered(self, executor, result):
+        # Keep a few segments in hand per worker, so workers stay busy
+        # without parsed segments piling up.
+        window = self.workers * 2
+        pending = [self._submit(executor, number) for number in range(min(window, len(self._segments)))]
+        stop, utf8_state = 0, _UTF8_CLEAN
+        for number in range(len(self._segments)):
+            parsed = pending.pop(0).result()
+            if number + window < len(self._segments):
+                pending.append(self._submit(executor, number + window))
+            _, stop, utf8_state, events = self._check(number, parsed, stop, utf8_state)
+            self._emit(result, events)
+
+    def _run_unordered(self, executor, result):
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        window = self.workers * 2
+        count = len(self._segments)
+        futures = {self._submit(executor, number): number for number in range(min(window, count))}
+        submitted = len(futures)
+        # Parsed segments waiting for the segment before them to be checked.
+        waiting = {}
+        number, stop, utf8_state = 0, 0, _UTF8_CLEAN
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                waiting[futures.pop(future)] = future.result()
+                if submitted < count:
+                    futures[self._submit(executor, submitted)] = submitted
+                    submitted += 1
+            while number in waiting:
+                _, stop, utf8_state, events = self._check(number, waiting.pop(number), stop, utf8_state)
+                self._emit(result, events)
+                number += 1
+
+
+class ByteStreamToStreamResult(_PacketDecoder):
+    """Parse a subunit byte stream.
+
+    Mixed streams that contain non-subunit content is supported when a
+    non_subunit_name is passed to the constructor. The default is to raise an
+    error containing the non-subunit byte after it has been read from the
+    stream.
+
+    Typical use:
+
+       >>> case = ByteStreamToStreamResult(sys.stdin.buffer)
+       >>> result = StreamResult()
+       >>> result.startTestRun()
+       >>> case.run(result)
+       >>> result.stopTestRun()
+    """
+
+    def __init__(
+        self,
+        source,
+        non_subunit_name=None,
+        buffer_size=None,
+        fields=None,
+        packet_filter=None,
+        integer_timestamps=False,
+        intern_size=None,
+        passthrough_size=1048576,
+        passthrough_latency=0.000001,
+        resync=False,
+    ):
+        """Create a ByteStreamToStreamResult.
+
+        :param source: A file like object to read bytes from. Must support
+            read(<count>) and return bytes. The file is not closed by
+            ByteStreamToStreamResult. subunit.make_stream_binary() is
+            called on the stream to get it into bytes mode.
+        :param non_subunit_name: If set to non-None, non subunit content
+            encountered in the stream will be converted into file packets
+            labelled with this name.
+        :param buffer_size: If set to non-None, read source in blocks of up
+            to this many bytes (using read1() when the source supports it)
+            and frame packets from an internal buffer, rather than reading
+            each packet a field at a time. Packets and parser errors are
+            reported identically; non subunit content is reported in runs
+            of up to 1MiB rather than in whatever the source happened to
+            have available. Because whole blocks are read, the source may
+            be consumed past the point where parsing stops.
+        :param fields: If set to non-None, the names of the status()
+            arguments the consumer uses. Only those fields are decoded;
+            the others are passed as None, except for runnable and eof
+            which are always passed. Packets that carry none of the named
+            fields are dropped, as is non subunit content unless file_name
+            or file_bytes is named. Fields that are not decoded are not
+            validated, so a malformed packet may go unreported. Results
+            built on testtools' StreamToDict need mime_type along with file
+            content to read text attachments.
+        :param packet_filter: If set to non-None, a callable that is passed
+            the flags of each packet (see the FLAG_ constants) as an int and
+            returns whether to emit it. Rejected packets are not decoded.
+            Parser errors and non subunit content are not passed to it.
+        :param integer_timestamps: If True, timestamps are emitted as integer
+            nanoseconds since the epoch rather than as datetimes. This keeps
+            the full precision of the wire format and is cheaper to decode;
+            see nanoseconds_to_timestamp() for conversion.
+        :param intern_size: If set to non-None, keep up to this many
+            decoded strings (test ids, route codes, file names and so on)
+            and as many tag sets, keyed on their encoding, and hand the same
+            objects out whenever that encoding recurs. The least recently
+            used are evicted first. Tags are then given as frozensets.
+        :param passthrough_size: Without buffer_size, the most non subunit
+            content to gather into one event.
+        :param passthrough_latency: Without buffer_size, how long in seconds
+            to wait for more non subunit content before passing on what has
+            been gathered.
+        :param resync: If True, recover from a corrupt or truncated packet by
+            skipping to the next signature that starts a packet passing its
+            checksum, rather than trusting the corrupt packet's length, and
+            report everything skipped in one parser error giving the range
+            of stream offsets. Otherwise each corrupt packet is reported and
+            parsing carries on after its length. Resynchronising needs
+            buffered parsing, so source is read as if buffer_size were set,
+            in blocks of 64KiB if it is not.
+        """
+        self.non_subunit_name = non_subunit_name
+        self.source = subunit.make_stream_binary(source)
+        self.codec = codecs.getincrementaldecoder("utf8")(errors="replace")
+        self.passthrough_size = passthrough_size
+        self.passthrough_latency = passthrough_latency
+        self.buffer_size = buffer_size
+        self.fields = fields
+        self.packet_filter = packet_filter
+        self._set_projection(fields, packet_filter)
+        self._integer_timestamps = integer_timestamps
+        self.intern_size = intern_size
+        self._set_intern_size(intern_size)
+        self.resync = resync
+
+    def run(self, result):
+        """Parse source and emit events to result.
+
+        This is a blocking call: it will run until EOF is detected on source.
+        """
+        if self.buffer_size is not None or self.resync:
+            return self._run_buffered(result)
+        self.codec.reset()
+        mid_character = False
+        pending = b""
+        self._find_peek()
+        while True:
+            if pending:
+                content = pending
+                pending = b""
+            else:
+                if self._peek is not None:
+                    # Blocks as read(1) would, and shows what is buffered.
+                    self._buffered = len(self._peek(1)) - 1
+                # We're in blocking mode; read one char
+                content = self.source.read(1)
+            if not content:
+                # EOF
+                return
+            if not mid_character and content[0] == SIGNATURE[0]:
+                self._parse_packet(result)
+                continue
+            if self.non_subunit_name is None:
+                raise Exception("Non subunit content", content)
+            # Aggregate all content that is not subunit until either
+            # passthrough_size is accumulated or no more arrives within
+            # passthrough_latency. This balances efficiency (avoiding death
+            # by a thousand one-byte packets), buffering (avoiding overlarge
+            # state being hidden on intermediary nodes) and interactivity
+            # (when driving a debugger, slow response to typing is
+            # annoying). Content is scanned in bulk, but never read past
+            # the next packet.
+            buffered = bytearray(content)
+            self.codec.decode(content)
+            mid_character = bool(self.codec.getstate()[0])
+            while len(buffered) < self.passthrough_size:
+                available, consumed = self._available(self.passthrough_size - len(buffered))
+                if not available:
+                    break
+                count = _scan_non_subunit(self.codec, available, 0, len(available))
+                mid_character = bool(self.codec.getstate()[0])
+                if consumed:
+                    buffered += available[:count]
+                    pending = available[count:]
+                elif count:
+                    buffered += self.source.read(count)
+                    self._buffered -= count
+                if count < len(available):
+                    # The next packet starts here.
+                    break
+            if self._non_subunit_wanted:
+                result.status(file_name=self.non_subunit_name, file_bytes=bytes(buffered))
+
+    def _find_peek(self):
+        """Find how run() can look ahead in source without consuming it."""
+        source = self.source
+        self._peek = None
+        self._buffered = 0
+        if sys.platform == "win32":
+            # Windows does not support passing a file descriptor to
+            # select.select.
+            self._fileno = None
+            return
+        try:
+            self._fileno = source.fileno()
+        except:  # noqa: E722
+            self._fileno = None
+            return
+        self._peek = getattr(source, "peek", None)
+
+    def _available(self, limit):
+        """Find up to limit bytes that can be read from source without blocking.
+
+        Sources that can be peeked at or seeked are left where they were, so
+        that content after a run of non subunit content is not consumed.
+        Other sources can only be read a byte at a time.
+
+        :return: A (content, consumed) tuple, where consumed is True if the
+            content has been read from source.
+        """
+        source = self.source
+        fileno = self._fileno
+        if self._peek is not None:
+            # peek() only reads from the descriptor when nothing is buffered,
+            # so it cannot block while content is known to be buffered or
+            # the descriptor is readable.
+            if self._buffered <= 0 and not select.select([fileno], [], [], self.passthrough_latency)[0]:
+                return b"", False
+            content = self._peek(limit)
+            self._buffered = len(content)
+            return content[:limit], False
+        try:
+            seekable = source.seekable()
+        except AttributeError:
+            seekable = False
+        if seekable:
+            position = source.tell()
+            content = source.read(limit)
+            source.seek(position)
+            return content, False
+        if fileno is None or not select.select([fileno], [], [], self.passthrough_latency)[0]:
+            return b"", True
+        return source.read(1), True
+
+    def _run_buffered(self, result):
+        read = getattr(self.source, "read1", self.source.read)
+        decoder = ByteStreamDecoder(
+            result,
+            self.non_subunit_name,
+            self.fields,
+            self.packet_filter,
+            self._integer_timestamps,
+            self.intern_size,
+            self.resync,
+        )
+        buffer_size = self.buffer_size or 65536
+        while True:
+            block = read(buffer_size)
+            if not block:
+                decoder.close()
+                return
+            decoder.feed(block)
+
+    def _parse_packet(self, result):
+        try:
+            packet = [SIGNATURE]
+            self._parse(packet, result)
+        except ParseError as error:
+            self._emit_parse_error(b"".join(packet), error.args[0], result)
+
+    def _parse(self, packet, result):
+        # 2 bytes flags, at most 3 bytes length.
+        header = read_exactly(self.source, 5)
+        packet.append(header)
+        flags = struct.unpack(FMT_16, header[:2])[0]
+        length, consumed = self._parse_varint(header, 2, max_3_bytes=True)
+
+        remainder = read_exactly(self.source, length - 6)
+        if consumed != 3:
+            # Avoid having to parse torn values
+            packet[-1] += remainder
+            pos = 2 + consumed
+        else:
+            # Avoid copying potentially lots of data.
+            packet.append(remainder)
+            pos = 0
+
+        crc = zlib.crc32(packet[0])
+        for fragment in packet[1:-1]:
+            crc = zlib.crc32(fragment, crc)
+
+        crc = zlib.crc32(packet[-1][:-4], crc) & 0xFFFFFFFF
+        packet_crc = struct.unpack(FMT_32, packet[-1][-4:])[0]
+
+        if crc != packet_crc:
+            # Bad CRC, report it and stop parsing the packet.
+            raise ParseError("Bad checksum - calculated (0x%x), stored (0x%x)" % (crc, packet_crc))
+
+        body = memoryview(packet[-1])
+
+        # Discard CRC-32
+        body = body[:-4]
+        self._parse_fields(flags, body, pos, result)
+
+    __call__ = run
@@ -27,13 +27,21 @@ _remote_exception_str_chunked = "57\r\n" + _remote_exception_str + ": boo qux\n0
 
 
 from . import (  # noqa: E402
+    test_aio,
     test_chunked,
     test_details,
+    test_exec_pool,
     test_filter_to_disk,
     test_filters,
+    test_flushing,
+    test_fsck,
+    test_index,
+    test_isolation,
+    test_multiplex,
     test_output_filter,
     test_progress_model,
     test_run,
+    test_sharding,
     test_subunit_filter,
     test_subunit_stats,
     test_subunit_tags,
@@ -41,6 +49,7 @@ from . import (  # noqa: E402
     test_test_protocol,
     test_test_protocol2,
     test_test_results,
+    test_threaded,
 )
 
 
@@ -59,5 +68,14 @@ def test_suite():
     result.addTest(loader.loadTestsFromModule(test_subunit_tags))
     result.addTest(loader.loadTestsFromModule(test_subunit_stats))
     result.addTest(loader.loadTestsFromModule(test_run))
+    result.addTest(loader.loadTestsFromModule(test_aio))
+    result.addTest(loader.loadTestsFromModule(test_index))
+    result.addTest(loader.loadTestsFromModule(test_flushing))
+    result.addTest(loader.loadTestsFromModule(test_threaded))
+    result.addTest(loader.loadTestsFromModule(test_fsck))
+    result.addTest(loader.loadTestsFromModule(test_sharding))
+    result.addTest(loader.loadTestsFromModule(test_isolation))
+    result.addTest(loader.loadTestsFromModule(test_exec_pool))
+    result.addTest(loader.loadTestsFromModule(test_multiplex))
     result.addTests(generate_scenarios(loader.loadTestsFromModule(test_output_filter)))
     return result
@@ -0,0 +1,193 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.aio."""
+
+import asyncio
+import subprocess
+import sys
+from io import BytesIO
+
+from fixtures import TempDir
+from testtools import TestCase
+
+from subunit import StreamResultToBytes
+from subunit.v2 import read_packets
+from subunit.aio import AsyncStreamResultToBytes, read_events
+
+# Copies stdin to stdout.
+_CAT = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"
+
+
+def _event(test_id=None, test_status=None, file_name=None, file_bytes=None, eof=False, mime_type=None):
+    return {
+        "test_id": test_id,
+        "test_status": test_status,
+        "test_tags": None,
+        "runnable": True,
+        "file_name": file_name,
+        "file_bytes": file_bytes,
+        "eof": eof,
+        "mime_type": mime_type,
+        "route_code": None,
+        "timestamp": None,
+    }
+
+
+async def _collect(reader, **kwargs):
+    events = []
+    async for event in read_events(reader, **kwargs):
+        if event["file_bytes"] is not None:
+            event["file_bytes"] = bytes(event["file_bytes"])
+        events.append(event)
+    return events
+
+
+class TestReadEvents(TestCase):
+    def test_reads_subprocess_pipe(self):
+        buf = BytesIO()
+        output = StreamResultToBytes(buf)
+        output.status(test_id="foo", test_status="inprogress")
+        output.status(test_id="foo", test_status="success")
+        stream = b"noise\n" + buf.getvalue()
+
+        async def run():
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-c",
+                "import sys; sys.stdout.buffer.write({!r})".format(stream),
+                stdout=subprocess.PIPE,
+            )
+            events = await _collect(proc.stdout, non_subunit_name="stdout", read_size=3)
+            await proc.wait()
+            return events
+
+        events = asyncio.run(run())
+        self.assertEqual(b"noise\n", b"".join(event["file_bytes"] for event in events[:-2]))
+        self.assertEqual(
+            [
+                _event(test_id="foo", test_status="inprogress"),
+                _event(test_id="foo", test_status="success"),
+            ],
+            events[-2:],
+        )
+
+    def test_truncated_stream(self):
+        buf = BytesIO()
+        StreamResultToBytes(buf).status(test_id="foo", test_status="success")
+
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(buf.getvalue()[:-1])
+            reader.feed_eof()
+            return await _collect(reader)
+
+        events = asyncio.run(run())
+        self.assertEqual(["subunit.parser", "subunit.parser"], [event["test_id"] for event in events])
+        self.assertEqual("fail", events[-1]["test_status"])
+
+
+class TestAsyncStreamResultToBytes(TestCase):
+    def test_round_trip_through_subprocess(self):
+        attachment = b"x" * 1048576
+
+        async def run():
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", _CAT, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+
+            async def write():
+                output = AsyncStreamResultToBytes(proc.stdin)
+                await output.startTestRun()
+                for i in range(3):
+                    await output.status(test_id="test-%d" % i, test_status="success")
+                await output.status(file_name="log", file_bytes=attachment, eof=True, mime_type="text/plain")
+                await output.stopTestRun()
+                proc.stdin.close()
+
+            # The attachment is larger than a pipe buffer, so writing only
+            # completes because drain() lets the reader make progress.
+            _, events = await asyncio.gather(write(), _collect(proc.stdout))
+            await proc.wait()
+            return events
+
+        self.assertEqual(
+            [
+                _event(test_id="test-0", test_status="success"),
+                _event(test_id="test-1", test_status="success"),
+                _event(test_id="test-2", test_status="success"),
+                _event(file_name="log", file_bytes=attachment, eof=True, mime_type="text/plain"),
+            ],
+            asyncio.run(run()),
+        )
+
+
+class _Writer(object):
+    """A StreamWriter that keeps what is written."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.drains = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drains += 1
+
+
+class TestAsyncStreamResultToBytesMethods(TestCase):
+    """Each coroutine writes what the StreamResultToBytes method does."""
+
+    def setUp(self):
+        super().setUp()
+        # So that file content is split across packets.
+        self.patch(StreamResultToBytes, "file_chunk_size", 1000)
+
+    def assertWritesAsSync(self, method, *args, **kwargs):
+        expected = BytesIO()
+        getattr(StreamResultToBytes(expected, integer_timestamps=True), method)(*args, **kwargs)
+        writer = _Writer()
+        output = AsyncStreamResultToBytes(writer, integer_timestamps=True)
+        for arg in args:
+            # File objects are read again from the start.
+            if isinstance(arg, BytesIO):
+                arg.seek(0)
+        asyncio.run(getattr(output, method)(*args, **kwargs))
+        self.assertEqual(expected.getvalue(), bytes(writer.data))
+        self.assertGreater(writer.drains, 0)
+
+    def test_status_integer_timestamps(self):
+        self.assertWritesAsSync("status", test_id="foo", test_status="success", timestamp=1234567890123456789)
+
+    def test_attach(self):
+        path = self.useFixture(TempDir()).join("log")
+        with open(path, "wb") as f:
+            f.write(b"logged" * 500)
+        self.assertWritesAsSync("attach", "log", path, test_id="foo")
+
+    def test_attach_file_object(self):
+        self.assertWritesAsSync("attach", "log", BytesIO(b"x" * 2500), test_id="foo", test_status="fail")
+
+    def test_status_batch(self):
+        events = [dict(test_id="test-%d" % i, test_status="success", timestamp=i) for i in range(3)]
+        self.assertWritesAsSync("status_batch", events)
+
+    def test_write_packet(self):
+        buf = BytesIO()
+        StreamResultToBytes(buf).status(test_id="foo", test_status="success")
+        [packet] = read_packets(BytesIO(buf.getvalue()))
+        self.assertWritesAsSync("write_packet", packet)
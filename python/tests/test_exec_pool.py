@@ -0,0 +1,204 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.exec_pool."""
+
+import io
+import os
+import unittest
+
+import fixtures
+from testtools import PlaceHolder, TestCase, TestResult
+from testtools.testresult.doubles import ExtendedTestResult
+
+import subunit
+from subunit import StreamResultToBytes
+from subunit.exec_pool import ConcurrentExecTestSuite
+
+
+class TestConcurrentExecTestSuite(TestCase):
+    class Scripts(subunit.ExecTestCase):
+        def test_sample(self):
+            """sample-script.py"""
+
+        def test_sample_two(self):
+            """sample-two-script.py"""
+
+    def setUp(self):
+        super().setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+        self.stream = io.BytesIO()
+
+    def _script(self, command):
+        test = self.Scripts("test_sample")
+        test.script = command
+        return test
+
+    def _suite(self, tests, jobs=2):
+        return ConcurrentExecTestSuite(tests, jobs=jobs, stream=self.stream)
+
+    def test_runs_every_script(self):
+        suite = self._suite(
+            [self.Scripts("test_sample"), unittest.TestSuite([self.Scripts("test_sample_two")])],
+        )
+        result = TestResult()
+        suite.run(result)
+        self.assertEqual(5, result.testsRun)
+        # v1 errors stay errors.
+        self.assertEqual(["an error"], [test.id() for test, _ in result.errors])
+        self.assertEqual(["bing crosby"], [test.id() for test, _ in result.failures])
+        self.assertEqual(
+            sorted([self.Scripts("test_sample").script, self.Scripts("test_sample_two").script]),
+            sorted(run.script for run in suite.runs),
+        )
+        self.assertEqual([0, 0], [run.returncode for run in suite.runs])
+
+    def _failing_script(self):
+        return self._script("sleep 0.1; echo 'test foo'; echo 'success foo'; exit 3")
+
+    def test_exit_status_and_duration(self):
+        suite = self._suite([self._failing_script()])
+        result = TestResult()
+        suite.run(result)
+        [run] = suite.runs
+        self.assertEqual((3, 1), (run.returncode, run.tests))
+        self.assertGreaterEqual(run.duration, 0.1)
+        # As ExecTestCase reports it.
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, result.testsRun)
+
+    def test_report_failures(self):
+        script = self._failing_script()
+        result = TestResult()
+        ConcurrentExecTestSuite([script], stream=self.stream, report_failures=True).run(result)
+        # The test passed, but its script failed.
+        self.assertEqual(2, result.testsRun)
+        [(test, traceback)] = result.failures
+        self.assertEqual(script.id(), test.id())
+        self.assertIn("exited with status 3 after reporting 1 tests.", traceback)
+
+    def test_report_failures_no_tests(self):
+        script = self._script("echo hello")
+        result = TestResult()
+        suite = ConcurrentExecTestSuite([script], stream=self.stream, report_failures=True)
+        suite.run(result)
+        self.assertEqual(0, suite.runs[0].tests)
+        self.assertEqual([script.id()], [test.id() for test, _ in result.failures])
+        self.assertIn("exited after reporting 0 tests.", result.failures[0][1])
+        self.assertEqual(b"hello\n", self.stream.getvalue())
+
+    def test_tests_are_forwarded_whole_in_completion_order(self):
+        slow = self._script("echo 'test slow'; sleep 0.3; echo 'success slow'")
+        fast = self._script("sleep 0.1; echo 'test fast'; echo 'failure fast'")
+        result = ExtendedTestResult()
+        self._suite([slow, fast]).run(result)
+        events = [(event[0], event[1].id()) for event in result._events if event[0] != "time"]
+        self.assertEqual(
+            [
+                ("startTest", "fast"),
+                ("addFailure", "fast"),
+                ("stopTest", "fast"),
+                ("startTest", "slow"),
+                ("addSuccess", "slow"),
+                ("stopTest", "slow"),
+            ],
+            events,
+        )
+
+    def test_concurrent_within_jobs(self):
+        running = os.path.join(self.dir, "running")
+        os.mkdir(running)
+        counts = os.path.join(self.dir, "counts")
+        signal = os.path.join(self.dir, "signal")
+        count = "touch %s/$$; ls %s | wc -l >> %s; " % (running, running, counts)
+        done = "rm %s/$$; echo 'test %s'; echo 'success %s'"
+        # The first script only finishes if the second runs alongside it.
+        scripts = [
+            self._script(count + "while [ ! -e %s ]; do sleep 0.01; done; " % signal + done % (running, "a", "a")),
+            self._script(count + "touch %s; " % signal + done % (running, "b", "b")),
+        ]
+        scripts += [self._script(count + "sleep 0.05; " + done % (running, n, n)) for n in "cde"]
+        result = TestResult()
+        self._suite(scripts, jobs=2).run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(5, result.testsRun)
+        with open(counts) as f:
+            self.assertLessEqual(max(int(line) for line in f), 2)
+
+    def test_v2_output(self):
+        buf = io.BytesIO()
+        output = StreamResultToBytes(buf)
+        output.status(test_id="v2 test", test_status="inprogress")
+        output.status(test_id="v2 test", file_name="log", file_bytes=b"logged")
+        output.status(test_id="v2 test", test_status="fail")
+        path = os.path.join(self.dir, "v2")
+        with open(path, "wb") as f:
+            f.write(buf.getvalue() + b"not subunit\n")
+        result = ExtendedTestResult()
+        self._suite([self._script("cat %s" % path)]).run(result)
+        self.assertEqual(
+            ["startTest", "addFailure", "stopTest"], [event[0] for event in result._events if event[0] != "time"]
+        )
+        self.assertEqual(b"not subunit\n", self.stream.getvalue())
+
+    def test_v2_output_after_text(self):
+        buf = io.BytesIO()
+        output = StreamResultToBytes(buf)
+        output.status(test_id="v2 test", test_status="inprogress")
+        output.status(test_id="v2 test", test_status="success")
+        path = os.path.join(self.dir, "v2")
+        with open(path, "wb") as f:
+            f.write(buf.getvalue())
+        result = TestResult()
+        self._suite([self._script("echo 'test? starting'; cat %s" % path)]).run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, result.testsRun)
+        self.assertEqual(b"test? starting\n", self.stream.getvalue())
+
+    def test_v2_output_after_text_without_newline(self):
+        buf = io.BytesIO()
+        output = StreamResultToBytes(buf)
+        output.status(test_id="v2 test", test_status="inprogress")
+        output.status(test_id="v2 test", test_status="success")
+        path = os.path.join(self.dir, "v2")
+        with open(path, "wb") as f:
+            f.write(buf.getvalue())
+        result = TestResult()
+        self._suite([self._script("printf 'Go? \\263'; cat %s" % path)]).run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, result.testsRun)
+        self.assertEqual(b"Go? \xb3", self.stream.getvalue())
+
+    def test_v1_output_with_signature_bytes(self):
+        result = TestResult()
+        self._suite([self._script("printf 'caf\\303\\263\\ntest foo\\nsuccess foo\\n'")]).run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, result.testsRun)
+        self.assertEqual(b"caf\xc3\xb3\n", self.stream.getvalue())
+
+    def test_v1_output_after_text(self):
+        result = TestResult()
+        self._suite(
+            [self._script("echo starting; echo 'time: 2026-01-01 00:00:00Z'; echo 'test foo'; echo 'success foo'")]
+        ).run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, result.testsRun)
+        self.assertEqual(b"starting\n", self.stream.getvalue())
+
+    def test_other_tests_run(self):
+        result = TestResult()
+        self._suite([PlaceHolder("other"), self.Scripts("test_sample_two")]).run(result)
+        self.assertEqual(3, result.testsRun)
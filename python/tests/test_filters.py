@@ -14,12 +14,27 @@
 #  limitations under that license.
 #
 
+from functools import partial
+from io import BytesIO
 from tempfile import NamedTemporaryFile
 
 from testtools import TestCase
+from testtools.testresult.doubles import StreamResult
 
-from subunit import read_test_list
-from subunit.filters import find_stream
+from subunit import ByteStreamToStreamResult, StreamResultToBytes, read_test_list
+from subunit.filters import (
+    find_stream,
+    make_options,
+    make_passthrough_policy,
+    make_v2_parser,
+    run_tests_from_stream,
+)
+from subunit.test_results import PassthroughPolicy
+from subunit.v2 import MappedFileToStreamResult
+
+# A test packet with its length needlessly encoded in two bytes, which a
+# re-encoding would shorten.
+_LONG_LENGTH_PACKET = b"\xb3)\x01@\r\x03fooA\xe1G?"
 
 
 class TestReadTestList(TestCase):
@@ -40,3 +55,109 @@ class TestFindStream(TestCase):
         f.flush()
         stream = find_stream("bar", [f.name])
         self.assertEqual(b"foo", stream.read())
+
+
+class TestMakeV2Parser(TestCase):
+    def test_regular_file_is_mapped(self):
+        f = NamedTemporaryFile()
+        f.write(_LONG_LENGTH_PACKET)
+        f.flush()
+        with open(f.name, "rb") as source:
+            parser = make_v2_parser(source)
+            self.assertIsInstance(parser, MappedFileToStreamResult)
+            result = StreamResult()
+            parser.run(result)
+        self.assertEqual([("foo", "exists")], [event[1:3] for event in result._events])
+
+    def test_other_streams_are_read(self):
+        self.assertIsInstance(make_v2_parser(BytesIO(_LONG_LENGTH_PACKET)), ByteStreamToStreamResult)
+
+
+class TestRunTestsFromStream(TestCase):
+    def _stream(self):
+        attachment = BytesIO()
+        StreamResultToBytes(attachment).status(file_name="log", file_bytes=b"bar")
+        return b"noise" + _LONG_LENGTH_PACKET + attachment.getvalue()
+
+    def test_forwards_packets_verbatim(self):
+        forward = BytesIO()
+        result = StreamResult()
+        run_tests_from_stream(
+            BytesIO(self._stream()), result, passthrough_stream=BytesIO(), forward_stream=forward, protocol_version=2
+        )
+        noise = BytesIO()
+        StreamResultToBytes(noise).status(file_name="stdout", file_bytes=b"noise")
+        self.assertEqual(noise.getvalue() + self._stream()[5:], forward.getvalue())
+        self.assertEqual(
+            [(None, None, "stdout"), ("foo", "exists", None), (None, None, "log")],
+            [event[1:3] + event[5:6] for event in result._events if event[0] == "status"],
+        )
+
+    def test_forwards_only_test_packets_without_passthrough(self):
+        forward = BytesIO()
+        result = StreamResult()
+        run_tests_from_stream(BytesIO(self._stream()), result, forward_stream=forward, protocol_version=2)
+        self.assertEqual(_LONG_LENGTH_PACKET, forward.getvalue())
+        self.assertEqual(3, len([event for event in result._events if event[0] == "status"]))
+
+    def test_fields(self):
+        result = StreamResult()
+        run_tests_from_stream(BytesIO(self._stream()), result, protocol_version=2, fields={"test_id"})
+        self.assertEqual([("foo", None)], [event[1:3] for event in result._events if event[0] == "status"])
+
+    def test_fields_with_passthrough(self):
+        passthrough = BytesIO()
+        result = StreamResult()
+        run_tests_from_stream(
+            BytesIO(self._stream()),
+            result,
+            passthrough_stream=passthrough,
+            protocol_version=2,
+            passthrough_subunit=False,
+            fields={"test_id"},
+        )
+        self.assertEqual([("foo", None)], [event[1:3] for event in result._events if event[0] == "status"])
+        self.assertEqual(b"noisebar", passthrough.getvalue())
+
+    def test_passthrough_policy(self):
+        source = BytesIO()
+        encoder = StreamResultToBytes(source)
+        for _ in range(3):
+            encoder.status(file_name="stdout", file_bytes=b"noise")
+        encoder.status(test_id="foo", test_status="success")
+        passthrough = BytesIO()
+        result = StreamResult()
+        run_tests_from_stream(
+            BytesIO(source.getvalue()),
+            result,
+            passthrough_stream=passthrough,
+            protocol_version=2,
+            passthrough_policy=partial(PassthroughPolicy, latency=60, max_bytes=12),
+        )
+        passed = StreamResult()
+        ByteStreamToStreamResult(BytesIO(passthrough.getvalue())).run(passed)
+        self.assertEqual(
+            [b"noisenoiseno\n[subunit: output truncated]\n", b"[subunit: 3 bytes of output dropped]\n"],
+            [bytes(event[6]) for event in passed._events],
+        )
+        self.assertEqual([("foo", "success")], [event[1:3] for event in result._events if event[0] == "status"])
+
+
+class TestMakePassthroughPolicy(TestCase):
+    def test_disabled_by_default(self):
+        options, _ = make_options("").parse_args([])
+        self.assertEqual(None, make_passthrough_policy(options))
+
+    def test_window(self):
+        options, _ = make_options("").parse_args(["--passthrough-window", "65536"])
+        policy = make_passthrough_policy(options)(StreamResult())
+        self.assertEqual((65536, 0.05, None), (policy.window_size, policy.latency, policy.max_bytes))
+
+    def test_no_latency(self):
+        options, _ = make_options("").parse_args(["--passthrough-window", "65536", "--passthrough-latency", "0"])
+        self.assertEqual(None, make_passthrough_policy(options))
+
+    def test_limit(self):
+        options, _ = make_options("").parse_args(["--passthrough-window", "0", "--passthrough-limit", "100"])
+        policy = make_passthrough_policy(options)(StreamResult())
+        self.assertEqual((0, 100), (policy.window_size, policy.max_bytes))
@@ -0,0 +1,109 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.flushing."""
+
+import threading
+from io import BytesIO
+
+from subunit import StreamResultToBytes, TestProtocolClient
+from subunit.flushing import FlushBytes, FlushEveryPacket, FlushInterval, FlushOnBoundary, make_flush_policy
+from testtools import PlaceHolder, TestCase
+
+
+class _FlushCountingStream(BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+        self.flushed = threading.Event()
+
+    def flush(self):
+        self.flushes += 1
+        self.flushed.set()
+
+
+class TestStreamResultToBytesPolicies(TestCase):
+    def _write(self, policy):
+        stream = _FlushCountingStream()
+        result = StreamResultToBytes(stream, flush_policy=policy)
+        result.status(test_id="foo", test_status="inprogress")
+        result.status(test_id="foo", file_name="log", file_bytes=b"x" * 100)
+        result.status(test_id="foo", test_status="success")
+        return result, stream
+
+    def test_default_flushes_every_packet(self):
+        _, stream = self._write(None)
+        self.assertEqual(3, stream.flushes)
+
+    def test_every_packet(self):
+        _, stream = self._write(FlushEveryPacket())
+        self.assertEqual(3, stream.flushes)
+
+    def test_boundary(self):
+        _, stream = self._write(FlushOnBoundary())
+        self.assertEqual(2, stream.flushes)
+
+    def test_bytes(self):
+        result, stream = self._write(FlushBytes(100))
+        self.assertEqual(1, stream.flushes)
+        result.stopTestRun()
+        self.assertEqual(2, stream.flushes)
+
+    def test_interval_flushes_after_interval(self):
+        _, stream = self._write(FlushInterval(0.01))
+        self.assertTrue(stream.flushed.wait(5))
+        self.assertEqual(1, stream.flushes)
+
+    def test_interval_stop_test_run_flushes(self):
+        result, stream = self._write(FlushInterval(60))
+        result.stopTestRun()
+        self.assertEqual(1, stream.flushes)
+
+
+class TestTestProtocolClientPolicies(TestCase):
+    def test_default_flushes_on_start_and_stop(self):
+        stream = _FlushCountingStream()
+        client = TestProtocolClient(stream)
+        test = PlaceHolder("foo")
+        client.startTest(test)
+        client.addSuccess(test)
+        client.stopTest(test)
+        self.assertEqual(2, stream.flushes)
+
+    def test_bytes(self):
+        stream = _FlushCountingStream()
+        client = TestProtocolClient(stream, flush_policy=FlushBytes(20))
+        test = PlaceHolder("foo")
+        client.startTest(test)
+        client.addSuccess(test)
+        client.stopTest(test)
+        self.assertEqual(1, stream.flushes)
+        client.stopTestRun()
+        self.assertEqual(2, stream.flushes)
+        self.assertEqual(b"test: foo\nsuccessful: foo\n", stream.getvalue())
+
+
+class TestMakeFlushPolicy(TestCase):
+    def test_policies(self):
+        self.assertIsInstance(make_flush_policy("packet"), FlushEveryPacket)
+        self.assertIsInstance(make_flush_policy("boundary"), FlushOnBoundary)
+        self.assertEqual(4096, make_flush_policy("bytes:4096").size)
+        self.assertEqual(0.5, make_flush_policy("interval:0.5").interval)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, make_flush_policy, "sometimes")
+        self.assertRaises(ValueError, make_flush_policy, "bytes:lots")
+        self.assertRaises(ValueError, make_flush_policy, "packet:1")
@@ -0,0 +1,128 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.fsck and the subunit-fsck script."""
+
+import io
+import os
+
+import fixtures
+from subunit import StreamResultToBytes
+from subunit.filter_scripts import subunit_fsck
+from subunit.fsck import check_file, check_files, salvage_path
+from testtools import TestCase
+
+
+def _packet(**kwargs):
+    buf = io.BytesIO()
+    StreamResultToBytes(buf).status(**kwargs)
+    return buf.getvalue()
+
+
+class TestCheckFile(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+        self.packets = [
+            _packet(test_id="foo", test_status="inprogress"),
+            _packet(test_id="foo", file_name="log", file_bytes=b"foo log"),
+            _packet(test_id="foo", test_status="success"),
+        ]
+
+    def _write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_intact(self):
+        path = self._write("intact", b"".join(self.packets))
+        check = check_file(path)
+        self.assertTrue(check.ok)
+        self.assertEqual((3, len(b"".join(self.packets)), []), (check.packets, check.packet_bytes, check.damage))
+
+    def test_empty(self):
+        check = check_file(self._write("empty", b""))
+        self.assertTrue(check.ok)
+        self.assertEqual(0, check.packets)
+
+    def test_damage_offsets(self):
+        damaged = self.packets[1][:-1] + b"\0"
+        content = self.packets[0] + damaged + b"noise" + self.packets[2] + self.packets[0][:5]
+        check = check_file(self._write("damaged", content))
+        self.assertFalse(check.ok)
+        self.assertEqual(2, check.packets)
+        start = len(self.packets[0])
+        end = start + len(damaged) + 5
+        self.assertEqual(
+            [(start, end), (len(content) - 5, len(content))], [(start, end) for start, end, _ in check.damage]
+        )
+        self.assertIn("Bad checksum", check.damage[0][2])
+        self.assertIn("Short read", check.damage[1][2])
+
+    def test_salvage(self):
+        path = self._write("damaged", self.packets[0] + b"\xb3junk" + self.packets[1] + self.packets[2][:-3])
+        check = check_file(path, salvage_path(path))
+        self.assertEqual(salvage_path(path), check.salvaged)
+        with open(salvage_path(path), "rb") as salvaged:
+            self.assertEqual(self.packets[0] + self.packets[1], salvaged.read())
+        self.assertTrue(check_file(salvage_path(path)).ok)
+
+    def test_check_files_in_parallel(self):
+        paths = [self._write("intact%d" % number, b"".join(self.packets)) for number in range(5)]
+        paths.insert(2, self._write("damaged", self.packets[0][:-1]))
+        paths.append(os.path.join(self.dir, "missing"))
+        checks = list(check_files(paths, workers=2, salvage=True))
+        self.assertEqual(paths, [check.path for check in checks])
+        self.assertEqual([True, True, False, True, True, True, False], [check.ok for check in checks])
+        self.assertEqual(salvage_path(paths[2]), checks[2].salvaged)
+        self.assertIsInstance(checks[-1].error, OSError)
+        self.assertFalse(os.path.exists(salvage_path(paths[0])))
+
+
+class TestSubunitFsck(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+        self.stdout = io.StringIO()
+        self.useFixture(fixtures.MonkeyPatch("sys.stdout", self.stdout))
+        packet = _packet(test_id="foo", test_status="success")
+        self.intact = os.path.join(self.dir, "intact")
+        with open(self.intact, "wb") as f:
+            f.write(packet)
+        self.damaged = os.path.join(self.dir, "damaged")
+        with open(self.damaged, "wb") as f:
+            f.write(packet + b"x")
+
+    def test_intact(self):
+        error = self.assertRaises(SystemExit, subunit_fsck.main, ["-j", "1", self.intact])
+        self.assertEqual(0, error.code)
+        self.assertEqual(
+            "%s: ok, 1 packets, 12 bytes\n1 files checked, 0 not intact\n" % self.intact, self.stdout.getvalue()
+        )
+
+    def test_damaged(self):
+        names = os.path.join(self.dir, "names")
+        with open(names, "w") as f:
+            f.write("%s\n%s\n" % (self.intact, self.damaged))
+        error = self.assertRaises(SystemExit, subunit_fsck.main, ["-q", "--salvage", "--files-from", names])
+        self.assertEqual(1, error.code)
+        self.assertEqual(
+            "%s: damaged, 1 packets, 12 of 13 bytes valid\n"
+            "  bytes 12-13: Non subunit content.\n"
+            "  valid packets written to %s\n" % (self.damaged, salvage_path(self.damaged)),
+            self.stdout.getvalue(),
+        )
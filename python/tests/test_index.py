@@ -0,0 +1,165 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.index and the subunit-index and subunit-slice scripts."""
+
+import datetime
+import io
+import os
+
+import fixtures
+import iso8601
+from subunit import StreamResultToBytes
+from subunit.filter_scripts import subunit_index, subunit_slice
+from subunit.index import InvalidIndex, PacketIndex, build_index, index_path, load_index, read_spans
+from testtools import TestCase
+
+
+def _time(second):
+    return datetime.datetime(2026, 1, 1, 0, 0, second, tzinfo=iso8601.UTC)
+
+
+def _packet(**kwargs):
+    buf = io.BytesIO()
+    StreamResultToBytes(buf).status(**kwargs)
+    return buf.getvalue()
+
+
+class TestPacketIndex(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.packets = [
+            _packet(test_id="foo", test_status="inprogress", timestamp=_time(1), route_code="0"),
+            _packet(test_id="foo", file_name="log", file_bytes=b"foo log", route_code="0"),
+            _packet(test_id="foo", test_status="success", timestamp=_time(2), route_code="0"),
+            _packet(test_id="bar", test_status="inprogress", timestamp=_time(3), route_code="1/0"),
+            _packet(test_id="bar", test_status="fail", timestamp=_time(4), route_code="1/0"),
+        ]
+        # Non subunit content and a damaged packet are not indexed.
+        damaged = _packet(test_id="baz", test_status="fail")[:-1] + b"\0"
+        content = self.packets[:2] + [b"noise\n", damaged] + self.packets[2:]
+        self.path = self.useFixture(fixtures.TempDir()).join("stream")
+        with open(self.path, "wb") as f:
+            f.write(b"".join(content))
+        self.offsets = []
+        offset = 0
+        for data in content:
+            if data in self.packets:
+                self.offsets.append(offset)
+            offset += len(data)
+
+    def _spans(self, *numbers):
+        return [(self.offsets[number], len(self.packets[number])) for number in numbers]
+
+    def test_build_index(self):
+        index = build_index(self.path)
+        self.assertEqual(5, len(index))
+        self.assertEqual(self._spans(0, 1, 2, 3, 4), index.select())
+        self.assertEqual(os.path.getsize(self.path), index.source_size)
+
+    def test_select_test_ids(self):
+        index = build_index(self.path)
+        self.assertEqual(self._spans(0, 1, 2), index.select(test_ids=["foo"]))
+        self.assertEqual([], index.select(test_ids=["missing"]))
+
+    def test_select_route_codes(self):
+        index = build_index(self.path)
+        self.assertEqual(self._spans(3, 4), index.select(route_codes=["1"]))
+        self.assertEqual(self._spans(3, 4), index.select(route_codes=["1/0"]))
+        self.assertEqual([], index.select(route_codes=["1/1"]))
+
+    def test_select_statuses(self):
+        index = build_index(self.path)
+        self.assertEqual(self._spans(2, 4), index.select(statuses=["success", "fail"]))
+
+    def test_select_time_window(self):
+        index = build_index(self.path)
+        # The log packet has no timestamp, so it falls at the time of the
+        # packet before it.
+        self.assertEqual(self._spans(0, 1), index.select(end=_time(1)))
+        self.assertEqual(self._spans(2, 3), index.select(start=_time(2), end=_time(3)))
+
+    def test_select_combines_criteria(self):
+        index = build_index(self.path)
+        self.assertEqual(self._spans(2), index.select(test_ids=["foo"], start=_time(2), end=_time(3)))
+
+    def test_save_and_load(self):
+        index = build_index(self.path)
+        index.save(index_path(self.path))
+        loaded = load_index(self.path)
+        self.assertEqual(index.select(), loaded.select())
+        self.assertEqual(index.names, loaded.names)
+        self.assertEqual(
+            index.select(test_ids=["bar"], start=_time(4)), loaded.select(test_ids=["bar"], start=_time(4))
+        )
+
+    def test_load_index_changed_file(self):
+        build_index(self.path).save(index_path(self.path))
+        with open(self.path, "ab") as f:
+            f.write(self.packets[0])
+        self.assertRaises(InvalidIndex, load_index, self.path)
+
+    def test_load_index_missing(self):
+        self.assertRaises(InvalidIndex, load_index, self.path)
+
+    def test_load_not_an_index(self):
+        self.assertRaises(InvalidIndex, PacketIndex.load, self.path)
+
+    def test_read_spans(self):
+        spans = build_index(self.path).select(test_ids=["foo"])
+        # The first two packets are adjacent, so are read together.
+        self.assertEqual(
+            [self.packets[0] + self.packets[1], self.packets[2]],
+            list(read_spans(self.path, spans)),
+        )
+
+    def test_read_spans_checks_for_packets(self):
+        self.assertRaises(InvalidIndex, list, read_spans(self.path, [(1, 5)]))
+
+
+class TestScripts(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = self.useFixture(fixtures.TempDir()).join("stream")
+        with open(self.path, "wb") as f:
+            for test_id in ["foo", "bar"]:
+                f.write(_packet(test_id=test_id, test_status="inprogress"))
+                f.write(_packet(test_id=test_id, test_status="success"))
+        self.stdout = io.BytesIO()
+        self.useFixture(fixtures.MonkeyPatch("sys.stdout", io.TextIOWrapper(self.stdout)))
+
+    def test_index_then_slice(self):
+        self.assertRaises(SystemExit, subunit_index.main, [self.path])
+        self.assertTrue(os.path.exists(index_path(self.path)))
+        self.assertRaises(SystemExit, subunit_slice.main, [self.path, "--id", "bar"])
+        self.assertEqual(
+            _packet(test_id="bar", test_status="inprogress") + _packet(test_id="bar", test_status="success"),
+            self.stdout.getvalue(),
+        )
+
+    def test_slice_with_index_option(self):
+        index = self.useFixture(fixtures.TempDir()).join("index")
+        self.assertRaises(SystemExit, subunit_index.main, [self.path, "--output", index])
+        self.assertRaises(SystemExit, subunit_slice.main, [self.path, "--index", index, "--status", "inprogress"])
+        self.assertEqual(
+            _packet(test_id="foo", test_status="inprogress") + _packet(test_id="bar", test_status="inprogress"),
+            self.stdout.getvalue(),
+        )
+
+    def test_slice_without_index(self):
+        self.useFixture(fixtures.MonkeyPatch("sys.stderr", io.StringIO()))
+        error = self.assertRaises(SystemExit, subunit_slice.main, [self.path, "--id", "bar"])
+        self.assertEqual(2, error.code)
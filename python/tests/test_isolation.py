@@ -0,0 +1,140 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.isolation."""
+
+import io
+import os
+import time
+import unittest
+
+import fixtures
+from testtools import TestCase, TestResult
+
+import subunit
+from subunit.isolation import IsolationPool
+
+
+class TestIsolationPool(TestCase):
+    class Sample(unittest.TestCase):
+        # Set by each test, to check it does not leak into the parent.
+        STATE = None
+        # A directory the tests note their pids in.
+        DIR = None
+
+        def _note_pid(self):
+            with open(os.path.join(self.DIR, "%s-%d" % (self._testMethodName, os.getpid())), "w"):
+                pass
+
+        def test_one(self):
+            TestIsolationPool.Sample.STATE = "one"
+            self._note_pid()
+
+        def test_two(self):
+            TestIsolationPool.Sample.STATE = "two"
+            self._note_pid()
+
+        def test_three(self):
+            self._note_pid()
+
+        def test_four(self):
+            self._note_pid()
+
+        def test_fails(self):
+            self.fail("expected")
+
+        def test_exits(self):
+            os._exit(3)
+
+        def test_prints(self):
+            print("printed")
+
+        def test_waits_for_signal(self):
+            # Only passes if test_signals runs at the same time.
+            path = os.path.join(self.DIR, "signal")
+            deadline = time.time() + 10
+            while not os.path.exists(path):
+                self.assertLess(time.time(), deadline)
+                time.sleep(0.01)
+
+        def test_signals(self):
+            with open(os.path.join(self.DIR, "signal"), "w"):
+                pass
+
+    class SampleIsolated(subunit.IsolatedTestCase):
+        def test_pid(self):
+            with open(os.path.join(TestIsolationPool.Sample.DIR, "isolated-%d" % os.getpid()), "w"):
+                pass
+
+    def setUp(self):
+        super().setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(fixtures.MonkeyPatch("tests.test_isolation.TestIsolationPool.Sample.DIR", self.dir))
+        self.stream = io.BytesIO()
+
+    def _run(self, names, **kwargs):
+        result = TestResult()
+        IsolationPool(stream=self.stream, **kwargs).run([self.Sample(name) for name in names], result)
+        return result
+
+    def _pids(self):
+        return {name.rsplit("-", 1)[1] for name in os.listdir(self.dir)}
+
+    def test_isolated(self):
+        result = self._run(["test_one", "test_two"], workers=2)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(2, result.testsRun)
+        self.assertEqual(None, self.Sample.STATE)
+
+    def test_fork_per_test(self):
+        self._run(["test_one", "test_two", "test_three", "test_four"], workers=1)
+        self.assertEqual(4, len(self._pids()))
+
+    def test_recycle_after(self):
+        self._run(["test_one", "test_two", "test_three", "test_four"], workers=1, recycle_after=2)
+        self.assertEqual(2, len(self._pids()))
+        self.assertEqual(None, self.Sample.STATE)
+
+    def test_concurrent(self):
+        result = self._run(["test_waits_for_signal", "test_signals"], workers=2)
+        self.assertTrue(result.wasSuccessful(), result.failures + result.errors)
+
+    def test_failures(self):
+        result = self._run(["test_fails", "test_one"], workers=2)
+        self.assertEqual(2, result.testsRun)
+        self.assertEqual([self.Sample("test_fails").id()], [test.id() for test, _ in result.failures])
+
+    def test_process_dying(self):
+        for kwargs in ({}, {"recycle_after": 5}):
+            result = self._run(["test_exits", "test_one", "test_two"], workers=1, **kwargs)
+            self.assertEqual(3, result.testsRun)
+            self.assertEqual([self.Sample("test_exits").id()], [test.id() for test, _ in result.failures])
+            self.assertIn("exited with status 3" if not kwargs else "worker running it died", result.failures[0][1])
+
+    def test_output(self):
+        result = self._run(["test_prints"], workers=1)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(b"printed\n", self.stream.getvalue())
+
+    def test_isolated_test_suite(self):
+        pool = IsolationPool(workers=2, stream=self.stream)
+        suite = subunit.IsolatedTestSuite([self.SampleIsolated("test_pid"), self.SampleIsolated("test_pid")], pool=pool)
+        result = TestResult()
+        suite.run(result)
+        self.assertEqual(2, result.testsRun)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(2, len(self._pids()))
+        self.assertNotIn(str(os.getpid()), self._pids())
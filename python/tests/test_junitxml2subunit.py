@@ -265,6 +265,16 @@ class TestJUnitXML2SubUnit(TestCase):
         # testTwo spans 1.5s
         self.assertAlmostEqual(1.5, (two[1] - two[0]).total_seconds(), places=3)
 
+    def test_many_testcases_take_few_writes(self):
+        cases = "".join('<testcase classname="A" name="test%d"/>' % i for i in range(1000))
+        path = _write(self.tmp, "report.xml", "<testsuite>%s</testsuite>" % cases)
+        writes = []
+        self.subunit.write = mock.Mock(side_effect=lambda data: writes.append(bytes(data)) or len(data))
+        subunit.JUnitXML2SubUnit([path], self.subunit)
+        self.assertEqual(1, len(writes))
+        self.subunit = io.BytesIO(writes[0])
+        self.assertEqual(2000, len(self._statuses(self._events())))
+
 
 class TestCollectFiles(TestCase):
     """Tests for the `--dir` walking logic in the script entrypoint."""
@@ -0,0 +1,150 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit._multiplex."""
+
+import io
+import os
+
+from testtools import TestCase, TestResult
+from testtools.testresult.doubles import StreamResult
+
+from subunit._multiplex import Multiplexer, RoutingStreamResult, StreamToTestResult
+
+
+class TestRoutingStreamResult(TestCase):
+    def test_routes_all(self):
+        log = StreamResult()
+        result = RoutingStreamResult(log, "2")
+        result.status(test_id="foo", test_status="inprogress")
+        result.status(test_id="foo", test_status="success", route_code="0")
+        self.assertEqual(["2", "2/0"], [event[-2] for event in log._events])
+
+    def test_routes_only_route_coded(self):
+        log = StreamResult()
+        result = RoutingStreamResult(log, "2", route_all=False)
+        result.status(test_id="foo", test_status="inprogress")
+        result.status(test_id="foo", test_status="success", route_code="0")
+        self.assertEqual([None, "2/0"], [event[-2] for event in log._events])
+
+
+class TestStreamToTestResult(TestCase):
+    def test_passes_on_whole_tests(self):
+        result = TestResult()
+        stream = io.BytesIO()
+        results = StreamToTestResult(result, stream, "stdout")
+        results.startTestRun()
+        results.status(test_id="foo", test_status="inprogress")
+        results.status(file_name="stdout", file_bytes=b"hello\n")
+        self.assertEqual(0, result.testsRun)
+        results.status(test_id="foo", test_status="fail")
+        results.stopTestRun()
+        self.assertEqual((1, 1), (result.testsRun, len(result.failures)))
+        self.assertEqual({"foo"}, results.finished)
+        self.assertEqual(b"hello\n", stream.getvalue())
+
+
+class Sink(object):
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def feed(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+class TestMultiplexer(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.multiplexer = Multiplexer()
+        self.addCleanup(self.multiplexer.close)
+
+    def pipe(self, data):
+        """Add a pipe to the multiplexer, returning its write end and sink."""
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(self.close_fd, write_fd)
+        sink = Sink()
+        self.multiplexer.add(read_fd, sink, data)
+        return write_fd, sink
+
+    def close_fd(self, fd):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+    def test_pump_feeds_sinks(self):
+        first, first_sink = self.pipe("first")
+        second, second_sink = self.pipe("second")
+        os.write(first, b"foo")
+        os.write(second, b"bar")
+        self.assertEqual([], self.multiplexer.pump())
+        self.assertEqual((b"foo", b"bar"), (first_sink.data, second_sink.data))
+        self.assertEqual(2, len(self.multiplexer))
+
+    def test_pump_returns_finished(self):
+        first, first_sink = self.pipe("first")
+        second, second_sink = self.pipe("second")
+        os.write(first, b"foo")
+        os.close(first)
+        finished = []
+        while len(finished) < 1:
+            finished.extend(self.multiplexer.pump())
+        self.assertEqual(["first"], finished)
+        self.assertEqual((b"foo", True), (first_sink.data, first_sink.closed))
+        self.assertFalse(second_sink.closed)
+        self.assertEqual(1, len(self.multiplexer))
+
+    def test_pump_timeout(self):
+        self.pipe("first")
+        self.assertEqual([], self.multiplexer.pump(0))
+
+    def test_drain(self):
+        read_fd, write_fd = os.pipe()
+        sink = Sink()
+        self.multiplexer.add(read_fd, sink)
+        os.write(write_fd, b"foo")
+        os.set_blocking(read_fd, False)
+        self.assertFalse(self.multiplexer.drain(read_fd))
+        self.assertEqual(b"foo", sink.data)
+        os.close(write_fd)
+        self.assertTrue(self.multiplexer.drain(read_fd))
+        self.assertTrue(sink.closed)
+        self.assertFalse(self.multiplexer.reading(read_fd))
+
+    def test_remove(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, write_fd)
+        sink = Sink()
+        self.multiplexer.add(read_fd, sink, "first")
+        self.assertTrue(self.multiplexer.reading(read_fd))
+        self.assertEqual("first", self.multiplexer.remove(read_fd))
+        self.assertFalse(self.multiplexer.reading(read_fd))
+        self.assertFalse(sink.closed)
+        self.assertRaises(OSError, os.fstat, read_fd)
+
+    def test_close(self):
+        multiplexer = Multiplexer()
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, write_fd)
+        sink = Sink()
+        multiplexer.add(read_fd, sink, "first")
+        self.assertEqual(["first"], multiplexer.close())
+        self.assertFalse(sink.closed)
+        self.assertRaises(OSError, os.fstat, read_fd)
@@ -28,6 +28,7 @@ from testtools.matchers import Equals, Matcher, MatchesAny, MatchesListwise, Mis
 from testtools.testresult.doubles import StreamResult
 
 import subunit._output as _o
+from subunit import ByteStreamToStreamResult, StreamResultToBytes
 from subunit._output import _ALL_ACTIONS, _FINAL_ACTIONS, generate_stream_results, parse_arguments
 
 
@@ -91,6 +92,12 @@ class TestStatusArgParserTests(TestCase):
 
         self.assertThat(args.file_name, Equals("foo"))
 
+    def test_can_override_stdin_filename_and_read_stdin(self):
+        self.patch(_o.sys, "stdin", TextIOWrapper(BytesIO(b"Hello")))
+        args = safe_parse_arguments(args=[self.option, "foo", "--attach-file", "-", "--file-name", "foo"])
+
+        self.assertThat(args.attach_file.read(), Equals(b"Hello"))
+
     def test_requires_test_id(self):
         def fn():
             return safe_parse_arguments(args=[self.option])
@@ -526,6 +533,29 @@ class FileDataTests(TestCase):
                 ),
             )
 
+    def test_encoder_reads_file_in_chunks(self):
+        self.patch(_o, "create_timestamp", lambda: None)
+        with temp_file_contents(b"Hello") as f:
+            output = BytesIO()
+            writer = StreamResultToBytes(output)
+            writer.file_chunk_size = 2
+            generate_stream_results(
+                safe_parse_arguments(["--fail", "foo", "--attach-file", f.name, "--tag", "bar"]), writer
+            )
+            result = StreamResult()
+            ByteStreamToStreamResult(BytesIO(output.getvalue())).run(result)
+
+            self.assertThat(
+                result._events,
+                MatchesListwise(
+                    [
+                        MatchesStatusCall(test_id="foo", test_status=None, test_tags={"bar"}, file_bytes=b"He"),
+                        MatchesStatusCall(test_id="foo", test_status=None, test_tags=None, file_bytes=b"ll"),
+                        MatchesStatusCall(test_id="foo", test_status="fail", file_bytes=b"o", eof=True),
+                    ]
+                ),
+            )
+
     def test_can_specify_tags_without_test_status(self):
         result = get_result_for(
             [
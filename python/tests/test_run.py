@@ -14,16 +14,23 @@
 #  limitations under that license.
 #
 
+import datetime
 import io
+import os
+import subprocess
+import sys
 import unittest
 
+import fixtures
+from iso8601 import UTC
 from testtools import PlaceHolder, TestCase
 
 from testtools.matchers import StartsWith
 from testtools.testresult.doubles import StreamResult
 
 import subunit
-from subunit import run
+from subunit import StreamResultToBytes, run
+from subunit.flushing import FlushBytes
 from subunit.run import SubunitTestRunner
 
 
@@ -57,6 +64,19 @@ class TestSubunitTestRunner(TestCase):
             [event[:3] for event in eventstream._events[:2]],
         )
 
+    def test_flush_policy(self):
+        flushes = []
+
+        class Stream(io.BytesIO):
+            def flush(self):
+                flushes.append(self.tell())
+
+        bytestream = Stream()
+        runner = SubunitTestRunner(stream=bytestream, flush_policy=FlushBytes(1 << 20))
+        runner.run(unittest.TestSuite([PlaceHolder("name1"), PlaceHolder("name2")]))
+        # Only stopTestRun flushes.
+        self.assertEqual([len(bytestream.getvalue())], flushes)
+
     def test_list_errors_if_errors_from_list_test(self):
         bytestream = io.BytesIO()
         runner = SubunitTestRunner(stream=bytestream)
@@ -113,3 +133,167 @@ class TestSubunitTestRunner(TestCase):
             stdout=stream,
         )
         self.assertEqual(0, exc.args[0])
+
+
+class TestFlushedOutput(TestCase):
+    class PrintingTests(unittest.TestCase):
+        def test_a(self):
+            print("printed by a")
+
+        def test_b(self):
+            sys.stdout.buffer.write(b"printed by b\n")
+
+    def test_prints_stay_with_their_tests(self):
+        # Packets are held back by the flush policy, so prints must be too.
+        ps = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "subunit.run",
+                "--flush",
+                "bytes:1048576",
+                "tests.test_run.TestFlushedOutput.PrintingTests",
+            ],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        out, err = ps.communicate()
+        self.assertEqual(0, ps.returncode, err)
+        events = StreamResult()
+        subunit.ByteStreamToStreamResult(io.BytesIO(out), non_subunit_name="stdout").run(events)
+        prefix = "tests.test_run.TestFlushedOutput.PrintingTests."
+        self.assertEqual(
+            [
+                (prefix + "test_a", "inprogress", None),
+                (None, None, b"printed by a\n"),
+                (prefix + "test_a", "success", None),
+                (prefix + "test_b", "inprogress", None),
+                (None, None, b"printed by b\n"),
+                (prefix + "test_b", "success", None),
+            ],
+            [(event[1], event[2], event[6] and bytes(event[6])) for event in events._events if event[2] != "exists"],
+        )
+
+
+class TestRunParallel(TestCase):
+    class Tests(TestCase):
+        def test_one(self):
+            pass
+
+        def test_two(self):
+            pass
+
+        def test_three(self):
+            pass
+
+        def test_four(self):
+            self.fail("four")
+
+        def test_print(self):
+            print("printed")
+
+        def test_exit(self):
+            raise SystemExit(0)
+
+    def _run(self, names, workers=2):
+        bytestream = io.BytesIO()
+        runner = SubunitTestRunner(stream=bytestream, parallel=workers)
+        suite = unittest.TestSuite([self.Tests(name) for name in names])
+        outcome = runner.run(suite)
+        eventstream = StreamResult()
+        subunit.ByteStreamToStreamResult(io.BytesIO(bytestream.getvalue())).run(eventstream)
+        return outcome, [event for event in eventstream._events if event[0] == "status"]
+
+    def _id(self, name):
+        return self.Tests(name).id()
+
+    def test_runs_every_test_once_in_workers(self):
+        names = ["test_one", "test_two", "test_three"] * 3
+        outcome, events = self._run(names)
+        self.assertTrue(outcome.wasSuccessful())
+        exists = [event[1] for event in events if event[2] == "exists"]
+        self.assertEqual([self._id(name) for name in names], exists)
+        finished = [event for event in events if event[2] == "success"]
+        self.assertEqual(sorted(exists), sorted(event[1] for event in finished))
+        for event in events:
+            if event[2] == "exists":
+                self.assertEqual(None, event[9])
+            else:
+                self.assertIn(event[9], ("0", "1"))
+
+    def test_failure(self):
+        outcome, events = self._run(["test_one", "test_four"])
+        self.assertFalse(outcome.wasSuccessful())
+        self.assertIn((self._id("test_four"), "fail"), [event[1:3] for event in events])
+
+    def test_output_is_wrapped(self):
+        outcome, events = self._run(["test_print", "test_one"])
+        printed = [event for event in events if event[5] == "stdout"]
+        # The print may reach the pipe in more than one write.
+        self.assertEqual(b"printed\n", b"".join(bytes(event[6]) for event in printed))
+        self.assertEqual(1, len({event[9] for event in printed}))
+        self.assertIn(printed[0][9], ("0", "1"))
+
+    def test_worker_exiting_is_a_failure(self):
+        outcome, events = self._run(["test_exit", "test_one"])
+        self.assertFalse(outcome.wasSuccessful())
+        failed = [event[9] for event in events if event[1:3] == ("subunit.run.worker", "fail")]
+        self.assertEqual(1, len(failed))
+        self.assertIn((self._id("test_one"), "success"), [event[1:3] for event in events])
+
+    def test_one_worker_runs_serially(self):
+        outcome, events = self._run(["test_one"], workers=1)
+        self.assertEqual([None, None, None], [event[9] for event in events])
+
+    def test_option(self):
+        bytestream = io.BytesIO()
+        stream = io.TextIOWrapper(bytestream, encoding="utf8")
+        run.main(argv=["progName", "--parallel", "2", "tests.test_run.TestRunParallel.Tests.test_one"], stdout=stream)
+        eventstream = StreamResult()
+        subunit.ByteStreamToStreamResult(io.BytesIO(bytestream.getvalue())).run(eventstream)
+        self.assertIn(
+            (self._id("test_one"), "success", "0"),
+            [(event[1], event[2], event[9]) for event in eventstream._events if event[0] == "status"],
+        )
+
+
+class TestRunShard(TestCase):
+    class Tests(TestCase):
+        def test_a(self):
+            pass
+
+        def test_b(self):
+            pass
+
+        def test_c(self):
+            pass
+
+        def test_d(self):
+            pass
+
+    def _run(self, *args):
+        bytestream = io.BytesIO()
+        stream = io.TextIOWrapper(bytestream, encoding="utf8")
+        run.main(argv=["progName"] + list(args) + ["tests.test_run.TestRunShard.Tests"], stdout=stream)
+        eventstream = StreamResult()
+        subunit.ByteStreamToStreamResult(io.BytesIO(bytestream.getvalue())).run(eventstream)
+        return [event[1].rsplit(".", 1)[1] for event in eventstream._events if event[2] == "success"]
+
+    def test_shards_cover_the_tests(self):
+        shards = [self._run("--shard", "%d/3" % index) for index in (1, 2, 3)]
+        self.assertEqual(["test_a", "test_b", "test_c", "test_d"], sorted(sum(shards, [])))
+
+    def test_shard_timings(self):
+        timings = io.BytesIO()
+        output = StreamResultToBytes(timings)
+        start = datetime.datetime(2026, 1, 1, tzinfo=UTC)
+        for name, seconds in (("test_a", 10), ("test_b", 1), ("test_c", 1), ("test_d", 1)):
+            test_id = self.Tests(name).id()
+            output.status(test_id=test_id, test_status="inprogress", timestamp=start)
+            output.status(test_id=test_id, test_status="success", timestamp=start + datetime.timedelta(seconds=seconds))
+        path = self.useFixture(fixtures.TempDir()).path + "/timings"
+        with open(path, "wb") as f:
+            f.write(timings.getvalue())
+        self.assertEqual(["test_a"], self._run("--shard", "1/2", "--shard-timings", path))
+        self.assertEqual(["test_b", "test_c", "test_d"], self._run("--shard", "2/2", "--shard-timings", path))
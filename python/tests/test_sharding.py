@@ -0,0 +1,86 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.sharding."""
+
+import datetime
+import io
+
+from iso8601 import UTC
+from testtools import TestCase
+
+from subunit import StreamResultToBytes
+from subunit.sharding import assign_shards, parse_shard, read_durations, select_shard
+
+
+class TestParseShard(TestCase):
+    def test_parse(self):
+        self.assertEqual((0, 4), parse_shard("1/4"))
+        self.assertEqual((3, 4), parse_shard("4/4"))
+
+    def test_invalid(self):
+        for text in ("0/4", "5/4", "1/0", "1", "a/b", "1/2/3"):
+            self.assertRaises(ValueError, parse_shard, text)
+
+
+class TestAssignShards(TestCase):
+    test_ids = ["test_%02d" % number for number in range(40)]
+
+    def test_covers_every_test_once(self):
+        shards = assign_shards(self.test_ids, 3)
+        self.assertEqual(sorted(self.test_ids), sorted(test_id for shard in shards for test_id in shard))
+
+    def test_independent_of_order(self):
+        durations = {test_id: float(number % 7) for number, test_id in enumerate(self.test_ids[:30])}
+        self.assertEqual(
+            assign_shards(self.test_ids, 4, durations),
+            assign_shards(list(reversed(self.test_ids)), 4, durations),
+        )
+
+    def test_longest_first(self):
+        durations = {"a": 10.0, "b": 6.0, "c": 5.0, "d": 4.0, "e": 1.0}
+        self.assertEqual([{"a", "d"}, {"b", "c", "e"}], assign_shards(sorted(durations), 2, durations))
+
+    def test_untimed_tests_stay_put(self):
+        before = assign_shards(self.test_ids, 4)
+        after = assign_shards(self.test_ids + ["test_new"], 4)
+        for old, new in zip(before, after):
+            self.assertEqual(set(), old - new)
+
+    def test_untimed_tests_count_towards_load(self):
+        durations = {"timed_%d" % number: 1.0 for number in range(4)}
+        test_ids = sorted(durations) + ["untimed_%d" % number for number in range(4)]
+        shards = assign_shards(test_ids, 2, durations)
+        self.assertEqual([4, 4], [len(shard) for shard in shards])
+
+    def test_select_shard_keeps_order(self):
+        selected = [select_shard(self.test_ids, index, 3) for index in range(3)]
+        for shard in selected:
+            self.assertEqual(sorted(shard), shard)
+        self.assertEqual(len(self.test_ids), sum(len(shard) for shard in selected))
+
+
+class TestReadDurations(TestCase):
+    def test_read_durations(self):
+        buf = io.BytesIO()
+        output = StreamResultToBytes(buf)
+        start = datetime.datetime(2026, 1, 1, tzinfo=UTC)
+        for test_id, seconds in (("foo", 1.5), ("bar", 0.25)):
+            output.status(test_id=test_id, test_status="inprogress", timestamp=start)
+            output.status(test_id=test_id, test_status="success", timestamp=start + datetime.timedelta(seconds=seconds))
+        output.status(test_id="untimed", test_status="exists")
+        buf.seek(0)
+        self.assertEqual({"foo": 1.5, "bar": 0.25}, read_durations(buf))
@@ -16,23 +16,30 @@
 
 """Tests for subunit.filter_scripts.subunit_combine."""
 
+import datetime
 import os
 import subprocess
 import sys
 import tempfile
 from io import BytesIO
 
+import fixtures
 from testtools import TestCase
 from testtools.testresult.doubles import StreamResult
 
 from subunit import ByteStreamToStreamResult, StreamResultToBytes
 from subunit.filter_scripts.subunit_combine import (
+    _command_result,
+    _longest_first,
     _PrefixingStreamResult,
     _expand_argv,
     _read_id_list,
     _select_ids_for_command,
     combine,
+    command_durations,
+    list_test_ids,
     load_config,
+    read_timings,
 )
 
 
@@ -67,6 +74,18 @@ class TestPrefixingStreamResult(TestCase):
         self.assertEqual([("status", None, None)], [ev[:3] for ev in target._events])
 
 
+class TestCommandResult(TestCase):
+    def test_prefixes_and_routes(self):
+        target = StreamResult()
+        result = _command_result(target, {"prefix": "py/"}, "1")
+        result.status(test_id="foo", test_status="success")
+        result.status(test_id="bar", test_status="success", route_code="0")
+        self.assertEqual(
+            [("py/foo", "1"), ("py/bar", "1/0")],
+            [(ev[1], ev[9]) for ev in target._events],
+        )
+
+
 class TestLoadConfig(TestCase):
     def _write(self, text):
         fd, path = tempfile.mkstemp(suffix=".yaml")
@@ -142,6 +161,14 @@ class TestCombine(TestCase):
             _parse(output.getvalue()),
         )
 
+    def test_no_prefix_copies_packets_verbatim(self):
+        # Length needlessly encoded in two bytes; re-encoding would shorten it.
+        stream = b"\xb3)\x01@\r\x03fooA\xe1G?"
+        output = BytesIO()
+        rc = combine([{"argv": self._cat_cmd(stream)}], output)
+        self.assertEqual(0, rc)
+        self.assertEqual(stream, output.getvalue())
+
     def test_nonzero_exit_propagates(self):
         stream = _stream_with_tests(["only"])
         src = "import sys; sys.stdout.buffer.write({!r}); sys.exit(3)".format(stream)
@@ -473,3 +500,270 @@ class TestCombineListAndFilter(TestCase):
             [("py/one", "inprogress"), ("py/one", "success")],
             _parse(out),
         )
+
+
+def _parse_routed(data):
+    """Parse a subunit v2 byte stream into a list of (route_code, test_id, test_status)."""
+    events = StreamResult()
+    ByteStreamToStreamResult(BytesIO(data)).run(events)
+    return [(ev[9], ev[1], ev[2]) for ev in events._events if ev[0] == "status"]
+
+
+class TestCombineConcurrently(TestCase):
+    def _cmd(self, data, before=""):
+        src = "import os, sys, time\n{}\nsys.stdout.buffer.write({!r})".format(before, data)
+        return [sys.executable, "-c", src]
+
+    def test_runs_commands_at_once(self):
+        # The first command waits for the second, so would time out if they
+        # were run one after another.
+        flag = os.path.join(self.useFixture(fixtures.TempDir()).path, "flag")
+        wait = (
+            "deadline = time.time() + 30\n"
+            "while not os.path.exists({!r}):\n"
+            "    if time.time() > deadline: sys.exit(2)\n"
+            "    time.sleep(0.01)".format(flag)
+        )
+        commands = [
+            {"prefix": "py/", "argv": self._cmd(_stream_with_tests(["one", "two"]), wait)},
+            {"prefix": "rs/", "argv": self._cmd(_stream_with_tests(["alpha"]), "open({!r}, 'w').close()".format(flag))},
+        ]
+        output = BytesIO()
+        self.assertEqual(0, combine(commands, output, jobs=2))
+        events = _parse_routed(output.getvalue())
+        self.assertEqual(
+            [
+                ("0", "py/one", "inprogress"),
+                ("0", "py/one", "success"),
+                ("0", "py/two", "inprogress"),
+                ("0", "py/two", "success"),
+            ],
+            [event for event in events if event[0] == "0"],
+        )
+        self.assertEqual(
+            [("1", "rs/alpha", "inprogress"), ("1", "rs/alpha", "success")],
+            [event for event in events if event[0] == "1"],
+        )
+
+    def test_large_packets_stay_whole(self):
+        buf = BytesIO()
+        StreamResultToBytes(buf).status(test_id="big", file_name="log", file_bytes=b"x" * 60000, test_status="success")
+        src = "import sys\nfor _ in range(20): sys.stdout.buffer.write({!r})".format(buf.getvalue())
+        commands = [{"argv": [sys.executable, "-c", src]} for _ in range(3)]
+        output = BytesIO()
+        self.assertEqual(0, combine(commands, output, jobs=3))
+        events = _parse_routed(output.getvalue())
+        self.assertEqual(60, len(events))
+        self.assertEqual({"0", "1", "2"}, {event[0] for event in events})
+        self.assertEqual({"big"}, {event[1] for event in events})
+
+    def test_non_subunit_output_routed(self):
+        output = BytesIO()
+        self.assertEqual(0, combine([{"argv": self._cmd(b"hello")}, {"argv": ["true"]}], output, jobs=2))
+        events = StreamResult()
+        ByteStreamToStreamResult(BytesIO(output.getvalue())).run(events)
+        self.assertEqual(
+            [("0", "stdout", b"hello")],
+            [(ev[9], ev[5], bytes(ev[6])) for ev in events._events if ev[0] == "status"],
+        )
+
+    def test_nonzero_exit_propagates(self):
+        commands = [{"argv": self._cmd(b"", "sys.exit(3)")}, {"argv": self._cmd(_stream_with_tests(["ok"]))}]
+        output = BytesIO()
+        self.assertEqual(1, combine(commands, output, jobs=2))
+        self.assertEqual([("1", "ok", "inprogress"), ("1", "ok", "success")], _parse_routed(output.getvalue()))
+
+    def test_cli_starts_longest_first(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        flag = os.path.join(tempdir, "flag")
+        wait = (
+            "deadline = time.time() + 30\n"
+            "while not os.path.exists({!r}):\n"
+            "    if time.time() > deadline: sys.exit(2)\n"
+            "    time.sleep(0.01)".format(flag)
+        )
+        # Only the quickest command checks that the slowest has started.
+        commands = [
+            {
+                "prefix": "quick/",
+                "argv": self._cmd(_stream_with_tests(["a"]), "if not os.path.exists({!r}): sys.exit(1)".format(flag)),
+            },
+            {"prefix": "medium/", "argv": self._cmd(_stream_with_tests(["b"]), wait)},
+            {"prefix": "slow/", "argv": self._cmd(_stream_with_tests(["c"]), "open({!r}, 'w').close()".format(flag))},
+        ]
+        config = os.path.join(tempdir, "config.yaml")
+        with open(config, "w") as f:
+            import yaml
+
+            yaml.safe_dump({"commands": commands}, f)
+        start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        timings = os.path.join(tempdir, "timings")
+        with open(timings, "wb") as f:
+            out = StreamResultToBytes(f)
+            for route_code, prefix, seconds in (("0", "quick/", 1), ("1", "medium/", 2), ("2", "slow/", 10)):
+                out.status(test_id=prefix + "x", test_status="inprogress", route_code=route_code, timestamp=start)
+                out.status(
+                    test_id=prefix + "x",
+                    test_status="success",
+                    route_code=route_code,
+                    timestamp=start + datetime.timedelta(seconds=seconds),
+                )
+        ps = subprocess.Popen(
+            [sys.executable, "-m", "subunit.filter_scripts.subunit_combine", "-j", "2", "--timings", timings, config],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        out, err = ps.communicate()
+        self.assertEqual(0, ps.returncode, err)
+        self.assertEqual(
+            {("0", "quick/a"), ("1", "medium/b"), ("2", "slow/c")},
+            {event[:2] for event in _parse_routed(out)},
+        )
+
+    def test_longest_first(self):
+        selected = [(0, {}, None), (1, {}, None), (2, {}, None), (3, {}, None)]
+        self.assertEqual(
+            [2, 1, 3, 0],
+            [entry[0] for entry in _longest_first(selected, {0: 1.0, 1: 30.0, 3: 5.0})],
+        )
+
+
+class TestCommandDurations(TestCase):
+    start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    commands = [{"prefix": "py/", "argv": ["true"]}, {"prefix": "rs/", "argv": ["true"]}]
+
+    def _stream(self, events):
+        """A stream of (test id, route code, seconds) events."""
+        buf = BytesIO()
+        out = StreamResultToBytes(buf)
+        for test_id, route_code, seconds in events:
+            out.status(
+                test_id=test_id,
+                test_status="inprogress",
+                route_code=route_code,
+                timestamp=self.start + datetime.timedelta(seconds=seconds),
+            )
+        return BytesIO(buf.getvalue())
+
+    def test_by_route_code(self):
+        # As combine --jobs writes, with the commands' own route codes
+        # beneath their positions.
+        stream = self._stream(
+            [("py/a", "0/1", 0), ("py/a", "0/1", 7), ("rs/b", "1", 1), ("rs/b", "1", 4), (None, "1", 9)]
+        )
+        self.assertEqual({0: 7.0, 1: 8.0}, command_durations(stream, self.commands))
+
+    def test_by_prefix_without_route_codes(self):
+        stream = self._stream(
+            [("py/a", None, 0), ("py/a", None, 7), ("rs/b", "0", 1), ("rs/b", "0", 4), ("c", None, 9)]
+        )
+        self.assertEqual({0: 7.0, 1: 3.0}, command_durations(stream, self.commands))
+
+    def test_serial_route_codes_are_not_positions(self):
+        # Run one after another, commands' own route codes, such as worker
+        # numbers, are passed through unchanged.
+        buf = BytesIO()
+        out = StreamResultToBytes(buf)
+        out.status(test_id="x", test_status="inprogress", route_code="1", timestamp=self.start)
+        out.status(
+            test_id="x", test_status="success", route_code="1", timestamp=self.start + datetime.timedelta(seconds=100)
+        )
+        src = "import sys\nsys.stdout.buffer.write({!r})".format(buf.getvalue())
+        commands = [
+            {"prefix": "a.", "argv": [sys.executable, "-c", src]},
+            {"prefix": "b.", "argv": ["true"]},
+        ]
+        output = BytesIO()
+        self.assertEqual(0, combine(commands, output))
+        self.assertEqual(
+            [("1", "a.x", "inprogress"), ("1", "a.x", "success")],
+            _parse_routed(output.getvalue()),
+        )
+        self.assertEqual({0: 100.0}, command_durations(BytesIO(output.getvalue()), commands))
+
+    def test_read_timings(self):
+        stream = self._stream([("py/a", "0", 0), ("py/a", "0", 7), ("rs/b", "1", 1), ("rs/b", "1", 4)])
+        self.assertEqual(
+            ({0: 7.0, 1: 3.0}, {"py/a": 7.0, "rs/b": 3.0}),
+            read_timings(stream, self.commands),
+        )
+
+
+class TestCombineShard(TestCase):
+    test_ids = ["a", "b", "c", "d", "e"]
+
+    def _suite_cmd(self):
+        """A command that lists test_ids with --list, and otherwise runs the ids it is given."""
+        listing = BytesIO()
+        out = StreamResultToBytes(listing)
+        for tid in self.test_ids:
+            out.status(test_id=tid, test_status="exists")
+        runs = {tid: _stream_with_tests([tid]) for tid in self.test_ids}
+        src = (
+            "import sys; args = sys.argv[1:]; "
+            "sys.stdout.buffer.write({!r} if args == ['--list'] else b''.join({!r}[tid] for tid in args))"
+        ).format(listing.getvalue(), runs)
+        return {
+            "prefix": "py/",
+            "argv": [sys.executable, "-c", src, "$LISTOPT", "$IDLIST"],
+            "list_option": "--list",
+        }
+
+    def _config(self, commands):
+        fd, path = tempfile.mkstemp(suffix=".yaml")
+        self.addCleanup(os.unlink, path)
+        with os.fdopen(fd, "w") as f:
+            import yaml
+
+            yaml.safe_dump({"commands": commands}, f)
+        return path
+
+    def _run_cli(self, *args):
+        ps = subprocess.Popen(
+            [sys.executable, "-m", "subunit.filter_scripts.subunit_combine"] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        out, err = ps.communicate()
+        return ps.returncode, out, err
+
+    def test_list_test_ids(self):
+        self.assertEqual(["py/" + tid for tid in self.test_ids], list_test_ids([self._suite_cmd()]))
+
+    def test_list_test_ids_needs_list_option(self):
+        e = self.assertRaises(ValueError, list_test_ids, [self._suite_cmd(), {"argv": ["true"]}])
+        self.assertIn("list_option", str(e))
+
+    def test_cli_shards_cover_the_suite(self):
+        path = self._config([self._suite_cmd()])
+        ran = []
+        for index in (1, 2, 3):
+            rc, out, err = self._run_cli("--shard", "%d/3" % index, path)
+            self.assertEqual(0, rc, err)
+            ran.extend(tid for tid, status in _parse(out) if status == "success")
+        self.assertEqual(["py/" + tid for tid in self.test_ids], sorted(ran))
+
+    def test_cli_shard_timings(self):
+        start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        buf = BytesIO()
+        out = StreamResultToBytes(buf)
+        for tid in self.test_ids:
+            seconds = 10 if tid == "c" else 1
+            out.status(test_id="py/" + tid, test_status="inprogress", timestamp=start)
+            out.status(
+                test_id="py/" + tid, test_status="success", timestamp=start + datetime.timedelta(seconds=seconds)
+            )
+        fd, timings = tempfile.mkstemp(suffix=".subunit")
+        self.addCleanup(os.unlink, timings)
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf.getvalue())
+        path = self._config([self._suite_cmd()])
+        rc, out, err = self._run_cli("--shard", "1/2", "--timings", timings, path)
+        self.assertEqual(0, rc, err)
+        self.assertEqual(["py/c"], [tid for tid, status in _parse(out) if status == "success"])
+
+    def test_cli_shard_without_list_option(self):
+        path = self._config([{"argv": ["true"]}])
+        rc, out, err = self._run_cli("--shard", "1/2", path)
+        self.assertEqual(2, rc)
+        self.assertIn(b"list_option", err)
@@ -15,10 +15,15 @@
 #
 
 import datetime
+import os
+import tempfile
+import threading
 from io import BytesIO
 from typing import Callable, Optional
 from types import ModuleType
 
+import fixtures
+
 try:
     from hypothesis import given
 
@@ -55,6 +60,8 @@ CONSTANT_MIME = b"\xb3! #\x1aapplication/foo; charset=1x3Q\x15"
 CONSTANT_TIMESTAMP = b"\xb3+\x03\x13<\x17T\xcf\x80\xaf\xc8\x03barI\x96>-"
 CONSTANT_ROUTE_CODE = b"\xb3-\x03\x13\x03bar\x06source\x9cY9\x19"
 CONSTANT_RUNNABLE = b"\xb3(\x03\x0c\x03foo\xe3\xea\xf5\xa4"
+# CONSTANT_ENUM with its length needlessly encoded in two bytes.
+CONSTANT_ENUM_LONG_LENGTH = b"\xb3)\x01@\r\x03fooA\xe1G?"
 CONSTANT_TAGS = [
     b"\xb3)\x80\x15\x03bar\x02\x03foo\x03barTHn\xb4",
     b"\xb3)\x80\x15\x03bar\x02\x03bar\x03foo\xf8\xf1\x91o",
@@ -76,36 +83,17 @@ class TestStreamResultToBytes(TestCase):
         return subunit.StreamResultToBytes(output), output
 
     def test_numbers(self):
-        result = subunit.StreamResultToBytes(BytesIO())
-        packet = []
-        self.assertRaises(Exception, result._write_number, -1, packet)
-        self.assertEqual([], packet)
-        result._write_number(0, packet)
-        self.assertEqual([b"\x00"], packet)
-        del packet[:]
-        result._write_number(63, packet)
-        self.assertEqual([b"\x3f"], packet)
-        del packet[:]
-        result._write_number(64, packet)
-        self.assertEqual([b"\x40\x40"], packet)
-        del packet[:]
-        result._write_number(16383, packet)
-        self.assertEqual([b"\x7f\xff"], packet)
-        del packet[:]
-        result._write_number(16384, packet)
-        self.assertEqual([b"\x80\x40", b"\x00"], packet)
-        del packet[:]
-        result._write_number(4194303, packet)
-        self.assertEqual([b"\xbf\xff", b"\xff"], packet)
-        del packet[:]
-        result._write_number(4194304, packet)
-        self.assertEqual([b"\xc0\x40\x00\x00"], packet)
-        del packet[:]
-        result._write_number(1073741823, packet)
-        self.assertEqual([b"\xff\xff\xff\xff"], packet)
-        del packet[:]
-        self.assertRaises(Exception, result._write_number, 1073741824, packet)
-        self.assertEqual([], packet)
+        encode = subunit.v2._encode_varint
+        self.assertRaises(Exception, encode, -1)
+        self.assertEqual(b"\x00", encode(0))
+        self.assertEqual(b"\x3f", encode(63))
+        self.assertEqual(b"\x40\x40", encode(64))
+        self.assertEqual(b"\x7f\xff", encode(16383))
+        self.assertEqual(b"\x80\x40\x00", encode(16384))
+        self.assertEqual(b"\xbf\xff\xff", encode(4194303))
+        self.assertEqual(b"\xc0\x40\x00\x00", encode(4194304))
+        self.assertEqual(b"\xff\xff\xff\xff", encode(1073741823))
+        self.assertRaises(Exception, encode, 1073741824)
 
     def test_volatile_length(self):
         # if the length of the packet data before the length itself is
@@ -145,13 +133,18 @@ class TestStreamResultToBytes(TestCase):
         self.assertEqual(b"\x80\x40\x01", output.getvalue()[3:6])
         output.seek(0)
         output.truncate()
-        # 3 bytes long
+        # 3 bytes long, with content only split beyond that.
+        result.file_chunk_size = 4194289
         result.status(file_name="", file_bytes=b"\xff" * 4194289)
         self.assertThat(output.getvalue(), HasLength(4194303))
         self.assertEqual(b"\xbf\xff\xff", output.getvalue()[3:6])
+        del result.file_chunk_size
         output.seek(0)
         output.truncate()
-        self.assertRaises(Exception, result.status, file_name="", file_bytes=b"\xff" * 4194290)
+        # Too long for one packet: split in two.
+        result.status(file_name="", file_bytes=b"\xff" * 4194290)
+        self.assertEqual(b"\xb3", output.getvalue()[3670030:3670031])
+        self.assertRaises(Exception, result.status, test_id="\xff" * 4194290)
 
     def test_trivial_enumeration(self):
         result, output = self._make_result()
@@ -229,22 +222,234 @@ class TestStreamResultToBytes(TestCase):
         result.status(test_id="bar", test_status="success", timestamp=timestamp)
         self.assertEqual(CONSTANT_TIMESTAMP, output.getvalue())
 
+    def test_integer_timestamp(self):
+        output = BytesIO()
+        result = subunit.StreamResultToBytes(output, integer_timestamps=True)
+        result.status(test_id="bar", test_status="success", timestamp=1008161999000045000)
+        self.assertEqual(CONSTANT_TIMESTAMP, output.getvalue())
+
+    def test_integer_timestamp_keeps_nanoseconds(self):
+        output = BytesIO()
+        subunit.StreamResultToBytes(output, integer_timestamps=True).status(timestamp=1008161999000045123)
+        result = StreamResult()
+        subunit.ByteStreamToStreamResult(BytesIO(output.getvalue()), integer_timestamps=True).run(result)
+        self.assertEqual(1008161999000045123, result._events[0][10])
+
+    def test_repeated_strings_are_cached(self):
+        result, output = self._make_result()
+        result.status(test_id="foo", test_status="success")
+        result.status(test_id="foo", test_status="success")
+        self.assertEqual(CONSTANT_SUCCESS * 2, output.getvalue())
+        self.assertEqual(1, result._encode_utf8.cache_info().hits)
+
+    def test_non_ascii_strings(self):
+        result, output = self._make_result()
+        result.status(test_id="f\xf6\xf6", test_tags={"\u2603"}, route_code="\xe9")
+        events = StreamResult()
+        subunit.ByteStreamToStreamResult(BytesIO(output.getvalue())).run(events)
+        self.assertEqual(("f\xf6\xf6", None, {"\u2603"}), events._events[0][1:4])
+        self.assertEqual("\xe9", events._events[0][9])
+
+    def test_status_batch_writes_once(self):
+        result, output = self._make_result()
+        writes = []
+        output.write = lambda data: writes.append(bytes(data)) or len(data)
+        result.status_batch([dict(test_id="foo", test_status="success"), dict(test_id="foo", test_status="fail")])
+        self.assertEqual([CONSTANT_SUCCESS + CONSTANT_FAIL], writes)
+
+    def test_status_batch_limits_buffering(self):
+        result, output = self._make_result()
+        result.batch_buffer_size = len(CONSTANT_SUCCESS) * 2
+        writes = []
+        output.write = lambda data: writes.append(bytes(data)) or len(data)
+        result.status_batch(dict(test_id="foo", test_status="success") for _ in range(5))
+        self.assertEqual([CONSTANT_SUCCESS * 2, CONSTANT_SUCCESS * 2, CONSTANT_SUCCESS], writes)
+
+    def _chunked_events(self, file_bytes, test_status="fail"):
+        output = BytesIO()
+        writer = subunit.StreamResultToBytes(output)
+        writer.file_chunk_size = 4
+        writer.status(
+            test_id="foo",
+            test_status=test_status,
+            test_tags={"quux"},
+            file_name="log",
+            file_bytes=file_bytes,
+            eof=True,
+            mime_type="text/plain",
+        )
+        result = StreamResult()
+        subunit.ByteStreamToStreamResult(BytesIO(output.getvalue())).run(result)
+        return [event[1:9] for event in result._events]
+
+    def test_file_content_is_chunked(self):
+        self.assertEqual(
+            [
+                ("foo", None, {"quux"}, True, "log", b"0123", False, "text/plain"),
+                ("foo", None, None, True, "log", b"4567", False, None),
+                ("foo", "fail", None, True, "log", b"89", True, None),
+            ],
+            self._chunked_events(BytesIO(b"0123456789")),
+        )
+
+    def test_file_content_from_bytes(self):
+        self.assertEqual(
+            [b"0123", b"4567", b"89"],
+            [event[5] for event in self._chunked_events(b"0123456789")],
+        )
+
+    def test_large_bytes_not_encoded_whole(self):
+        writer = subunit.StreamResultToBytes(BytesIO())
+        writer.file_chunk_size = 4
+        encode_packet = writer._encode_packet
+        sizes = []
+
+        def _encode_packet(file_bytes=None, **kwargs):
+            sizes.append(len(file_bytes))
+            return encode_packet(file_bytes=file_bytes, **kwargs)
+
+        writer._encode_packet = _encode_packet
+        writer.status(test_id="foo", file_name="log", file_bytes=b"0123456789")
+        self.assertEqual([4, 4, 2], sizes)
+
+    def test_interim_status_on_first_chunk(self):
+        self.assertEqual(
+            ["inprogress", None],
+            [event[1] for event in self._chunked_events(BytesIO(b"012345"), "inprogress")],
+        )
+
+    def test_file_content_from_file(self):
+        self.assertEqual(
+            [b"0123", b"4567", b"89"],
+            [event[5] for event in self._chunked_events(BytesIO(b"0123456789"))],
+        )
+
+    def test_file_content_from_iterable(self):
+        self.assertEqual(
+            [b"0123", b"4567", b"89"],
+            [event[5] for event in self._chunked_events(iter([b"01", b"234567", b"89"]))],
+        )
+
+    def test_empty_file_content_from_file(self):
+        self.assertEqual(
+            [("foo", "fail", {"quux"}, True, "log", b"", True, "text/plain")],
+            self._chunked_events(BytesIO()),
+        )
+
+    def test_file_content_from_file_without_readinto(self):
+        class Reader(object):
+            def __init__(self, data):
+                self.read = BytesIO(data).read
+
+        self.assertEqual(
+            [b"0123", b"4567", b"89"],
+            [event[5] for event in self._chunked_events(Reader(b"0123456789"))],
+        )
+
+    def test_file_content_from_file_of_whole_chunks(self):
+        events = self._chunked_events(BytesIO(b"01234567"))
+        self.assertEqual([b"0123", b"4567", b""], [event[5] for event in events])
+        self.assertEqual([None, None, "fail"], [event[1] for event in events])
+
+    def test_attach_path(self):
+        with tempfile.NamedTemporaryFile() as source:
+            source.write(b"0123456789")
+            source.flush()
+            output = BytesIO()
+            writer = subunit.StreamResultToBytes(output)
+            writer.file_chunk_size = 4
+            writer.attach("log", source.name, mime_type="text/plain", test_id="foo", test_status="success")
+        result = StreamResult()
+        subunit.ByteStreamToStreamResult(BytesIO(output.getvalue())).run(result)
+        self.assertEqual(
+            [
+                ("foo", None, "log", b"0123", False, "text/plain"),
+                ("foo", None, "log", b"4567", False, None),
+                ("foo", "success", "log", b"89", True, None),
+            ],
+            [event[1:3] + event[5:9] for event in result._events],
+        )
+
+    def test_file_content_over_packet_limit(self):
+        output = BytesIO()
+        content = bytes(range(256)) * 20000
+        subunit.StreamResultToBytes(output).status(file_name="core", file_bytes=content, eof=True)
+        result = StreamResult()
+        subunit.ByteStreamToStreamResult(BytesIO(output.getvalue())).run(result)
+        self.assertEqual(2, len(result._events))
+        self.assertEqual(content, b"".join(event[6] for event in result._events))
+        self.assertEqual([False, True], [event[7] for event in result._events])
+
+
+class TestFindPacket(TestCase):
+    def test_finds_packet_after_text(self):
+        self.assertEqual((5, True), subunit.v2.find_packet(b"\xb3ab\n\xb3" + CONSTANT_SUCCESS + b"\xb3"))
+
+    def test_nothing_found(self):
+        self.assertEqual((3, False), subunit.v2.find_packet(b"a\xb3b"))
+
+    def test_not_final_stops_at_incomplete_packet(self):
+        self.assertEqual((1, False), subunit.v2.find_packet(b"a" + CONSTANT_SUCCESS[:-1], final=False))
+        self.assertEqual((len(CONSTANT_SUCCESS), False), subunit.v2.find_packet(b"a" + CONSTANT_SUCCESS[:-1]))
+
+
+class TestStatusBatch(TestCase):
+    def test_result_without_batch_support(self):
+        result = StreamResult()
+        subunit.v2.status_batch(result, [dict(test_id="foo"), dict(test_id="bar", test_status="fail")])
+        self.assertEqual([("foo", None), ("bar", "fail")], [event[1:3] for event in result._events])
+
+    def test_packet_encoder_emits_each_packet(self):
+        packets = []
+        subunit.v2._PacketEncoder(packets.append).status_batch([dict(test_id="foo", test_status="success")] * 2)
+        self.assertEqual([CONSTANT_SUCCESS] * 2, [packet.data for packet in packets])
+
+    def test_packet_encoder_inherited_methods(self):
+        packets = []
+        encoder = subunit.v2._PacketEncoder(packets.append)
+        encoder.startTestRun()
+        encoder.status(test_id="foo", test_status="success")
+        encoder.write_packet(packets[0])
+        encoder.stopTestRun()
+        self.assertEqual([CONSTANT_SUCCESS] * 2, [packet.data for packet in packets])
+
+
+class TestBatchingStreamResult(TestCase):
+    def test_batches(self):
+        output = BytesIO()
+        writer = subunit.StreamResultToBytes(output)
+        writes = []
+        output.write = lambda data: writes.append(bytes(data)) or len(data)
+        result = subunit.v2.BatchingStreamResult(writer, batch_size=2)
+        result.startTestRun()
+        for _ in range(3):
+            result.status(test_id="foo", test_status="success")
+        self.assertEqual([CONSTANT_SUCCESS * 2], writes)
+        result.stopTestRun()
+        self.assertEqual([CONSTANT_SUCCESS * 2, CONSTANT_SUCCESS], writes)
+
+    def test_flush(self):
+        target = StreamResult()
+        result = subunit.v2.BatchingStreamResult(target)
+        result.status(test_id="foo")
+        self.assertEqual([], target._events)
+        result.flush()
+        self.assertEqual([("foo", None)], [event[1:3] for event in target._events])
+
 
 class TestByteStreamToStreamResult(TestCase):
+    buffer_size = None
+
+    def _make_parser(self, source, **kwargs):
+        return subunit.ByteStreamToStreamResult(source, buffer_size=self.buffer_size, **kwargs)
+
     def test_non_subunit_encapsulated(self):
         source = BytesIO(b"foo\nbar\n")
         result = StreamResult()
-        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout").run(result)
+        self._make_parser(source, non_subunit_name="stdout").run(result)
         self.assertEqual(
             [
-                ("status", None, None, None, True, "stdout", b"f", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"o", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"o", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"\n", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"b", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"a", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"r", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"\n", False, None, None, None),
+                ("status", None, None, None, True, "stdout", b"foo\nbar\n", False, None, None, None),
             ],
             result._events,
         )
@@ -255,20 +460,70 @@ class TestByteStreamToStreamResult(TestCase):
         source = BytesIO(utf8_bytes)
         # Should be treated as one character (it is u'\u3cca') and wrapped
         result = StreamResult()
-        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout").run(result)
+        self._make_parser(source, non_subunit_name="stdout").run(result)
         self.assertEqual(
             [
-                ("status", None, None, None, True, "stdout", b"\xe3", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"\xb3", False, None, None, None),
-                ("status", None, None, None, True, "stdout", b"\x8a", False, None, None, None),
+                ("status", None, None, None, True, "stdout", b"\xe3\xb3\x8a", False, None, None, None),
             ],
             result._events,
         )
 
+    def test_fields_limits_decoding(self):
+        source = BytesIO(CONSTANT_TIMESTAMP + CONSTANT_ROUTE_CODE + CONSTANT_TAGS[0] + CONSTANT_FILE_CONTENT)
+        result = StreamResult()
+        self._make_parser(source, fields={"test_id", "test_status"}).run(result)
+        # The file packet has neither field, so is dropped.
+        self.assertEqual(
+            [
+                ("status", "bar", "success", None, True, None, None, False, None, None, None),
+                ("status", "bar", "success", None, True, None, None, False, None, None, None),
+                ("status", "bar", None, None, True, None, None, False, None, None, None),
+            ],
+            result._events,
+        )
+
+    def test_fields_skips_earlier_fields(self):
+        source = BytesIO(CONSTANT_ROUTE_CODE + CONSTANT_TAGS[0])
+        result = StreamResult()
+        self._make_parser(source, fields={"route_code", "test_tags"}).run(result)
+        self.assertEqual(
+            [
+                ("status", None, None, None, True, None, None, False, None, "source", None),
+                ("status", None, None, {"foo", "bar"}, True, None, None, False, None, None, None),
+            ],
+            result._events,
+        )
+
+    def test_intern_size_shares_strings_and_tags(self):
+        source = BytesIO(CONSTANT_TAGS[0] + CONSTANT_TAGS[0] + CONSTANT_TAGS[1])
+        result = StreamResult()
+        self._make_parser(source, intern_size=10).run(result)
+        first, second, third = result._events
+        self.assertEqual(frozenset({"foo", "bar"}), first[3])
+        self.assertIs(first[1], second[1])
+        self.assertIs(first[3], second[3])
+        self.assertEqual(first[3], third[3])
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, self._make_parser, BytesIO(), fields={"test_idd"})
+
+    def test_packet_filter(self):
+        source = BytesIO(CONSTANT_ENUM + CONSTANT_FILE_CONTENT + CONSTANT_ENUM)
+        result = StreamResult()
+        flags = []
+
+        def packet_filter(packet_flags):
+            flags.append(packet_flags)
+            return packet_flags & subunit.v2.FLAG_FILE_CONTENT
+
+        self._make_parser(source, packet_filter=packet_filter).run(result)
+        self.assertEqual([0x2901, 0x2140, 0x2901], flags)
+        self.assertEqual([("barney", b"woo")], [(event[5], bytes(event[6])) for event in result._events])
+
     def test_non_subunit_disabled_raises(self):
         source = BytesIO(b"foo\nbar\n")
         result = StreamResult()
-        case = subunit.ByteStreamToStreamResult(source)
+        case = self._make_parser(source)
         e = self.assertRaises(Exception, case.run, result)
         self.assertEqual(b"f", e.args[1])
         self.assertEqual(b"oo\nbar\n", source.read())
@@ -277,7 +532,7 @@ class TestByteStreamToStreamResult(TestCase):
     def test_trivial_enumeration(self):
         source = BytesIO(CONSTANT_ENUM)
         result = StreamResult()
-        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout").run(result)
+        self._make_parser(source, non_subunit_name="stdout").run(result)
         self.assertEqual(b"", source.read())
         self.assertEqual(
             [
@@ -289,7 +544,7 @@ class TestByteStreamToStreamResult(TestCase):
     def test_multiple_events(self):
         source = BytesIO(CONSTANT_ENUM + CONSTANT_ENUM)
         result = StreamResult()
-        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout").run(result)
+        self._make_parser(source, non_subunit_name="stdout").run(result)
         self.assertEqual(b"", source.read())
         self.assertEqual(
             [
@@ -320,7 +575,7 @@ class TestByteStreamToStreamResult(TestCase):
     def check_events(self, source_bytes, events):
         source = BytesIO(source_bytes)
         result = StreamResult()
-        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout").run(result)
+        self._make_parser(source, non_subunit_name="stdout").run(result)
         self.assertEqual(b"", source.read())
         self.assertEqual(events, result._events)
         # - any file attachments should be bytes equivalent [as users assume that].
@@ -452,6 +707,12 @@ class TestByteStreamToStreamResult(TestCase):
         timestamp = datetime.datetime(2001, 12, 12, 12, 59, 59, 45, iso8601.UTC)
         self.check_event(CONSTANT_TIMESTAMP, "success", test_id="bar", timestamp=timestamp)
 
+    def test_integer_timestamp(self):
+        for fields in (None, {"timestamp"}):
+            result = StreamResult()
+            self._make_parser(BytesIO(CONSTANT_TIMESTAMP), integer_timestamps=True, fields=fields).run(result)
+            self.assertEqual(1008161999000045000, result._events[0][10])
+
     def test_bad_crc_errors_via_status(self):
         file_bytes = CONSTANT_MIME[:-1] + b"\x00"
         self.check_events(
@@ -559,6 +820,671 @@ class TestByteStreamToStreamResult(TestCase):
         def test_hypothesis_decoding(self, code_bytes):
             source = BytesIO(code_bytes)
             result = StreamResult()
-            stream = subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout")
+            stream = self._make_parser(source, non_subunit_name="stdout")
             stream.run(result)
             self.assertEqual(b"", source.read())
+
+
+class TestByteStreamToStreamResultTinyBuffer(TestByteStreamToStreamResult):
+    """A one byte buffer frames every packet across block boundaries."""
+
+    buffer_size = 1
+
+    def test_non_subunit_encapsulated(self):
+        source = BytesIO(b"foo\nbar\n")
+        result = StreamResult()
+        self._make_parser(source, non_subunit_name="stdout").run(result)
+        self.assertEqual(list(b"foo\nbar\n"), [event[6][0] for event in result._events])
+        self.assertEqual(b"", source.read())
+
+    def test_signature_middle_utf8_char(self):
+        source = BytesIO(b"\xe3\xb3\x8a")
+        result = StreamResult()
+        self._make_parser(source, non_subunit_name="stdout").run(result)
+        self.assertEqual([b"\xe3", b"\xb3", b"\x8a"], [event[6] for event in result._events])
+
+    if st is not None:
+
+        @given(st.binary())
+        def test_hypothesis_decoding(self, code_bytes):
+            source = BytesIO(code_bytes)
+            result = StreamResult()
+            self._make_parser(source, non_subunit_name="stdout").run(result)
+            self.assertEqual(b"", source.read())
+
+
+class TestByteStreamToStreamResultBuffered(TestByteStreamToStreamResult):
+    buffer_size = 65536
+
+    def test_non_subunit_encapsulated(self):
+        source = BytesIO(b"foo\nbar\n" + CONSTANT_ENUM + b"baz")
+        result = StreamResult()
+        self._make_parser(source, non_subunit_name="stdout").run(result)
+        self.assertEqual(
+            [
+                ("status", None, None, None, True, "stdout", b"foo\nbar\n", False, None, None, None),
+                ("status", "foo", "exists", None, True, None, None, False, None, None, None),
+                ("status", None, None, None, True, "stdout", b"baz", False, None, None, None),
+            ],
+            result._events,
+        )
+
+    def test_non_subunit_split_at_1MiB(self):
+        source = BytesIO(b"a" * 1048577)
+        result = StreamResult()
+        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout", buffer_size=2097152).run(result)
+        self.assertEqual([1048576, 1], [len(event[6]) for event in result._events])
+
+    def test_signature_middle_utf8_char(self):
+        source = BytesIO(b"\xe3\xb3\x8a" + CONSTANT_ENUM)
+        result = StreamResult()
+        self._make_parser(source, non_subunit_name="stdout").run(result)
+        self.assertEqual(
+            [
+                ("status", None, None, None, True, "stdout", b"\xe3\xb3\x8a", False, None, None, None),
+                ("status", "foo", "exists", None, True, None, None, False, None, None, None),
+            ],
+            result._events,
+        )
+
+    def test_non_subunit_disabled_raises(self):
+        source = BytesIO(b"foo\nbar\n")
+        result = StreamResult()
+        case = self._make_parser(source)
+        e = self.assertRaises(Exception, case.run, result)
+        self.assertEqual(b"f", e.args[1])
+        self.assertEqual([], result._events)
+
+    def test_short_packet_at_eof(self):
+        self.check_events(
+            CONSTANT_ENUM[:-1],
+            [
+                self._event(
+                    test_id="subunit.parser",
+                    eof=True,
+                    file_name="Packet data",
+                    file_bytes=CONSTANT_ENUM[:6],
+                    mime_type="application/octet-stream",
+                ),
+                self._event(
+                    test_id="subunit.parser",
+                    test_status="fail",
+                    eof=True,
+                    file_name="Parser Error",
+                    file_bytes=b"Short read - got 5 bytes, wanted 6 bytes",
+                    mime_type="text/plain;charset=utf8",
+                ),
+            ],
+        )
+
+    if st is not None:
+
+        @given(st.binary())
+        def test_hypothesis_decoding(self, code_bytes):
+            source = BytesIO(code_bytes)
+            result = StreamResult()
+            self._make_parser(source, non_subunit_name="stdout").run(result)
+            self.assertEqual(b"", source.read())
+
+        @given(
+            st.lists(
+                st.one_of(
+                    st.text(st.characters(max_codepoint=127)).map(lambda text: text.encode("ascii")),
+                    st.sampled_from([CONSTANT_ENUM, CONSTANT_TIMESTAMP, CONSTANT_FILE_CONTENT, CONSTANT_TAGS[0]]),
+                )
+            )
+        )
+        def test_hypothesis_matches_unbuffered(self, chunks):
+            def parse(buffer_size):
+                result = StreamResult()
+                parser = subunit.ByteStreamToStreamResult(
+                    BytesIO(b"".join(chunks)), non_subunit_name="stdout", buffer_size=buffer_size
+                )
+                parser.run(result)
+                # Non subunit content is aggregated differently.
+                events = []
+                for event in result._events:
+                    if events and event[5] == "stdout" and events[-1][5] == "stdout":
+                        events[-1] = events[-1][:6] + (events[-1][6] + bytes(event[6]),) + events[-1][7:]
+                    elif event[6] is not None:
+                        events.append(event[:6] + (bytes(event[6]),) + event[7:])
+                    else:
+                        events.append(event)
+                return events
+
+            self.assertEqual(parse(None), parse(self.buffer_size))
+
+
+class TestByteStreamToStreamResultPassthrough(TestCase):
+    def _pipe(self, content, buffering=-1):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, content)
+        os.close(write_fd)
+        source = os.fdopen(read_fd, "rb", buffering)
+        self.addCleanup(source.close)
+        return source
+
+    def _run(self, source, **kwargs):
+        result = StreamResult()
+        subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout", **kwargs).run(result)
+        return [event[1:3] + event[6:7] for event in result._events]
+
+    def test_seekable_source_stops_at_packet(self):
+        self.assertEqual(
+            [(None, None, b"foo"), ("foo", "exists", None), (None, None, b"bar")],
+            self._run(BytesIO(b"foo" + CONSTANT_ENUM + b"bar")),
+        )
+
+    def test_passthrough_size(self):
+        self.assertEqual(
+            [(None, None, b"fo"), (None, None, b"o")],
+            self._run(BytesIO(b"foo"), passthrough_size=2),
+        )
+
+    def test_buffered_pipe(self):
+        self.assertEqual(
+            [(None, None, b"foo\xe3\xb3\x8a"), ("foo", "exists", None), (None, None, b"bar")],
+            self._run(self._pipe(b"foo\xe3\xb3\x8a" + CONSTANT_ENUM + b"bar")),
+        )
+
+    def test_unbuffered_pipe(self):
+        self.assertEqual(
+            [(None, None, b"foo"), ("foo", "exists", None), (None, None, b"bar")],
+            self._run(self._pipe(b"foo" + CONSTANT_ENUM + b"bar", buffering=0)),
+        )
+
+    def _split(self, events):
+        """Return the content passed through and the other events."""
+        content = b"".join(event[2] for event in events if event[0] is None)
+        return content, [event for event in events if event[0] is not None]
+
+    def test_signature_completing_character_without_fileno(self):
+        class Source(object):
+            # Neither peekable, seekable nor selectable: read a byte at a time.
+            def __init__(self, content):
+                self.read = BytesIO(content).read
+
+        for kwargs in ({}, {"buffer_size": 4}):
+            self.assertEqual(
+                (b"\xc5\xb3", [("foo", "exists", None)]),
+                self._split(self._run(Source("ų".encode("utf8") + CONSTANT_ENUM), **kwargs)),
+            )
+
+    def test_signature_in_character_after_invalid_utf8(self):
+        # The invalid sequence is not held against the character after it.
+        for kwargs in ({}, {"buffer_size": 4}):
+            self.assertEqual(
+                (b"\xc5A\xc5\xb3x", [("foo", "exists", None)]),
+                self._split(self._run(self._pipe(b"\xc5A" + "ųx".encode("utf8") + CONSTANT_ENUM), **kwargs)),
+            )
+
+    def test_partial_content_is_passed_on(self):
+        # Content is passed on once no more arrives, without waiting for the
+        # stream to end, so that a debugger prompt can be shown.
+        read_fd, write_fd = os.pipe()
+        source = os.fdopen(read_fd, "rb")
+        self.addCleanup(source.close)
+        received = threading.Event()
+
+        class Result(StreamResult):
+            def status(self, **kwargs):
+                super().status(**kwargs)
+                received.set()
+
+        result = Result()
+        parser = subunit.ByteStreamToStreamResult(source, non_subunit_name="stdout")
+        thread = threading.Thread(target=parser.run, args=(result,))
+        thread.start()
+        try:
+            os.write(write_fd, b"(Pdb) ")
+            self.assertTrue(received.wait(10))
+            self.assertEqual(b"(Pdb) ", result._events[0][6])
+        finally:
+            os.close(write_fd)
+            thread.join()
+
+
+class TestByteStreamDecoder(TestCase):
+    def _make_decoder(self, **kwargs):
+        result = StreamResult()
+        return subunit.v2.ByteStreamDecoder(result, **kwargs), result
+
+    def test_whole_packet(self):
+        decoder, result = self._make_decoder()
+        decoder.feed(CONSTANT_ENUM)
+        self.assertEqual(
+            [("status", "foo", "exists", None, True, None, None, False, None, None, None)],
+            result._events,
+        )
+
+    def test_partial_packet_kept_between_feeds(self):
+        decoder, result = self._make_decoder()
+        for byte in CONSTANT_ENUM[:-1]:
+            decoder.feed(bytes([byte]))
+        self.assertEqual([], result._events)
+        decoder.feed(CONSTANT_ENUM[-1:] + CONSTANT_SUCCESS[:3])
+        self.assertEqual(
+            [("status", "foo", "exists", None, True, None, None, False, None, None, None)],
+            result._events,
+        )
+        decoder.feed(memoryview(CONSTANT_SUCCESS)[3:])
+        self.assertEqual(
+            ("status", "foo", "success", None, True, None, None, False, None, None, None),
+            result._events[-1],
+        )
+
+    def test_close_reports_truncated_packet(self):
+        decoder, result = self._make_decoder()
+        decoder.feed(CONSTANT_ENUM[:-2])
+        self.assertEqual([], result._events)
+        decoder.close()
+        self.assertEqual(
+            [
+                (
+                    "status",
+                    "subunit.parser",
+                    None,
+                    None,
+                    True,
+                    "Packet data",
+                    CONSTANT_ENUM[:6],
+                    True,
+                    "application/octet-stream",
+                    None,
+                    None,
+                ),
+                (
+                    "status",
+                    "subunit.parser",
+                    "fail",
+                    None,
+                    True,
+                    "Parser Error",
+                    b"Short read - got 4 bytes, wanted 6 bytes",
+                    True,
+                    "text/plain;charset=utf8",
+                    None,
+                    None,
+                ),
+            ],
+            result._events,
+        )
+
+    def test_non_subunit_encapsulated(self):
+        decoder, result = self._make_decoder(non_subunit_name="stdout")
+        decoder.feed(b"foo\xe3")
+        decoder.feed(b"\xb3\x8abar" + CONSTANT_ENUM)
+        decoder.close()
+        self.assertEqual(
+            [
+                ("status", None, None, None, True, "stdout", b"foo\xe3", False, None, None, None),
+                ("status", None, None, None, True, "stdout", b"\xb3\x8abar", False, None, None, None),
+                ("status", "foo", "exists", None, True, None, None, False, None, None, None),
+            ],
+            result._events,
+        )
+
+    def test_non_subunit_disabled_raises(self):
+        decoder, result = self._make_decoder()
+        e = self.assertRaises(Exception, decoder.feed, b"foo")
+        self.assertEqual(b"f", e.args[1])
+
+    if st is not None:
+
+        @given(st.lists(st.integers(min_value=0, max_value=len(CONSTANT_TIMESTAMP + CONSTANT_TAGS[0]))))
+        def test_hypothesis_split_points(self, splits):
+            stream = CONSTANT_TIMESTAMP + CONSTANT_TAGS[0] + CONSTANT_MIME[:-1]
+            whole, whole_result = self._make_decoder(non_subunit_name="stdout")
+            whole.feed(stream)
+            whole.close()
+            split, split_result = self._make_decoder(non_subunit_name="stdout")
+            previous = 0
+            for offset in sorted(splits) + [len(stream)]:
+                split.feed(stream[previous:offset])
+                previous = offset
+            split.close()
+            self.assertEqual(whole_result._events, split_result._events)
+
+
+# The header of a packet claiming to be as long as a packet can be.
+CORRUPT_LENGTH = b"\xb3)\x01\xbf\xff\xff"
+
+
+class TestByteStreamDecoderResync(TestCase):
+    def _decode(self, chunks):
+        result = StreamResult()
+        decoder = subunit.v2.ByteStreamDecoder(result, resync=True)
+        for chunk in chunks:
+            decoder.feed(chunk)
+        decoder.close()
+        return [(event[1], event[2], event[5], event[6]) for event in result._events]
+
+    def _error(self, skipped, start, end, reason):
+        return [
+            ("subunit.parser", None, "Packet data", skipped),
+            (
+                "subunit.parser",
+                "fail",
+                "Parser Error",
+                ("Skipped bytes %d to %d to resynchronise: %s" % (start, end, reason)).encode("utf8"),
+            ),
+        ]
+
+    def test_corrupt_length_does_not_swallow_later_packets(self):
+        stream = CONSTANT_ENUM + CORRUPT_LENGTH + CONSTANT_SUCCESS + CONSTANT_FAIL
+        start = len(CONSTANT_ENUM)
+        expected = (
+            [("foo", "exists", None, None)]
+            + self._error(
+                CORRUPT_LENGTH,
+                start,
+                start + 6,
+                "Short read - got %d bytes, wanted 4194297 bytes" % (len(stream) - start - 6,),
+            )
+            + [("foo", "success", None, None), ("foo", "fail", None, None)]
+        )
+        self.assertEqual(expected, self._decode([stream]))
+        self.assertEqual(expected, self._decode([stream[offset : offset + 1] for offset in range(len(stream))]))
+
+    def test_bad_checksum_resumes_inside_packet(self):
+        # The corrupt packet's length covers a whole packet after it.
+        bad = CONSTANT_ENUM[:3] + b"\x16" + CONSTANT_ENUM[4:-4] + CONSTANT_SUCCESS[:-1]
+        stream = bad + CONSTANT_SUCCESS + CONSTANT_FAIL
+        events = self._decode([stream])
+        self.assertEqual([("foo", "success"), ("foo", "fail")], [event[:2] for event in events if event[0] == "foo"])
+        self.assertThat(events[1][3], Contains(b"Skipped bytes 0 to %d to resynchronise: Bad checksum" % (len(bad),)))
+
+    def test_skipped_ranges_reported_once(self):
+        garbage = b"\xb3\x00" * 100 + CONSTANT_ENUM[:-1] + b"\x00"
+        stream = CONSTANT_ENUM + garbage + CONSTANT_SUCCESS
+        events = self._decode([stream[:50], stream[50:]])
+        self.assertEqual(4, len(events))
+        self.assertEqual(("foo", "exists"), events[0][:2])
+        self.assertEqual(garbage, events[1][3])
+        self.assertThat(
+            events[2][3],
+            Contains(b"Skipped bytes %d to %d " % (len(CONSTANT_ENUM), len(CONSTANT_ENUM) + len(garbage))),
+        )
+        self.assertEqual(("foo", "success"), events[3][:2])
+
+    def test_truncated_at_end(self):
+        self.assertEqual(
+            [("foo", "exists", None, None)]
+            + self._error(CONSTANT_SUCCESS[:-2], 12, 22, "Short read - got 4 bytes, wanted 6 bytes"),
+            self._decode([CONSTANT_ENUM + CONSTANT_SUCCESS[:-2]]),
+        )
+
+    def test_mapped_file(self):
+        path = self.useFixture(fixtures.TempDir()).join("stream")
+        with open(path, "wb") as f:
+            f.write(CORRUPT_LENGTH + CONSTANT_SUCCESS)
+        result = StreamResult()
+        subunit.v2.MappedFileToStreamResult(path, resync=True).run(result)
+        self.assertEqual(["subunit.parser", "subunit.parser", "foo"], [event[1] for event in result._events])
+
+    def test_byte_stream(self):
+        result = StreamResult()
+        source = BytesIO(CORRUPT_LENGTH + CONSTANT_SUCCESS)
+        subunit.ByteStreamToStreamResult(source, resync=True).run(result)
+        self.assertEqual(["subunit.parser", "subunit.parser", "foo"], [event[1] for event in result._events])
+
+
+class TestPacket(TestCase):
+    def test_flags(self):
+        packet = subunit.v2.Packet(CONSTANT_ENUM)
+        self.assertEqual(0x2901, packet.flags)
+
+    def test_fields(self):
+        packet = subunit.v2.Packet(CONSTANT_TIMESTAMP)
+        self.assertEqual(
+            {
+                "test_id": "bar",
+                "test_status": "success",
+                "test_tags": None,
+                "runnable": True,
+                "file_name": None,
+                "file_bytes": None,
+                "eof": False,
+                "mime_type": None,
+                "route_code": None,
+                "timestamp": datetime.datetime(2001, 12, 12, 12, 59, 59, 45, iso8601.UTC),
+            },
+            packet.fields,
+        )
+
+    def test_replay(self):
+        result = StreamResult()
+        subunit.v2.Packet(CONSTANT_ENUM_LONG_LENGTH).replay(result)
+        self.assertEqual(
+            [("status", "foo", "exists", None, True, None, None, False, None, None, None)],
+            result._events,
+        )
+
+    def test_replay_undecodable(self):
+        file_bytes = CONSTANT_ROUTE_CODE[:5] + b"\xb4" + CONSTANT_ROUTE_CODE[6:-4] + b"\xce\x56\xc6\x17"
+        packet = subunit.v2.Packet(file_bytes)
+        self.assertRaises(subunit.v2.ParseError, getattr, packet, "fields")
+        result = StreamResult()
+        packet.replay(result)
+        self.assertEqual(
+            [
+                ("subunit.parser", None, "Packet data", file_bytes),
+                ("subunit.parser", "fail", "Parser Error", b"UTF8 string at offset 2 is not UTF8"),
+            ],
+            [(event[1], event[2], event[5], event[6]) for event in result._events],
+        )
+
+    def test_write_packet_is_verbatim(self):
+        output = BytesIO()
+        subunit.StreamResultToBytes(output).write_packet(subunit.v2.Packet(CONSTANT_ENUM_LONG_LENGTH))
+        self.assertEqual(CONSTANT_ENUM_LONG_LENGTH, output.getvalue())
+
+
+class TestReadPackets(TestCase):
+    def test_packets(self):
+        source = BytesIO(CONSTANT_ENUM_LONG_LENGTH + CONSTANT_TIMESTAMP)
+        packets = list(subunit.v2.read_packets(source, buffer_size=3))
+        self.assertEqual([CONSTANT_ENUM_LONG_LENGTH, CONSTANT_TIMESTAMP], [packet.data for packet in packets])
+
+    def test_bad_checksum_becomes_error_packets(self):
+        file_bytes = CONSTANT_MIME[:-1] + b"\x00"
+        result = StreamResult()
+        for packet in subunit.v2.read_packets(BytesIO(file_bytes)):
+            packet.replay(result)
+        self.assertEqual(
+            [
+                ("subunit.parser", None, "Packet data", file_bytes),
+                (
+                    "subunit.parser",
+                    "fail",
+                    "Parser Error",
+                    b"Bad checksum - calculated (0x78335115), stored (0x78335100)",
+                ),
+            ],
+            [(event[1], event[2], event[5], bytes(event[6])) for event in result._events],
+        )
+
+    def test_non_subunit_encapsulated(self):
+        source = BytesIO(b"foo" + CONSTANT_ENUM)
+        packets = list(subunit.v2.read_packets(source, non_subunit_name="stdout"))
+        self.assertEqual(
+            [{"file_name": "stdout", "file_bytes": b"foo"}, {"test_id": "foo", "test_status": "exists"}],
+            [
+                {key: value for key, value in packet.fields.items() if value not in (None, True, False)}
+                for packet in packets
+            ],
+        )
+
+    def test_splitter_feed(self):
+        packets = []
+        splitter = subunit.v2.ByteStreamToPackets(packets.append)
+        splitter.feed(CONSTANT_ENUM[:4])
+        self.assertEqual([], packets)
+        splitter.feed(CONSTANT_ENUM[4:])
+        self.assertEqual([CONSTANT_ENUM], [packet.data for packet in packets])
+
+
+class TestMappedFileToStreamResult(TestCase):
+    def _write(self, content):
+        path = self.useFixture(fixtures.TempDir()).join("stream")
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def _events(self, source, **kwargs):
+        result = StreamResult()
+        subunit.v2.MappedFileToStreamResult(source, **kwargs).run(result)
+        return [
+            event[:6] + (bytes(event[6]) if event[6] is not None else None,) + event[7:] for event in result._events
+        ]
+
+    def test_path(self):
+        path = self._write(CONSTANT_ENUM + CONSTANT_FILE_CONTENT)
+        self.assertEqual(
+            [
+                ("status", "foo", "exists", None, True, None, None, False, None, None, None),
+                ("status", None, None, None, True, "barney", b"woo", False, None, None, None),
+            ],
+            self._events(path),
+        )
+
+    def test_file_object_from_offset(self):
+        path = self._write(b"junk" + CONSTANT_ENUM)
+        with open(path, "rb") as source:
+            source.read(4)
+            self.assertEqual(
+                [("status", "foo", "exists", None, True, None, None, False, None, None, None)],
+                self._events(source),
+            )
+            self.assertEqual(b"", source.read())
+
+    def test_empty_file(self):
+        self.assertEqual([], self._events(self._write(b"")))
+
+    def test_file_bytes_are_views_of_the_mapping(self):
+        result = StreamResult()
+        subunit.v2.MappedFileToStreamResult(self._write(CONSTANT_FILE_CONTENT)).run(result)
+        file_bytes = result._events[0][6]
+        self.assertIsInstance(file_bytes, memoryview)
+        self.assertEqual(b"woo", file_bytes)
+
+    def test_non_subunit_content(self):
+        path = self._write(b"foo\n" + CONSTANT_ENUM + b"bar")
+        self.assertEqual(
+            [
+                ("status", None, None, None, True, "stdout", b"foo\n", False, None, None, None),
+                ("status", "foo", "exists", None, True, None, None, False, None, None, None),
+                ("status", None, None, None, True, "stdout", b"bar", False, None, None, None),
+            ],
+            self._events(path, non_subunit_name="stdout"),
+        )
+
+    def test_truncated_packet(self):
+        events = self._events(self._write(CONSTANT_ENUM[:-1]))
+        self.assertEqual(
+            [
+                ("subunit.parser", None, "Packet data", CONSTANT_ENUM[:6]),
+                ("subunit.parser", "fail", "Parser Error", b"Short read - got 5 bytes, wanted 6 bytes"),
+            ],
+            [(event[1], event[2], event[5], event[6]) for event in events],
+        )
+
+
+class TestParallelFileToStreamResult(TestCase):
+    def _write(self, content):
+        path = self.useFixture(fixtures.TempDir()).join("stream")
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def _events(self, parser):
+        result = StreamResult()
+        parser.run(result)
+        return [
+            event[:6] + (bytes(event[6]) if event[6] is not None else None,) + event[7:] for event in result._events
+        ]
+
+    def _stream(self):
+        output = BytesIO()
+        result = subunit.StreamResultToBytes(output)
+        for i in range(200):
+            test_id = "test.%d" % i
+            result.status(test_id=test_id, test_status="inprogress")
+            if i % 7 == 0:
+                output.write(("output from %s\n" % test_id).encode("utf8"))
+            if i % 50 == 0:
+                # Large enough to span several segments.
+                result.status(test_id=test_id, file_name="log", file_bytes=b"\xb3" * 3000, eof=True)
+            if i % 30 == 0:
+                # A valid packet inside an attachment, which a segment may
+                # wrongly resynchronise on.
+                result.status(test_id=test_id, file_name="log", file_bytes=CONSTANT_ENUM * 20)
+            result.status(test_id=test_id, test_status="success", test_tags={"a", "b"})
+        return output.getvalue()
+
+    def assertMatchesSerial(self, path, **kwargs):
+        serial = self._events(subunit.v2.MappedFileToStreamResult(path, non_subunit_name="stdout"))
+        parallel = self._events(
+            subunit.v2.ParallelFileToStreamResult(path, non_subunit_name="stdout", workers=2, **kwargs)
+        )
+        self.assertEqual(serial, parallel)
+
+    def test_ordered(self):
+        self.assertMatchesSerial(self._write(self._stream()), segment_size=997)
+
+    def test_unordered(self):
+        self.assertMatchesSerial(self._write(self._stream()), segment_size=997, ordered=False)
+
+    def test_subunit_attachments(self):
+        # Segments resynchronise on packets of the inner streams, and run
+        # into the rest of the outer packets, which is not subunit.
+        inner = BytesIO()
+        for i in range(400):
+            subunit.StreamResultToBytes(inner).status(test_id="inner.%d" % i, test_status="success")
+        output = BytesIO()
+        result = subunit.StreamResultToBytes(output)
+        for i in range(20):
+            result.status(test_id="test.%d" % i, file_name="inner.subunit", file_bytes=inner.getvalue(), eof=True)
+            result.status(test_id="test.%d" % i, test_status="success")
+        path = self._write(output.getvalue())
+        serial = self._events(subunit.v2.MappedFileToStreamResult(path))
+        for ordered in (True, False):
+            parallel = self._events(
+                subunit.v2.ParallelFileToStreamResult(path, workers=2, segment_size=7000, ordered=ordered)
+            )
+            self.assertEqual(serial, parallel)
+
+    def test_segments_within_non_subunit_content(self):
+        content = "café " * 400
+        path = self._write(CONSTANT_ENUM + content.encode("utf8") + CONSTANT_SUCCESS)
+        self.assertMatchesSerial(path, segment_size=101)
+
+    def test_single_segment(self):
+        self.assertMatchesSerial(self._write(self._stream()))
+
+    def test_empty_file(self):
+        self.assertEqual([], self._events(subunit.v2.ParallelFileToStreamResult(self._write(b""), workers=2)))
+
+
+class TestTimestampConversion(TestCase):
+    def test_round_trip(self):
+        timestamp = datetime.datetime(2001, 12, 12, 12, 59, 59, 45, iso8601.UTC)
+        self.assertEqual(1008161999000045000, subunit.v2.timestamp_to_nanoseconds(timestamp))
+        self.assertEqual(timestamp, subunit.v2.nanoseconds_to_timestamp(1008161999000045000))
+
+    def test_before_epoch(self):
+        timestamp = datetime.datetime(1969, 12, 31, 23, 59, 59, 500000, iso8601.UTC)
+        self.assertEqual(-500000000, subunit.v2.timestamp_to_nanoseconds(timestamp))
+        self.assertEqual(timestamp, subunit.v2.nanoseconds_to_timestamp(-500000000))
+
+
+class TestInternCache(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = subunit.v2._InternCache(2)
+        cache.put(b"a", "a")
+        cache.put(b"b", "b")
+        self.assertEqual("a", cache.get(b"a"))
+        cache.put(b"c", "c")
+        self.assertEqual(None, cache.get(b"b"))
+        self.assertEqual("a", cache.get(b"a"))
+        self.assertEqual("c", cache.get(b"c"))
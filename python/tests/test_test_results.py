@@ -17,13 +17,14 @@
 import csv
 import datetime
 import sys
+import threading
 import unittest
 from io import StringIO
 
 import testtools
 from testtools import TestCase
 from testtools.content import TracebackContent, text_content
-from testtools.testresult.doubles import ExtendedTestResult
+from testtools.testresult.doubles import ExtendedTestResult, StreamResult
 
 import subunit
 import iso8601
@@ -556,3 +557,87 @@ class TestTestIdPrintingResult(testtools.TestCase):
         self.result.addDuration(test, 2.5)
         # TestIdPrintingResult doesn't output anything for addDuration
         self.assertEqual("", self.stream.getvalue())
+
+
+class TestPassthroughPolicy(testtools.TestCase):
+    def make_result(self, **kwargs):
+        log = StreamResult()
+        result = subunit.test_results.PassthroughPolicy(log, **kwargs)
+        result.startTestRun()
+        return log, result
+
+    def files(self, log):
+        return [
+            (event[1], event[6], event[5], event[7])
+            for event in log._events
+            if event[0] == "status" and event[5] is not None
+        ]
+
+    def test_coalesces_up_to_window_size(self):
+        log, result = self.make_result(window_size=10, latency=60)
+        for _ in range(7):
+            result.status(file_name="stdout", file_bytes=b"abc")
+        self.assertEqual([(None, b"abcabcabcabc", "stdout", False)], self.files(log))
+        result.stopTestRun()
+        self.assertEqual(
+            [(None, b"abcabcabcabc", "stdout", False), (None, b"abcabcabc", "stdout", False)], self.files(log)
+        )
+
+    def test_other_events_flush_pending_content_first(self):
+        log, result = self.make_result(latency=60)
+        result.status(file_name="stdout", file_bytes=b"abc")
+        result.status(file_name="stdout", file_bytes=b"def")
+        result.status(test_id="foo", test_status="success")
+        result.status(file_name="stderr", file_bytes=b"ghi")
+        result.status(file_name="stdout", file_bytes=b"jkl", eof=True)
+        self.assertEqual(
+            [
+                ("status", None, None, None, True, "stdout", b"abcdef", False, None, None, None),
+                ("status", "foo", "success", None, True, None, None, False, None, None, None),
+                ("status", None, None, None, True, "stderr", b"ghi", False, None, None, None),
+                ("status", None, None, None, True, "stdout", b"jkl", True, None, None, None),
+            ],
+            log._events[1:],
+        )
+
+    def test_test_files_pass_straight_through(self):
+        log, result = self.make_result(latency=60)
+        result.status(test_id="foo", file_name="log", file_bytes=b"abc")
+        self.assertEqual([("foo", b"abc", "log", False)], self.files(log))
+
+    def test_latency_bounds_holding_content_back(self):
+        passed = threading.Event()
+        log, result = self.make_result(latency=0.01)
+        log.status = lambda **kwargs: passed.set()
+        result.status(file_name="stdout", file_bytes=b"(Pdb) ")
+        self.assertTrue(passed.wait(10))
+
+    def test_zero_window_passes_content_on_at_once(self):
+        log, result = self.make_result(window_size=0)
+        result.status(file_name="stdout", file_bytes=b"abc")
+        self.assertEqual([(None, b"abc", "stdout", False)], self.files(log))
+
+    def test_max_bytes_per_test(self):
+        log, result = self.make_result(window_size=0, max_bytes=4)
+        result.status(file_name="stdout", file_bytes=b"abc")
+        result.status(file_name="stdout", file_bytes=b"defgh")
+        result.status(file_name="stdout", file_bytes=b"ijk")
+        result.status(test_id="foo", test_status="inprogress")
+        result.status(file_name="stdout", file_bytes=b"lmn")
+        result.status(test_id="foo", test_status="success")
+        result.status(file_name="stdout", file_bytes=b"opqrs")
+        result.stopTestRun()
+        self.assertEqual(
+            [
+                (None, b"abc", "stdout", False),
+                (None, b"d\n[subunit: output truncated]\n", "stdout", False),
+                (None, b"[subunit: 10 bytes of output dropped]\n", "stdout", False),
+                (None, b"opqr\n[subunit: output truncated]\n", "stdout", False),
+                (None, b"[subunit: 1 bytes of output dropped]\n", "stdout", False),
+            ],
+            self.files(log),
+        )
+        self.assertEqual(11, result.dropped)
+        self.assertEqual(
+            ["inprogress", "success"], [event[2] for event in log._events if event[0] == "status" and event[1]]
+        )
@@ -0,0 +1,135 @@
+#
+#  subunit: extensions to Python unittest to get test results from subprocesses.
+#  Copyright (C) 2026  Subunit contributors
+#
+#  Licensed under either the Apache License, Version 2.0 or the BSD 3-clause
+#  license at the users choice. A copy of both licenses are available in the
+#  project source as Apache-2.0 and BSD. You may not use this file except in
+#  compliance with one of these two licences.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under these licenses is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  See the
+#  license you chose for the specific language governing permissions and
+#  limitations under that license.
+#
+
+"""Tests for subunit.threaded."""
+
+import threading
+from io import BytesIO
+
+from subunit import ByteStreamToStreamResult
+from subunit.threaded import ThreadedStreamResultToBytes
+from testtools import TestCase
+from testtools.testresult.doubles import StreamResult
+
+
+class _PartialWriteStream(BytesIO):
+    """A stream which writes at most a few bytes at a time."""
+
+    def write(self, data):
+        return super().write(bytes(data[:7]))
+
+
+class _BlockingStream(BytesIO):
+    """A stream whose writes wait until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait()
+        self.writes.append(bytes(data))
+        return super().write(data)
+
+
+class _BrokenStream(BytesIO):
+    def write(self, data):
+        raise OSError("broken")
+
+
+def _events(data):
+    result = StreamResult()
+    ByteStreamToStreamResult(BytesIO(data)).run(result)
+    return [event[1:3] + event[5:7] for event in result._events]
+
+
+class TestThreadedStreamResultToBytes(TestCase):
+    def test_packets_from_many_threads_stay_whole(self):
+        output = _PartialWriteStream()
+        result = ThreadedStreamResultToBytes(output, queue_size=4)
+        result.startTestRun()
+
+        def produce(number):
+            for test in range(50):
+                test_id = "thread%d.test%d" % (number, test)
+                result.status(test_id=test_id, test_status="inprogress")
+                result.status(test_id=test_id, file_name="log", file_bytes=b"x" * test)
+                result.status(test_id=test_id, test_status="success")
+
+        threads = [threading.Thread(target=produce, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.stopTestRun()
+        events = _events(output.getvalue())
+        self.assertEqual(600, len(events))
+        self.assertNotIn("fail", [event[1] for event in events])
+        for number in range(4):
+            prefix = "thread%d." % number
+            self.assertEqual(
+                [
+                    (
+                        "%stest%d" % (prefix, test),
+                        status,
+                        file_name,
+                        None if file_name is None else b"x" * test,
+                    )
+                    for test in range(50)
+                    for status, file_name in (("inprogress", None), (None, "log"), ("success", None))
+                ],
+                [
+                    (event[0], event[1], event[2], None if event[3] is None else bytes(event[3]))
+                    for event in events
+                    if event[0].startswith(prefix)
+                ],
+            )
+
+    def test_coalesces_queued_packets(self):
+        output = _BlockingStream()
+        result = ThreadedStreamResultToBytes(output)
+        for test in range(10):
+            result.status(test_id="test%d" % test, test_status="success")
+        output.release.set()
+        result.stopTestRun()
+        self.assertLess(len(output.writes), 10)
+        self.assertEqual(10, len(_events(output.getvalue())))
+
+    def test_stop_test_run_flushes(self):
+        flushes = []
+        output = BytesIO()
+        output.flush = lambda: flushes.append(len(output.getvalue()))
+        result = ThreadedStreamResultToBytes(output)
+        result.status(test_id="foo", test_status="success")
+        result.stopTestRun()
+        self.assertEqual(len(output.getvalue()), flushes[-1])
+        self.assertEqual([("foo", "success", None, None)], _events(output.getvalue()))
+
+    def test_restarts_after_stop_test_run(self):
+        output = BytesIO()
+        result = ThreadedStreamResultToBytes(output)
+        result.status(test_id="foo", test_status="success")
+        result.stopTestRun()
+        result.startTestRun()
+        result.status(test_id="bar", test_status="fail")
+        result.stopTestRun()
+        self.assertEqual(["foo", "bar"], [event[0] for event in _events(output.getvalue())])
+
+    def test_write_error_raised_from_stop_test_run(self):
+        result = ThreadedStreamResultToBytes(_BrokenStream())
+        result.status(test_id="foo", test_status="success")
+        self.assertRaises(OSError, result.stopTestRun)